@@ -7,25 +7,25 @@ from collections import defaultdict
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from api.utils.config import Config
 from api.utils.db import db
+from api.utils.http_client import http_client
+from api.utils.market_data import market_data
+from api.utils.notification_bus import notification_bus
+from api.utils.balance_buffer import casino_balance_buffer
 # 循環インポートを避けるためsecurityモジュールを後でインポート
 from api.routes import auth, users, forums, admin, feedback, quests, exchange, notifications, crypto, daily, casino, health
 from api.utils.quest_manager import QuestManager
 # 直接関数をインポート
 from api.utils.security import rate_limiter, advanced_rate_limiter, token_bucket_rate_limiter
 from api.middleware.ddos_protection import DDoSProtectionMiddleware
-from api.utils.scheduler import setup_scheduler
+from api.middleware.metrics import MetricsMiddleware
+from api.utils.logger import setup_logging, stop_logging
+from api.utils.scheduler import setup_scheduler, add_leader_job, leader
 import logging
 from fastapi.responses import JSONResponse
 
-# ロギング設定
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",  # levellevel → levelname に修正
-    handlers=[
-        logging.FileHandler("api_logs.log"),
-        logging.StreamHandler()
-    ]
-)
+# ロギング設定（書き込みはキュー経由で別スレッドが行う）
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # FastAPIアプリケーションの作成
 app = FastAPI(
@@ -106,14 +106,17 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         return await call_next(request)
 
 # アプリケーションにミドルウェアを追加
-app.add_middleware(RateLimitMiddleware)
-app.add_middleware(DDoSProtectionMiddleware)
+if Config.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+    app.add_middleware(DDoSProtectionMiddleware)
+# 最も外側でレイテンシを計測（レート制限などのミドルウェアの時間も含む）
+app.add_middleware(MetricsMiddleware)
 
 # スタートアップイベント
 @app.on_event("startup")
 async def startup_event():
     """アプリケーション起動時の処理"""
-    print("Starting application...")
+    logger.info("Starting application...")
     
     # 設定の検証
     Config.validate()
@@ -121,12 +124,25 @@ async def startup_event():
     # データベース接続を初期化（一度だけ）
     await db.connect()
     
+    # 外部API呼び出し用の共有HTTPクライアントを作成
+    await http_client.start()
+    
+    # マーケットデータのバックグラウンド更新を開始
+    market_data.start()
+    
+    # 他ワーカーで作成された通知の取り込みを開始
+    notification_bus.start(db.db.notifications)
+    
+    # カジノ残高のまとめ書き込みを開始（有効な場合のみ、前回停止時に失われた差分をベット記録から復元してから）
+    await casino_balance_buffer.reconcile(Config.CASINO_RECONCILE_HOURS)
+    casino_balance_buffer.start()
+    
     # IPブラックリストをロード
     from api.utils.security import load_blacklist_from_db
     await load_blacklist_from_db()
     
-    # クエストの自動更新スケジュール設定
-    scheduler.add_job(
+    # クエストの自動更新スケジュール設定（リーダーのワーカーのみ実行）
+    add_leader_job(
         QuestManager.check_expired_quests,
         'interval',
         hours=1,
@@ -134,22 +150,40 @@ async def startup_event():
     )
     
     # セキュリティ関連の定期タスクを追加
-    from api.utils.scheduled_tasks import cleanup_expired_blacklists, analyze_security_trends
-    scheduler.add_job(cleanup_expired_blacklists, "interval", hours=4)
-    scheduler.add_job(analyze_security_trends, "interval", hours=24)
+    from api.utils.scheduled_tasks import (
+        cleanup_expired_blacklists, analyze_security_trends, snapshot_ledger, reconcile_pending_ledger
+    )
+    add_leader_job(cleanup_expired_blacklists, "interval", hours=4, id="cleanup_expired_blacklists")
+    add_leader_job(analyze_security_trends, "interval", hours=24, id="analyze_security_trends")
+    
+    # 残高台帳のスナップショット作成と古い明細の集約
+    add_leader_job(snapshot_ledger, "interval", hours=24, id="snapshot_ledger")
+    # トランザクションが使えない環境で保留状態のまま残った台帳明細の照合
+    add_leader_job(reconcile_pending_ledger, "interval", minutes=10, id="reconcile_pending_ledger")
     
+    # 起動時にリーダー選出を行ってからスケジューラを開始
+    await leader.try_acquire()
     scheduler.start()
-    logging.info("Application started, scheduler is running")
+    logger.info(f"Application started, scheduler is running (leader: {leader.is_leader})")
 
 # シャットダウンイベント
 @app.on_event("shutdown")
 async def shutdown_event():
     """アプリケーション終了時の処理"""
+    # スケジューラを停止してリースを解放
+    scheduler.shutdown()
+    await leader.release()
+    # マーケットデータ更新を停止して共有HTTPクライアントをクローズ
+    await market_data.stop()
+    await notification_bus.stop()
+    # 未書き込みのカジノ残高差分を書き込む
+    await casino_balance_buffer.stop()
+    await http_client.close()
     # データベース接続のクローズ
     await db.close()
-    # スケジューラを停止
-    scheduler.shutdown()
-    logging.info("Application shutting down, scheduler stopped")
+    logger.info("Application shutting down, scheduler stopped")
+    # キューに残ったログを書き出す
+    stop_logging()
 
 # ルーターの登録
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
@@ -169,7 +203,12 @@ app.include_router(health.router, prefix="/api/health", tags=["health"])
 @app.get("/health")
 async def health_check():
     """ヘルスチェック用エンドポイント"""
-    return {"status": "ok", "version": Config.VERSION, "scheduler_running": scheduler.running}
+    return {
+        "status": "ok",
+        "version": Config.VERSION,
+        "scheduler_running": scheduler.running,
+        "scheduler_leader": leader.is_leader
+    }
 
 # レート制限を掛ける必要があるエンドポイントに依存関数を追加
 @app.get("/api/public-data")
@@ -0,0 +1,36 @@
+# api/middleware/metrics.py
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from api.utils.metrics import metrics, current_request_db_stats, RequestDbStats
+import time
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """ルートごとのレイテンシとDBコマンド数を記録"""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.perf_counter()
+        db_stats = RequestDbStats()
+        token = current_request_db_stats.set(db_stats)
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            elapsed = time.perf_counter() - start_time
+            # ブラウザの開発者ツールでも内訳を確認できるようにする
+            response.headers["Server-Timing"] = (
+                f'app;dur={elapsed * 1000:.1f}, '
+                f'db;dur={db_stats.seconds * 1000:.1f};desc="{db_stats.count} queries"'
+            )
+            return response
+        finally:
+            current_request_db_stats.reset(token)
+            # パスパラメータで系列が増えないようにルートのテンプレートで集計
+            route = request.scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            metrics.observe_request(
+                request.method,
+                route_path,
+                status_code,
+                time.perf_counter() - start_time,
+                db_stats
+            )
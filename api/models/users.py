@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import AliasChoices, BaseModel, Field
 
 class UserBase(BaseModel):
     """ユーザーの基本情報を定義するベースモデル"""
@@ -17,8 +17,7 @@ class UserCreate(UserBase):
 
 class UserLogin(BaseModel):
     """ログイン情報のモデル"""
-    login_token: str
-    token_expires: datetime
+    login_token: str = Field(validation_alias=AliasChoices('login_token', 'token'))
 
 class UserUpdate(BaseModel):
     """ユーザー情報更新用のモデル"""
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from typing import List, Dict, Optional
 from api.routes.auth import verify_token, oauth2_scheme, is_admin
 from api.utils.db import db
@@ -7,6 +8,10 @@ from pydantic import BaseModel
 from api.models.quest import QuestType, QuestActionType, daily_quest_templates, weekly_quest_templates
 from datetime import datetime, timedelta
 from api.utils.logger import logger
+from api.utils.metrics import metrics
+import csv
+import io
+import json
 import math
 from bson import ObjectId
 
@@ -17,14 +22,25 @@ class FeedbackReply(BaseModel):
     reward: float = 0  # 報酬フィールドを追加
 
 @router.get("/reports")
-async def get_reports(user: dict = Depends(is_admin)):
+async def get_reports(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    status: Optional[str] = Query(None, pattern="^(pending|resolved|rejected)$"),
+    user: dict = Depends(is_admin)
+):
     """管理者用の通報一覧取得"""
     try:
-        reports = await db.get_reports()
+        reports, total = await db.get_reports(page, page_size, status)
         # モデルによるバリデーションを回避
-        return reports
+        return {
+            "reports": reports,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": math.ceil(total / page_size)
+        }
     except Exception as e:
-        print(f"Error getting reports: {e}")
+        logger.error(f"Error getting reports: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch reports")
 
 @router.put("/reports/{report_id}")
@@ -49,7 +65,7 @@ async def update_report_status(
         return {"message": "Report status updated successfully", "status": status}
         
     except Exception as e:
-        print(f"Error updating report status: {e}")
+        logger.error(f"Error updating report status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/reports/{report_id}")
@@ -64,7 +80,7 @@ async def delete_report(
             raise HTTPException(status_code=404, detail="Report not found")
         return {"message": "Report deleted successfully"}
     except Exception as e:
-        print(f"Error deleting report: {e}")
+        logger.error(f"Error deleting report: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/feedback")
@@ -92,7 +108,7 @@ async def reply_to_feedback(
             raise HTTPException(status_code=404, detail="Feedback not found")
         return {"message": "Reply sent successfully"}
     except Exception as e:
-        print(f"Error replying to feedback: {e}")
+        logger.error(f"Error replying to feedback: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/quests/generate")
@@ -107,7 +123,7 @@ async def generate_quests(user: dict = Depends(is_admin)):
 
         # 既存のユーザークエスト進捗をリセット
         await db.db.user_quests.delete_many({})
-        print("Deleted all user quest progress")
+        logger.info("Deleted all user quest progress")
 
         # デイリークエストの生成
         for quest in daily_quest_templates:
@@ -131,7 +147,7 @@ async def generate_quests(user: dict = Depends(is_admin)):
                         }
                     }
                 )
-                print(f"Updated daily quest: {quest['title']}")
+                logger.info(f"Updated daily quest: {quest['title']}")
             else:
                 # 新規クエストを作成
                 new_quest_id = await db.create_quest({
@@ -140,7 +156,7 @@ async def generate_quests(user: dict = Depends(is_admin)):
                     "is_active": True,
                     "created_at": datetime.utcnow()
                 })
-                print(f"Created new daily quest: {quest['title']}")
+                logger.info(f"Created new daily quest: {quest['title']}")
 
         # ウィークリークエストの生成（同様の処理）
         for quest in weekly_quest_templates:
@@ -162,7 +178,7 @@ async def generate_quests(user: dict = Depends(is_admin)):
                         }
                     }
                 )
-                print(f"Updated weekly quest: {quest['title']}")
+                logger.info(f"Updated weekly quest: {quest['title']}")
             else:
                 new_quest_id = await db.create_quest({
                     **quest,
@@ -170,11 +186,13 @@ async def generate_quests(user: dict = Depends(is_admin)):
                     "is_active": True,
                     "created_at": datetime.utcnow()
                 })
-                print(f"Created new weekly quest: {quest['title']}")
+                logger.info(f"Created new weekly quest: {quest['title']}")
+
+        db.invalidate_quest_cache()
 
         return {"message": "クエストが生成され、進捗がリセットされました"}
     except Exception as e:
-        print(f"Error generating quests: {e}")
+        logger.error(f"Error generating quests: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/quests/generate/daily")
@@ -224,6 +242,8 @@ async def generate_daily_quests(user: dict = Depends(is_admin)):
                     "created_at": datetime.utcnow()
                 })
 
+        db.invalidate_quest_cache()
+
         return {"message": "デイリークエストが生成されました"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -275,6 +295,8 @@ async def generate_weekly_quests(user: dict = Depends(is_admin)):
                     "created_at": datetime.utcnow()
                 })
 
+        db.invalidate_quest_cache()
+
         return {"message": "ウィークリークエストが生成されました"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -295,7 +317,7 @@ async def admin_delete_post(post_id: str, user: dict = Depends(is_admin)):
 
         return {"message": "Post deleted successfully"}
     except Exception as e:
-        print(f"Error deleting post: {e}")
+        logger.error(f"Error deleting post: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # PARCリクエスト一覧取得エンドポイントを追加
@@ -307,7 +329,7 @@ async def get_exchange_requests(user: dict = Depends(is_admin)):
         exchanges = await db.get_exchange_requests()
         return exchanges
     except Exception as e:
-        print(f"Error getting exchange requests: {e}")
+        logger.error(f"Error getting exchange requests: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch exchange requests")
 
 # PARCリクエスト完了処理エンドポイントを追加
@@ -325,37 +347,17 @@ async def complete_exchange_request(
 
         return {"message": "交換リクエストを完了しました"}
     except Exception as e:
-        print(f"Error completing exchange request: {e}")
+        logger.error(f"Error completing exchange request: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/notifications/count")
 async def get_admin_notification_counts(user: dict = Depends(is_admin)):
     """管理者向けの各種通知数を取得"""
     try:
-        # 未読の通報数
-        unread_reports = await db.count_unread_reports()
-        
-        # 未回答のフィードバック数
-        unread_feedback = await db.count_unread_feedback()
-        
-        # クエスト関連の通知数（例：期限切れクエスト）
-        quest_notifications = await db.count_quest_notifications()
-        
-        # 未処理の交換リクエスト数
-        pending_exchanges = await db.count_pending_exchanges()
-        
-        # セキュリティ関連の通知数（例：重大な警告）
-        security_notifications = await db.count_security_notifications()
-
-        return {
-            "reports": unread_reports,
-            "feedback": unread_feedback,
-            "quests": quest_notifications,
-            "exchange": pending_exchanges,
-            "security": security_notifications  # セキュリティ通知
-        }
+        # 5種類の件数を並行して取得（短時間キャッシュされ、関連する書き込みで破棄される）
+        return await db.get_admin_notification_counts()
     except Exception as e:
-        print(f"Error getting admin notification counts: {e}")
+        logger.error(f"Error getting admin notification counts: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch notification counts")
 
 @router.post("/notifications/read/{notification_type}")
@@ -382,12 +384,102 @@ async def mark_notifications_read(notification_type: str, user: dict = Depends(i
                 {"notified": {"$ne": True}},
                 {"$set": {"notified": True}}
             )
+            db.invalidate_admin_counts()
             
         return {"message": f"{notification_type} marked as read"}
     except Exception as e:
-        print(f"Error marking {notification_type} as read: {e}")
+        logger.error(f"Error marking {notification_type} as read: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to mark {notification_type} as read")
 
+SECURITY_LOG_CSV_FIELDS = ["id", "timestamp", "event_type", "severity", "ip_address", "user_id", "details"]
+
+def _parse_iso_date(value: Optional[str]) -> Optional[datetime]:
+    """ISO形式の日付文字列をdatetimeに変換（不正な形式は400エラー）"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {value}")
+
+def _export_row(log: dict) -> dict:
+    """エクスポート用にセキュリティログを整形"""
+    row = {k: v for k, v in log.items() if k not in ("_id", "notified")}
+    row["id"] = str(log["_id"])
+    if isinstance(row.get("timestamp"), datetime):
+        row["timestamp"] = row["timestamp"].isoformat()
+    return row
+
+@router.get("/security-logs/export")
+async def export_security_logs(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    user_id: Optional[str] = None,
+    ip_address: Optional[str] = None,
+    event_type: Optional[str] = None,
+    severity: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    after: Optional[str] = Query(None, description="前回のエクスポートで最後に受け取ったログのid"),
+    batch_size: int = Query(1000, ge=100, le=10000),
+    admin: dict = Depends(is_admin)
+):
+    """セキュリティログを新しい順にストリーミングでエクスポート（管理者用）"""
+    if after and not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid resume token")
+    
+    logs = db.iter_security_logs(
+        after=after,
+        batch_size=batch_size,
+        user_id=user_id,
+        ip_address=ip_address,
+        event_type=event_type,
+        severity=severity,
+        start_date=_parse_iso_date(start_date),
+        end_date=_parse_iso_date(end_date)
+    )
+    
+    async def ndjson_chunks():
+        lines = []
+        async for log in logs:
+            lines.append(json.dumps(_export_row(log), ensure_ascii=False, default=str))
+            # カーソルのバッチ単位でまとめて送信
+            if len(lines) >= batch_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+    
+    async def csv_chunks():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=SECURITY_LOG_CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        rows = 0
+        async for log in logs:
+            row = _export_row(log)
+            row["details"] = json.dumps(row.get("details") or {}, ensure_ascii=False, default=str)
+            writer.writerow(row)
+            rows += 1
+            if rows >= batch_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                rows = 0
+        yield buffer.getvalue()
+    
+    # 途中で切断された場合は最後に受け取ったidをafterに指定して再開できる
+    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    if format == "csv":
+        return StreamingResponse(
+            csv_chunks(),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="security-logs-{timestamp}.csv"'}
+        )
+    return StreamingResponse(
+        ndjson_chunks(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="security-logs-{timestamp}.ndjson"'}
+    )
+
 @router.get("/security-logs")
 async def get_security_logs(
     user_id: Optional[str] = None,
@@ -409,17 +501,17 @@ async def get_security_logs(
             try:
                 start_date_obj = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
             except ValueError:
-                print(f"Invalid start_date format: {start_date}")
+                logger.warning(f"Invalid start_date format: {start_date}")
         
         if end_date:
             try:
                 end_date_obj = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
             except ValueError:
-                print(f"Invalid end_date format: {end_date}")
+                logger.warning(f"Invalid end_date format: {end_date}")
         
         # デバッグログ
-        print(f"Fetching security logs with filters: user_id={user_id}, ip_address={ip_address}, event_type={event_type}, severity={severity}")
-        print(f"Date range: {start_date_obj} to {end_date_obj}")
+        logger.debug(f"Fetching security logs with filters: user_id={user_id}, ip_address={ip_address}, event_type={event_type}, severity={severity}")
+        logger.debug(f"Date range: {start_date_obj} to {end_date_obj}")
         
         logs = await db.get_security_logs(
             user_id=user_id,
@@ -440,11 +532,11 @@ async def get_security_logs(
             formatted_logs.append(log)
         
         # デバッグログ
-        print(f"Returning {len(formatted_logs)} security logs")
+        logger.debug(f"Returning {len(formatted_logs)} security logs")
         
         return formatted_logs
     except Exception as e:
-        print(f"Error getting security logs: {e}")
+        logger.error(f"Error getting security logs: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch security logs: {str(e)}")
 
 # ユーザー一覧エンドポイント
@@ -453,30 +545,17 @@ async def get_users(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     search: str = Query(None),
+    after: Optional[str] = Query(None),
     user: dict = Depends(is_admin)
 ):
     """ユーザー一覧を取得"""
     try:
-        skip = (page - 1) * page_size
-        
-        # 検索条件を構築
-        query = {}
-        if search:
-            query = {
-                "$or": [
-                    {"username": {"$regex": search, "$options": "i"}},
-                    {"_id": {"$regex": search, "$options": "i"}},
-                ]
-            }
-        
-        # ユーザー数のカウント
-        total_users = await db.db.users.count_documents(query)
+        # ユーザー名の前方一致・ID完全一致で検索（afterがあればキーセットで続きを取得）
+        users, total_users, next_cursor = await db.search_users(
+            search.strip() if search else None, page, page_size, after
+        )
         total_pages = math.ceil(total_users / page_size)
         
-        # ユーザーデータの取得
-        cursor = db.db.users.find(query).skip(skip).limit(page_size).sort("created_at", -1)
-        users = await cursor.to_list(length=page_size)
-        
         # MongoDBのObjectIdをstr型に変換
         for user in users:
             user["_id"] = str(user["_id"])
@@ -486,7 +565,8 @@ async def get_users(
             "total": total_users,
             "page": page,
             "page_size": page_size,
-            "total_pages": total_pages
+            "total_pages": total_pages,
+            "next_cursor": next_cursor
         }
     
     except Exception as e:
@@ -518,19 +598,20 @@ async def update_user_balance(
         if not target_user:
             raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
         
-        # 残高更新
-        update_operation = {"$inc": {"balance": amount}} if action == "add" else {"$inc": {"balance": -amount}}
-        
         # 残高がマイナスにならないようにチェック
         if action == "remove" and target_user.get("balance", 0) < amount:
             raise HTTPException(status_code=400, detail="ユーザーの残高が不足しています")
         
-        result = await db.db.users.update_one(
-            {"_id": ObjectId(user_id)},
-            update_operation
+        # 残高更新（台帳にも記録）
+        balance = await db.apply_balance_delta(
+            target_user["discord_id"],
+            amount if action == "add" else -amount,
+            "admin_adjustment",
+            {"admin_id": admin_user["discord_id"], "description": reason},
+            require_balance=True
         )
         
-        if result.modified_count == 0:
+        if balance is None:
             raise HTTPException(status_code=404, detail="ユーザー残高の更新に失敗しました")
         
         # 通知を作成
@@ -680,4 +761,9 @@ async def ban_user(
         raise e
     except Exception as e:
         logger.error(f"Failed to ban user: {str(e)}")
-        raise HTTPException(status_code=500, detail="ユーザーのBAN処理中にエラーが発生しました")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="ユーザーのBAN処理中にエラーが発生しました")
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(admin: dict = Depends(is_admin)):
+    """リクエスト・DBコマンドのメトリクスをPrometheus形式で取得（管理者用）"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -6,15 +6,17 @@ from pydantic import BaseModel
 from ..models.users import UserLogin, UserResponse, TokenData, TokenPayload
 from ..utils.db import db
 from ..utils.config import Config
-import aiohttp
+from api.utils.http_client import http_client
 from api.utils.quest_manager import QuestManager
 import secrets
 from api.utils.security import check_login_attempts, log_security_event, protected_endpoint, rate_limiter
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-DISCORD_API_ENDPOINT = "https://discord.com/api/v10"
+DISCORD_API_ENDPOINT = Config.DISCORD_API_ENDPOINT
 
 # JWT関連の関数
 async def create_access_token(data: dict):
@@ -55,7 +57,7 @@ async def is_admin(token: str = Depends(oauth2_scheme)):
         user_id = await verify_token(token)
         user = await db.get_user_by_discord_id(user_id)
         
-        print(f"Admin check for user: {user}")  # デバッグログ
+        logger.debug(f"Admin check for user: {user}")
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
@@ -66,7 +68,7 @@ async def is_admin(token: str = Depends(oauth2_scheme)):
         return user
         
     except Exception as e:
-        print(f"Admin check error: {e}")  # デバッグログ
+        logger.warning(f"Admin check error: {e}")
         raise
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
@@ -117,105 +119,106 @@ async def discord_login(request: Request, auth_request: DiscordAuthRequest, rate
         )
     
     try:
-        async with aiohttp.ClientSession() as session:
-            # トークン取得
-            token_url = f"{DISCORD_API_ENDPOINT}/oauth2/token"
+        # 共有セッションを使い、Discord APIへの接続を再利用する
+        session = http_client.session
+        # トークン取得
+        token_url = f"{DISCORD_API_ENDPOINT}/oauth2/token"
+        
+        data = {
+            "client_id": Config.DISCORD_CLIENT_ID,
+            "client_secret": Config.DISCORD_CLIENT_SECRET,
+            "grant_type": "authorization_code",
+            "code": auth_request.code,
+            "redirect_uri": auth_request.redirect_uri
+        }
+        
+        async with session.post(
+            token_url,
+            data=data,
+            headers={'Content-Type': 'application/x-www-form-urlencoded'}
+        ) as response:
+            token_data = await response.json()
             
-            data = {
-                "client_id": Config.DISCORD_CLIENT_ID,
-                "client_secret": Config.DISCORD_CLIENT_SECRET,
-                "grant_type": "authorization_code",
-                "code": auth_request.code,
-                "redirect_uri": auth_request.redirect_uri
+            if (response.status != 200):
+                logger.error(f"Discord token error: {token_data}")
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Failed to get Discord token: {token_data.get('error_description', 'Unknown error')}"
+                )
+
+            # ユーザー情報を取得
+            user_url = f"{DISCORD_API_ENDPOINT}/users/@me"
+            headers = {
+                "Authorization": f"Bearer {token_data['access_token']}"
             }
             
-            async with session.post(
-                token_url,
-                data=data,
-                headers={'Content-Type': 'application/x-www-form-urlencoded'}
-            ) as response:
-                token_data = await response.json()
-                
-                if (response.status != 200):
-                    print(f"Discord token error: {token_data}")
+            async with session.get(user_url, headers=headers) as response:
+                user_data = await response.json()
+                if response.status != 200:
                     raise HTTPException(
-                        status_code=400,
-                        detail=f"Failed to get Discord token: {token_data.get('error_description', 'Unknown error')}"
+                        status_code=response.status,
+                        detail="Failed to get Discord user data"
                     )
 
-                # ユーザー情報を取得
-                user_url = f"{DISCORD_API_ENDPOINT}/users/@me"
-                headers = {
-                    "Authorization": f"Bearer {token_data['access_token']}"
-                }
-                
-                async with session.get(user_url, headers=headers) as response:
-                    user_data = await response.json()
-                    if response.status != 200:
-                        raise HTTPException(
-                            status_code=response.status,
-                            detail="Failed to get Discord user data"
-                        )
-
-                # ユーザー情報の作成または更新
-                discord_id = str(user_data["id"])
-                existing_user = await db.get_user_by_discord_id(discord_id)
-                
-                current_time = datetime.utcnow()
-                user_info = {
-                    "discord_id": discord_id,
-                    "username": user_data["username"],
-                    "avatar": f"https://cdn.discordapp.com/avatars/{discord_id}/{user_data['avatar']}.png" if user_data.get('avatar') else None,
-                    "email": user_data.get("email"),
-                    "last_login": current_time
-                }
+            # ユーザー情報の作成または更新
+            discord_id = str(user_data["id"])
+            existing_user = await db.get_user_by_discord_id(discord_id)
+            
+            current_time = datetime.utcnow()
+            user_info = {
+                "discord_id": discord_id,
+                "username": user_data["username"],
+                "avatar": f"https://cdn.discordapp.com/avatars/{discord_id}/{user_data['avatar']}.png" if user_data.get('avatar') else None,
+                "email": user_data.get("email"),
+                "last_login": current_time
+            }
 
-                if not existing_user:
-                    # 新規ユーザー
-                    user_info.update({
-                        "created_at": current_time,
-                        "balance": 0,
-                        "is_new_user": True,
-                        "is_admin": False  # デフォルトは非管理者
-                    })
-                    result = await db.create_user(user_info)
-                    user_info["_id"] = str(result.inserted_id)
-                else:
-                    # 既存ユーザー
-                    user_info.update({
-                        "is_new_user": False,
-                        "balance": existing_user.get("balance", 0),
-                        "created_at": existing_user.get("created_at", current_time),
-                        "is_admin": existing_user.get("is_admin", False)  # 既存の管理者フラグを保持
-                    })
-                    await db.update_user(discord_id, {k: v for k, v in user_info.items() if k != "_id"})
-                    user_info["_id"] = str(existing_user["_id"])
+            if not existing_user:
+                # 新規ユーザー
+                user_info.update({
+                    "created_at": current_time,
+                    "balance": 0,
+                    "is_new_user": True,
+                    "is_admin": False  # デフォルトは非管理者
+                })
+                result = await db.create_user(user_info)
+                user_info["_id"] = str(result.inserted_id)
+            else:
+                # 既存ユーザー
+                user_info.update({
+                    "is_new_user": False,
+                    "balance": existing_user.get("balance", 0),
+                    "created_at": existing_user.get("created_at", current_time),
+                    "is_admin": existing_user.get("is_admin", False)  # 既存の管理者フラグを保持
+                })
+                await db.update_user(discord_id, {k: v for k, v in user_info.items() if k != "_id"})
+                user_info["_id"] = str(existing_user["_id"])
 
-                # レスポンス用にdatetimeをISOフォーマットに変換
-                response_data = {
-                    **user_info,
-                    "created_at": user_info["created_at"].isoformat(),
-                    "last_login": user_info["last_login"].isoformat()
-                }
+            # レスポンス用にdatetimeをISOフォーマットに変換
+            response_data = {
+                **user_info,
+                "created_at": user_info["created_at"].isoformat(),
+                "last_login": user_info["last_login"].isoformat()
+            }
 
-                # JWTトークンを生成
-                token_data = await create_access_token({"sub": discord_id})
+            # JWTトークンを生成
+            token_data = await create_access_token({"sub": discord_id})
 
-                # ログイン成功を記録
-                await log_security_event(
-                    ip_address=client_ip,
-                    user_id=discord_id,
-                    event_type="login_success",
-                    details={"auth_type": "discord"},
-                    severity="INFO"
-                )
+            # ログイン成功を記録
+            await log_security_event(
+                ip_address=client_ip,
+                user_id=discord_id,
+                event_type="login_success",
+                details={"auth_type": "discord"},
+                severity="INFO"
+            )
 
-                return {
-                    "access_token": token_data.access_token,
-                    "token_type": token_data.token_type,
-                    "expires_in": token_data.expires_in,
-                    "user": response_data
-                }
+            return {
+                "access_token": token_data.access_token,
+                "token_type": token_data.token_type,
+                "expires_in": token_data.expires_in,
+                "user": response_data
+            }
 
     except HTTPException as he:
         raise he
@@ -227,49 +230,34 @@ async def discord_login(request: Request, auth_request: DiscordAuthRequest, rate
             details={"auth_type": "discord", "error": str(e)},
             severity="ERROR"
         )
-        print(f"Login error: {str(e)}")
+        logger.error(f"Login error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/login/token")
-async def token_login(login: UserLogin):
-    """ログイントークンを使用してログイン"""
-    user = await db.get_user_by_token(login.login_token)
+async def _login_with_token(token: str):
+    """ワンタイムのログイントークンを消費してJWTを発行"""
+    user = await db.consume_login_token(token)
     if not user:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
     # JWTトークンを生成
-    access_token = await create_access_token({"sub": user["discord_id"]})
+    token_data = await create_access_token({"sub": user["discord_id"]})
     
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": UserResponse(**user, is_new_user=False)
+        "access_token": token_data.access_token,
+        "token_type": token_data.token_type,
+        "expires_in": token_data.expires_in,
+        "user": UserResponse(**{**user, "is_new_user": False})
     }
 
+@router.post("/login/token")
+async def token_login(login: UserLogin):
+    """ログイントークンを使用してログイン"""
+    return await _login_with_token(login.login_token)
+
 @router.post("/login/token/{token}")
-async def token_login(token: str):
+async def token_login_from_url(token: str):
     """URLからのトークンを使用してログイン"""
-    user = await db.get_user_by_token(token)
-    if not user:
-        raise HTTPException(status_code=400, detail="Invalid or expired token")
-
-    # トークンデータを生成
-    token_data = await create_access_token({"sub": user["discord_id"]})
-    
-    # ログイントークンを無効化
-    await db.update_user(
-        user["discord_id"], 
-        {
-            "login_token": None,
-            "token_expires": None,
-            "last_login": datetime.utcnow()
-        }
-    )
-    
-    return {
-        **token_data.dict(),
-        "user": UserResponse(**user, is_new_user=False)
-    }
+    return await _login_with_token(token)
 
 @router.post("/login")
 async def login(token: str = Depends(oauth2_scheme)):
@@ -284,7 +272,7 @@ async def login(token: str = Depends(oauth2_scheme)):
         # ログインクエストの進捗を更新
         try:
             await QuestManager.handle_login(user_id)
-            print(f"Login quest progress updated for user {user_id}")
+            logger.info(f"Login quest progress updated for user {user_id}")
             
             # ユーザー情報を返す前に最新の情報を取得
             updated_user = await db.get_user_by_discord_id(user_id)
@@ -300,11 +288,11 @@ async def login(token: str = Depends(oauth2_scheme)):
                 }
             }
         except Exception as e:
-            print(f"Error updating login quest progress: {e}")
+            logger.error(f"Error updating login quest progress: {e}")
             raise HTTPException(status_code=500, detail="ログインクエストの更新に失敗しました")
             
     except Exception as e:
-        print(f"Login error: {e}")
+        logger.error(f"Login error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/password-reset/request")
@@ -4,10 +4,14 @@ from typing import Optional, List
 import random
 from api.routes.auth import oauth2_scheme, verify_token 
 from api.utils.db import db
+from api.utils.balance_buffer import casino_balance_buffer
 from datetime import datetime, timedelta
 from fastapi.responses import JSONResponse
+from bson import ObjectId
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 class BetRequest(BaseModel):
     amount: int
@@ -35,32 +39,48 @@ async def place_bet(request: BetRequest, token: str = Depends(oauth2_scheme)):
         if request.amount <= 0:
             raise HTTPException(status_code=400, detail="ベット額は1以上である必要があります")
             
-        # 残高チェック
-        current_balance = user.get('balance', 0)
+        # 残高チェック（未書き込みの差分を含める）
+        if casino_balance_buffer.enabled:
+            # 残高の読み取りと未書き込みの差分を同じ時点の組み合わせで取得し、ここから差分の追加まではawaitを挟まない
+            current_balance = await casino_balance_buffer.current_balance(user_id) or 0
+        else:
+            current_balance = user.get('balance', 0)
         if current_balance < request.amount:
             raise HTTPException(status_code=400, detail="残高が不足しています")
         
         try:
-            # ベットを記録
-            await db.db.casino_bets.insert_one({
-                "user_id": user_id,
-                "username": user.get("username", "Unknown"),
-                "avatar": user.get("avatar"),
-                "game": request.game,
-                "amount": request.amount,
-                "timestamp": datetime.utcnow(),
-                "completed": False
-            })
+            bet_id = ObjectId()
+            ref = {"bet_id": str(bet_id), "game": request.game}
             
-            # 残高を減らす
-            await db.db.users.update_one(
-                {"discord_id": user_id},
-                {"$inc": {"balance": -request.amount}}
-            )
+            if casino_balance_buffer.enabled:
+                # 差分をメモリに溜め、ベット記録を正とする
+                casino_balance_buffer.add(user_id, -request.amount, "casino_bet", ref)
+                updated_balance = current_balance - request.amount
+            else:
+                # 残高を減らして台帳に記録（残高が足りない場合は減算しない）
+                updated_balance = await db.apply_balance_delta(
+                    user_id, -request.amount, "casino_bet", ref, require_balance=True
+                )
+                if updated_balance is None:
+                    raise HTTPException(status_code=400, detail="残高が不足しています")
             
-            # 更新された残高を取得
-            updated_user = await db.get_user_by_discord_id(user_id)
-            updated_balance = updated_user.get('balance', 0)
+            # ベットを記録
+            try:
+                await db.db.casino_bets.insert_one({
+                    "_id": bet_id,
+                    "user_id": user_id,
+                    "username": user.get("username", "Unknown"),
+                    "avatar": user.get("avatar"),
+                    "game": request.game,
+                    "amount": request.amount,
+                    "timestamp": datetime.utcnow(),
+                    "completed": False
+                })
+            except Exception:
+                if casino_balance_buffer.enabled:
+                    # ベット記録が正のため、記録できなかったベットの差分は取り消す
+                    casino_balance_buffer.add(user_id, request.amount, "casino_bet_cancel", ref)
+                raise
             
             return JSONResponse(  # Response() から JSONResponse() へ変更
                 content={
@@ -69,15 +89,17 @@ async def place_bet(request: BetRequest, token: str = Depends(oauth2_scheme)):
                     "current_balance": updated_balance
                 }
             )
+        except HTTPException as e:
+            raise e
         except Exception as e:
             # データベース処理のエラーを明示的に処理
-            print(f"データベース処理エラー: {str(e)}")
+            logger.error(f"データベース処理エラー: {str(e)}")
             raise HTTPException(status_code=500, detail=f"データベース処理エラー: {str(e)}")
             
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"ベット処理エラー: {str(e)}")
+        logger.error(f"ベット処理エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"内部エラー: {str(e)}")
 
 @router.post("/result")
@@ -102,16 +124,35 @@ async def process_result(request: ResultRequest, token: str = Depends(oauth2_sch
             if not latest_bet:
                 raise HTTPException(status_code=400, detail="処理対象のベットが見つかりません")
                 
-            # 勝敗結果を更新
+            # 勝敗結果を計算
             win_amount = 0
             if request.won:
                 win_amount = int(request.amount * request.multiplier)
-                
-                # 残高を増やす
-                await db.db.users.update_one(
-                    {"discord_id": user_id},
-                    {"$inc": {"balance": win_amount}}
-                )
+
+            # 残高より先にベットを完了状態に更新（ベット記録を正とし、同じベットの二重処理も防ぐ）
+            completed = await db.db.casino_bets.update_one(
+                {"_id": latest_bet["_id"], "completed": False},
+                {
+                    "$set": {
+                        "completed": True,
+                        "won": request.won,
+                        "multiplier": request.multiplier,
+                        "win_amount": win_amount,
+                        "pattern": request.pattern,
+                        "completed_at": datetime.utcnow()
+                    }
+                }
+            )
+            if completed.modified_count == 0:
+                raise HTTPException(status_code=400, detail="処理対象のベットが見つかりません")
+
+            if request.won:
+                # 残高を増やして台帳に記録
+                ref = {"bet_id": str(latest_bet["_id"]), "game": request.game}
+                if casino_balance_buffer.enabled:
+                    casino_balance_buffer.add(user_id, win_amount, "casino_win", ref)
+                else:
+                    await db.apply_balance_delta(user_id, win_amount, "casino_win", ref)
                 
                 # 連勝記録を更新
                 await db.db.users.update_one(
@@ -125,43 +166,32 @@ async def process_result(request: ResultRequest, token: str = Depends(oauth2_sch
                     {"$set": {"casino_win_streak": 0}}
                 )
             
-            # ベットを完了状態に更新
-            await db.db.casino_bets.update_one(
-                {"_id": latest_bet["_id"]},
-                {
-                    "$set": {
-                        "completed": True,
-                        "won": request.won,
-                        "multiplier": request.multiplier,
-                        "win_amount": win_amount,
-                        "pattern": request.pattern,
-                        "completed_at": datetime.utcnow()
-                    }
-                }
-            )
-            
             # ユーザーの最新情報を取得
             updated_user = await db.get_user_by_discord_id(user_id)
+            current_balance = (
+                casino_balance_buffer.merge_balance(updated_user)
+                if casino_balance_buffer.enabled else updated_user.get("balance", 0)
+            )
             
             return JSONResponse(  # Response() から JSONResponse() へ変更
                 content={
                     "success": True, 
                     "won": request.won,
                     "amount": win_amount if request.won else 0,
-                    "current_balance": updated_user.get("balance", 0),
+                    "current_balance": current_balance,
                     "message": "結果が処理されました"
                 }
             )
         except HTTPException as e:
             raise e
         except Exception as e:
-            print(f"データベース処理エラー: {str(e)}")
+            logger.error(f"データベース処理エラー: {str(e)}")
             raise HTTPException(status_code=500, detail=f"データベース処理エラー: {str(e)}")
             
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"結果処理エラー: {str(e)}")
+        logger.error(f"結果処理エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"内部エラー: {str(e)}")
 
 @router.get("/leaderboard")
@@ -228,5 +258,5 @@ async def get_leaderboard(
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"ランキング取得エラー: {str(e)}")
+        logger.error(f"ランキング取得エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"内部エラー: {str(e)}")
\ No newline at end of file
@@ -1,96 +1,26 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import JSONResponse
-import os
-import base64
-from datetime import datetime, timedelta
-import requests
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
 import logging
+from api.utils.broadcast import CLOSED, pump_to_websocket
+from api.utils.config import Config
+from api.utils.market_data import market_data, market_hub, chart_cache
 
 router = APIRouter()
 logger = logging.getLogger("api.crypto")
 
-# マーケットデータのキャッシュと最終更新時間
-market_data_cache = None
-last_cache_update = datetime.min
-
 @router.get("/market")
-async def get_market_data():
+async def get_market_data(include_chart: bool = True):
     """マーケットデータを取得"""
-    global market_data_cache, last_cache_update
-    
     try:
-        # キャッシュが有効かチェック (1分間有効)
-        cache_valid = (datetime.now() - last_cache_update).total_seconds() < 60
-        
-        if market_data_cache and cache_valid:
-            return market_data_cache
-        
-        # WebSocketサーバーからデータを取得
-        try:
-            response = requests.get("http://localhost:8001/api/crypto/market", timeout=5)
-            
-            if response.status_code == 200:
-                market_data_cache = response.json()
-                last_cache_update = datetime.now()
-                return market_data_cache
-        except requests.RequestException as e:
-            logger.error(f"WebSocketサーバー接続エラー: {e}")
-            
-        # WebSocketサーバーからの取得に失敗した場合はフォールバック処理
-        # 画像ファイルを読み込む（相対パスに修正）
-        image_path = os.path.join(
-            os.path.dirname(__file__), 
-            "../../bot/data/website_chart.png"
-        )
+        # キャッシュ済みのスナップショットを返す（更新はバックグラウンドで行う）
+        snapshot = await market_data.get()
         
-        if not os.path.exists(image_path):
-            image_path = os.path.join(
-                os.path.dirname(__file__), 
-                "../static/default_chart.png"
-            )
-            
-            if not os.path.exists(image_path):
-                logger.warning("チャート画像が見つかりません")
-                # チャートなしでデータを返す
-                market_data_cache = {
-                    "success": True,
-                    "data": {
-                        "price": {
-                            "current": 1250,
-                            "change_rate": 0.0
-                        },
-                        "volume": {
-                            "24h": 0
-                        },
-                        "market_cap": 12500000,
-                        "timestamp": int(datetime.utcnow().timestamp()),
-                        "chart": ""
-                    }
-                }
-                last_cache_update = datetime.now()
-                return market_data_cache
-        
-        with open(image_path, "rb") as image_file:
-            chart_base64 = base64.b64encode(image_file.read()).decode()
-
-        # マーケットデータを返す
-        market_data_cache = {
-            "success": True,
-            "data": {
-                "price": {
-                    "current": 1250,
-                    "change_rate": 2.5
-                },
-                "volume": {
-                    "24h": 50000
-                },
-                "market_cap": 12500000,
-                "timestamp": int(datetime.utcnow().timestamp()),
-                "chart": chart_base64
-            }
-        }
-        last_cache_update = datetime.now()
-        return market_data_cache
+        # チャートを /chart から別途取得するクライアントにはBase64画像を含めない
+        if not include_chart and isinstance(snapshot.get("data"), dict):
+            data = {k: v for k, v in snapshot["data"].items() if k != "chart"}
+            return {**snapshot, "data": data}
+        return snapshot
         
     except Exception as e:
         logger.error(f"マーケットデータ取得エラー: {e}")
@@ -100,4 +30,62 @@ async def get_market_data():
                 "success": False,
                 "error": str(e)
             }
-        )
\ No newline at end of file
+        )
+
+@router.get("/chart")
+async def get_chart_image(request: Request):
+    """チャート画像をPNGで取得（If-None-Matchによる再検証に対応）"""
+    chart = await asyncio.to_thread(chart_cache.load)
+    if chart is None:
+        raise HTTPException(status_code=404, detail="チャート画像が見つかりません")
+    
+    headers = {
+        "ETag": chart.etag,
+        "Cache-Control": f"public, max-age={Config.CHART_CACHE_MAX_AGE_SECONDS}"
+    }
+    
+    # 画像が変わっていなければ本文を返さない
+    if_none_match = request.headers.get("if-none-match", "")
+    if chart.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=chart.data, media_type="image/png", headers=headers)
+
+
+@router.get("/market/stream")
+async def stream_market_data():
+    """マーケットデータをServer-Sent Eventsで配信"""
+    queue = market_hub.subscribe()
+    
+    async def event_stream():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=Config.STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # プロキシに接続を切られないようにコメント行を送る
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is CLOSED:
+                    break
+                yield f"data: {message}\n\n"
+        finally:
+            market_hub.unsubscribe(queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/market/ws")
+async def market_websocket(websocket: WebSocket):
+    """マーケットデータをWebSocketで配信"""
+    await websocket.accept()
+    queue = market_hub.subscribe()
+    try:
+        await pump_to_websocket(websocket, queue)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        market_hub.unsubscribe(queue)
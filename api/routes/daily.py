@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from datetime import datetime, timedelta
+import hashlib
 from api.routes.auth import oauth2_scheme, verify_token
+from api.utils.daily_bonus import bonus_for_streak
 from api.utils.db import db
 from api.utils.quest_manager import QuestManager
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.post("/claim")
 async def claim_daily_bonus(token: str = Depends(oauth2_scheme)):
@@ -12,57 +16,20 @@ async def claim_daily_bonus(token: str = Depends(oauth2_scheme)):
     try:
         # ユーザーIDを取得
         user_id = await verify_token(token)
-        user = await db.get_user_by_discord_id(user_id)
-        
-        if not user:
-            raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
-            
-        # 最終ボーナス受け取り日時を確認
-        last_claim = user.get("daily_bonus_last_claim")
         now = datetime.utcnow()
         
-        # 本日すでに受け取り済みかチェック
-        if last_claim and last_claim.date() == now.date():
-            raise HTTPException(status_code=400, detail="本日はすでにデイリーボーナスを受け取っています")
-            
-        # 連続ログイン日数を計算
-        streak = user.get("daily_bonus_streak", 0)
-        
-        # 昨日受け取っていたら連続日数を増やす、そうでなければリセット
-        if last_claim and (now.date() - last_claim.date()) == timedelta(days=1):
-            streak += 1
-        elif last_claim and (now.date() - last_claim.date()) > timedelta(days=1):
-            streak = 1
-        else:
-            streak = 1
-            
-        # ボーナス金額を計算
-        base_amount = 100  # 基本ボーナス額
-        bonus_multiplier = min(streak, 30) / 10  # 最大x3.0までボーナス
+        # 連続日数・ボーナス額の計算と残高の加算をDB側で1回の更新として行う
+        claimed = await db.claim_daily_bonus(user_id, now)
         
-        # 特別ボーナス (7日、14日、30日でさらにボーナス)
-        special_bonus = 0
-        if streak == 7:
-            special_bonus = 200  # 7日連続で200追加
-        elif streak == 14:
-            special_bonus = 500  # 14日連続で500追加
-        elif streak == 30:
-            special_bonus = 1000  # 30日連続で1000追加
-            
-        amount = int(base_amount * (1 + bonus_multiplier)) + special_bonus
-        
-        # ユーザーの残高を更新
-        await db.increase_user_balance(user_id, amount)
+        if not claimed:
+            # 更新できなかった理由を判別
+            user = await db.get_user_by_discord_id(user_id)
+            if not user:
+                raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
+            raise HTTPException(status_code=400, detail="本日はすでにデイリーボーナスを受け取っています")
         
-        # 最終受け取り日時と連続日数を更新
-        await db.db.users.update_one(
-            {"discord_id": user_id},
-            {"$set": {
-                "daily_bonus_last_claim": now,
-                "daily_bonus_streak": streak,
-                "daily_bonus_total_claims": user.get("daily_bonus_total_claims", 0) + 1
-            }}
-        )
+        streak = claimed["daily_bonus_streak"]
+        amount = claimed["daily_bonus_last_amount"]
         
         # クエスト進捗を更新
         await QuestManager.handle_daily_bonus(user_id)
@@ -78,16 +45,19 @@ async def claim_daily_bonus(token: str = Depends(oauth2_scheme)):
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"デイリーボーナス処理エラー: {str(e)}")
+        logger.error(f"デイリーボーナス処理エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"内部エラー: {str(e)}")
 
 @router.get("/status")
-async def check_daily_status(token: str = Depends(oauth2_scheme)):
+async def check_daily_status(request: Request, response: Response, token: str = Depends(oauth2_scheme)):
     """デイリーボーナスのステータスを確認"""
     try:
         # ユーザーIDを取得
         user_id = await verify_token(token)
-        user = await db.get_user_by_discord_id(user_id)
+        user = await db.db.users.find_one(
+            {"discord_id": user_id},
+            {"daily_bonus_last_claim": 1, "daily_bonus_streak": 1, "daily_bonus_total_claims": 1}
+        )
         
         if not user:
             raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
@@ -108,18 +78,16 @@ async def check_daily_status(token: str = Depends(oauth2_scheme)):
         
         # 明日受け取れるボーナス予測額
         next_streak = streak + 1 if last_claim and (now.date() - last_claim.date()) <= timedelta(days=1) else 1
-        base_amount = 100
-        bonus_multiplier = min(next_streak, 30) / 10
+        next_amount = bonus_for_streak(next_streak)
         
-        special_bonus = 0
-        if next_streak == 7:
-            special_bonus = 200
-        elif next_streak == 14:
-            special_bonus = 500
-        elif next_streak == 30:
-            special_bonus = 1000
-            
-        next_amount = int(base_amount * (1 + bonus_multiplier)) + special_bonus
+        # ステータスは1日1回しか変わらないため、日付と受け取り状況からETagを作る
+        etag_source = f"{user_id}:{now.date()}:{last_claim}:{streak}:{total_claims}"
+        etag = f'W/"{hashlib.sha1(etag_source.encode()).hexdigest()}"'
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=cache_headers)
+        response.headers.update(cache_headers)
         
         return {
             "claimed_today": claimed_today,
@@ -132,5 +100,5 @@ async def check_daily_status(token: str = Depends(oauth2_scheme)):
         }
         
     except Exception as e:
-        print(f"デイリーボーナスステータスエラー: {str(e)}")
+        logger.error(f"デイリーボーナスステータスエラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"内部エラー: {str(e)}")
\ No newline at end of file
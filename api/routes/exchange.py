@@ -1,41 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
+from pymongo.errors import DuplicateKeyError
+from typing import Optional
 from ..models.exchange import ExchangeRequestCreate
 from ..utils.db import db
 from ..routes.auth import oauth2_scheme, verify_token
 from datetime import datetime
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.post("/request")
 async def create_exchange_request(
     request: ExchangeRequestCreate,
-    token: str = Depends(oauth2_scheme)
+    token: str = Depends(oauth2_scheme),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=128)
 ):
     """PARC交換リクエストを作成"""
     try:
         user_id = await verify_token(token)
         
-        # ユーザーの残高を確認
-        user = await db.get_user_by_discord_id(user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-            
-        if user.get("balance", 0) < request.amount:
-            raise HTTPException(status_code=400, detail="Insufficient balance")
-
-        # 残高を減少
-        success = await db.decrease_user_balance(user_id, request.amount)
-        if not success:
-            raise HTTPException(status_code=400, detail="Failed to update balance")
-
-        # 交換リクエストを作成
-        exchange_id = await db.create_exchange_request({
-            "user_id": user_id,
+        # 同じ冪等キーのリクエストが処理済みなら、残高を減らさずに同じ結果を返す
+        if idempotency_key:
+            existing = await db.get_exchange_request_by_key(user_id, idempotency_key)
+            if existing:
+                return {"id": existing["id"], "message": "Exchange request created successfully"}
+        
+        # 残高の減算と交換リクエストの作成をまとめて行う
+        request_data = {
             "username": request.username,
             "amount": request.amount,
             "status": "pending",
             "created_at": datetime.utcnow()
-        })
+        }
+        for _ in range(2):
+            try:
+                exchange_id = await db.create_exchange_with_debit(
+                    user_id, request_data, idempotency_key=idempotency_key
+                )
+                break
+            except DuplicateKeyError:
+                # 同じキーの同時リクエストが先に処理された
+                existing = await db.get_exchange_request_by_key(user_id, idempotency_key)
+                if existing:
+                    return {"id": existing["id"], "message": "Exchange request created successfully"}
+                # 先のリクエストが残高不足などで取り消された場合は作成をやり直す
+        else:
+            raise HTTPException(status_code=409, detail="A request with the same Idempotency-Key is in progress")
+        
+        if not exchange_id:
+            user = await db.get_user_by_discord_id(user_id)
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+            raise HTTPException(status_code=400, detail="Insufficient balance")
 
         # 通知を作成
         await db.create_notification({
@@ -49,8 +66,10 @@ async def create_exchange_request(
 
         return {"id": exchange_id, "message": "Exchange request created successfully"}
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
-        print(f"Error creating exchange request: {e}")
+        logger.error(f"Error creating exchange request: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{exchange_id}/complete")
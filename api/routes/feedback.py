@@ -4,8 +4,10 @@ from api.models.feedback import FeedbackCreate, FeedbackResponse
 from api.utils.db import db
 from api.utils.quest_manager import QuestManager
 from datetime import datetime
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.post("")
 async def create_feedback(
@@ -45,7 +47,7 @@ async def create_feedback(
             "message": "Feedback submitted successfully"
         }
     except Exception as e:
-        print(f"Error creating feedback: {e}")
+        logger.error(f"Error creating feedback: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/my")
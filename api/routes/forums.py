@@ -10,8 +10,10 @@ import json
 from api.utils.quest_manager import QuestManager
 from pydantic import BaseModel
 from api.utils.security import report_limit_required, log_security_event, check_report_attempts
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 def serialize_datetime(obj):
     """datetimeオブジェクトをISOフォーマットに変換"""
@@ -124,7 +126,7 @@ async def delete_post(
         return {"message": "Post deleted successfully"}
         
     except Exception as e:
-        print(f"Error deleting post: {e}")
+        logger.error(f"Error deleting post: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/posts/{post_id}/comments")
@@ -199,7 +201,7 @@ async def delete_comment(
         return {"message": "Comment deleted successfully"}
         
     except Exception as e:
-        print(f"Error deleting comment: {e}")
+        logger.error(f"Error deleting comment: {e}")
         raise HTTPException(status_code=500, detail="Failed to delete comment")
 
 # api/routes/forums.py
@@ -229,7 +231,7 @@ async def get_posts(
         
         return posts
     except Exception as e:
-        print(f"Error getting forum posts: {e}")
+        logger.error(f"Error getting forum posts: {e}")
         raise HTTPException(status_code=500, detail="フォーラム投稿の取得に失敗しました")
 
 @router.get("/posts/{post_id}")
@@ -275,7 +277,7 @@ async def get_forum_post(post_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error getting forum post: {e}")
+        logger.error(f"Error getting forum post: {e}")
         raise HTTPException(status_code=500, detail="投稿の取得に失敗しました")
 
 @router.post("/posts/{post_id}/reactions")  # URLを修正
@@ -304,7 +306,7 @@ async def add_reaction(
     except HTTPException as he:
         raise he
     except Exception as e:
-        print(f"Error adding reaction: {e}")
+        logger.error(f"Error adding reaction: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # トークン検証を使用して report_limit_required を修正
@@ -399,5 +401,5 @@ async def report_post(
             details={"error": str(e)},
             severity="ERROR"
         )
-        print(f"Error reporting: {e}")
+        logger.error(f"Error reporting: {e}")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
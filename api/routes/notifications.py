@@ -1,6 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
 from api.routes.auth import oauth2_scheme, verify_token
+from api.utils.broadcast import CLOSED, pump_to_websocket
+from api.utils.config import Config
 from api.utils.db import db
+from api.utils.notification_bus import notification_bus
 from datetime import datetime
 
 router = APIRouter()
@@ -13,4 +19,56 @@ async def get_my_notifications(token: str = Depends(oauth2_scheme)):
         notifications = await db.get_user_notifications(user_id)
         return notifications
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/stream")
+async def stream_my_notifications(request: Request, token: Optional[str] = None):
+    """自分宛ての新しい通知をServer-Sent Eventsで配信"""
+    # EventSourceはヘッダーを付けられないため、クエリパラメータのトークンも受け付ける
+    auth_header = request.headers.get("Authorization", "")
+    if auth_header.startswith("Bearer "):
+        token = auth_header.split(" ")[1]
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user_id = await verify_token(token)
+    
+    queue = notification_bus.subscribe(user_id)
+    
+    async def event_stream():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=Config.STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is CLOSED:
+                    break
+                yield f"event: notification\ndata: {message}\n\n"
+        finally:
+            notification_bus.unsubscribe(user_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws")
+async def notifications_websocket(websocket: WebSocket, token: str):
+    """自分宛ての新しい通知をWebSocketで配信"""
+    try:
+        user_id = await verify_token(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    queue = notification_bus.subscribe(user_id)
+    try:
+        # 通知は稀なため、切断は受信側で検知してすぐに購読を解除する
+        await pump_to_websocket(websocket, queue)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        notification_bus.unsubscribe(user_id, queue)
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from api.routes.auth import oauth2_scheme, verify_token
 from api.utils.db import db
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.get("/daily")
 async def get_daily_quests(token: str = Depends(oauth2_scheme)):
@@ -101,5 +103,5 @@ async def claim_quest_reward(quest_id: str, token: str = Depends(oauth2_scheme))
             "success": True
         }
     except Exception as e:
-        print(f"Error claiming quest reward: {e}")
+        logger.error(f"Error claiming quest reward: {e}")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
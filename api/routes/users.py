@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
 from ..models.users import UserUpdate, UserResponse
 from ..utils.db import db
+from ..utils.balance_buffer import casino_balance_buffer
 from ..routes.auth import verify_token, oauth2_scheme
 
 router = APIRouter()
@@ -14,8 +16,27 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    # カジノの未書き込みの残高差分を反映
+    if casino_balance_buffer.enabled:
+        user["balance"] = casino_balance_buffer.merge_balance(user)
+    
     return UserResponse(**user)
 
+@router.get("/me/ledger")
+async def get_my_ledger(
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    token: str = Depends(oauth2_scheme)
+):
+    """自分の残高履歴を新しい順に取得（beforeに最後のIDを渡すと続きを取得）"""
+    discord_id = await verify_token(token)
+    entries = await db.get_ledger_entries(discord_id, limit=limit, before=before)
+    
+    return {
+        "entries": entries,
+        "next_before": entries[-1]["id"] if len(entries) == limit else None
+    }
+
 # 追加: プロフィール情報をGETで取得するエンドポイント
 @router.get("/profile")
 async def get_profile(token: str = Depends(oauth2_scheme)):
@@ -0,0 +1,270 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from api.utils.config import Config
+from api.utils.db import db
+from api.utils.scheduler import SchedulerLeader
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 書き込みバッファを経由する台帳の理由
+CASINO_REASONS = ["casino_bet", "casino_win"]
+RECONCILE_BATCH_SIZE = 500
+# 稼働中のプロセスがまだ書き込んでいない可能性があるベットを照合対象から外す余裕
+RECONCILE_MARGIN_SECONDS = 60
+
+class BalanceWriteBehind:
+    """カジノの残高変動をメモリに溜め、一定間隔でまとめて書き込む"""
+
+    def __init__(self, enabled: bool, flush_interval_seconds: float, workers: int = 1):
+        if enabled and workers > 1:
+            # 差分はプロセス内にしかないため、複数ワーカーでは残高確認が正しく行えない
+            logger.error(f"Casino write-behind disabled: requires a single worker (WEB_CONCURRENCY={workers})")
+            enabled = False
+        self.enabled = enabled
+        self.flush_interval_seconds = flush_interval_seconds
+        # ユーザーID -> 未書き込みの残高差分
+        self._pending: Dict[str, float] = defaultdict(float)
+        # ユーザーID -> 書き込み中（確認待ち）の残高差分
+        self._inflight: Dict[str, float] = defaultdict(float)
+        # 未書き込みの台帳明細
+        self._entries: List[dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # 書き込み中の差分がDBに反映（または持ち越し）されるたびに増える
+        self._generation = 0
+
+    def pending_delta(self, user_id: str) -> float:
+        """ユーザーの未書き込みの残高差分（書き込み中のものを含む）"""
+        return self._pending.get(user_id, 0) + self._inflight.get(user_id, 0)
+
+    def merge_balance(self, user: dict) -> float:
+        """DB上の残高に未書き込みの差分を加えた実際の残高"""
+        return user.get("balance", 0) + self.pending_delta(user["discord_id"])
+
+    async def current_balance(self, user_id: str) -> Optional[float]:
+        """残高確認用に、読み取り中にフラッシュが完了していない組み合わせで実際の残高を取得"""
+        while True:
+            generation = self._generation
+            user = await db.db.users.find_one({"discord_id": user_id}, {"balance": 1})
+            if user is None:
+                return None
+            # 読み取り中に書き込みが完了した場合、古い残高と空になった差分を足すと多く見積もるため読み直す
+            if generation == self._generation:
+                return user.get("balance", 0) + self.pending_delta(user_id)
+
+    def add(self, user_id: str, amount: float, reason: str, ref: dict = None):
+        """残高差分を追加（awaitを挟まないため、同一プロセス内では残高確認と合わせて原子的）"""
+        self._pending[user_id] += amount
+        entry = db.ledger_entry(user_id, amount, reason, ref)
+        # 再試行しても明細が重複しないようIDを先に決める
+        entry["_id"] = ObjectId()
+        self._entries.append(entry)
+
+    async def flush(self):
+        """溜まった差分をbulk_writeで書き込む"""
+        async with self._flush_lock:
+            if not self._pending and not self._entries:
+                return
+
+            # 書き込みが確認されるまでは読み取り側で合算できるよう書き込み中に移す
+            pending, self._pending = self._pending, defaultdict(float)
+            entries, self._entries = self._entries, []
+            for user_id, delta in pending.items():
+                self._inflight[user_id] += delta
+
+            user_ids = [user_id for user_id, delta in pending.items() if delta]
+            failed_user_ids, failed_entries = [], entries
+            try:
+                if db.supports_transactions:
+                    failed_user_ids, failed_entries = await self._write_in_transaction(pending, user_ids, entries)
+                else:
+                    failed_user_ids, failed_entries = await self._write(pending, user_ids, entries)
+            except BaseException:
+                failed_user_ids = user_ids
+                raise
+            finally:
+                # 失敗した差分と明細を次回に持ち越し、書き込み中から外す（awaitを挟まず入れ替える）
+                for user_id in failed_user_ids:
+                    self._pending[user_id] += pending[user_id]
+                self._entries = failed_entries + self._entries
+                for user_id, delta in pending.items():
+                    remaining = self._inflight[user_id] - delta
+                    if abs(remaining) < 1e-9:
+                        del self._inflight[user_id]
+                    else:
+                        self._inflight[user_id] = remaining
+                self._generation += 1
+
+    @staticmethod
+    def _operations(pending: Dict[str, float], user_ids: List[str]) -> List[UpdateOne]:
+        """残高差分の更新操作"""
+        return [
+            UpdateOne({"discord_id": user_id}, {"$inc": {"balance": pending[user_id]}})
+            for user_id in user_ids
+        ]
+
+    async def _write_in_transaction(self, pending: Dict[str, float], user_ids: List[str], entries: List[dict]):
+        """残高と台帳を1つのトランザクションで書き込む（失敗したユーザーIDと明細を返す）"""
+        operations = self._operations(pending, user_ids)
+
+        async def write(session):
+            if operations:
+                await db.db.users.bulk_write(operations, ordered=False, session=session)
+            if entries:
+                await db.db.ledger.insert_many(entries, ordered=False, session=session)
+
+        try:
+            await db.run_in_transaction(write)
+            return [], []
+        except Exception as e:
+            logger.error(f"Balance write-behind flush error: {e}")
+            return user_ids, entries
+
+    async def _write(self, pending: Dict[str, float], user_ids: List[str], entries: List[dict]):
+        """トランザクション非対応の環境での書き込み（失敗したユーザーIDと明細を返す）"""
+        operations = self._operations(pending, user_ids)
+        failed = set()
+        try:
+            if operations:
+                await db.db.users.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            failed = {user_ids[error["index"]] for error in e.details.get("writeErrors", [])}
+            logger.warning(f"Balance write-behind partial failure: {len(failed)} errors")
+        except Exception as e:
+            # 書き込み結果が不明なため差分を戻して再試行する（ベット記録と台帳で照合可能）
+            logger.error(f"Balance write-behind flush error: {e}")
+            return user_ids, entries
+
+        # 残高を更新できたユーザーの明細のみ書き込む（台帳にある明細は照合時に適用済みとみなす）
+        inserts = [entry for entry in entries if entry["user_id"] not in failed]
+        failed_entries = [entry for entry in entries if entry["user_id"] in failed]
+        try:
+            if inserts:
+                await db.db.ledger.insert_many(inserts, ordered=False)
+        except BulkWriteError as e:
+            # 前回の再試行で書き込み済みの明細（重複キー）以外を持ち越す
+            retry = [
+                inserts[error["index"]] for error in e.details.get("writeErrors", [])
+                if error.get("code") != 11000
+            ]
+            if retry:
+                failed_entries += retry
+                logger.error(f"Balance write-behind ledger error: {len(retry)} entries will be retried")
+        except Exception as e:
+            failed_entries += inserts
+            logger.error(f"Balance write-behind ledger error: {e}")
+        return list(failed), failed_entries
+
+    async def reconcile(self, hours: int):
+        """ベット記録を正として、台帳に反映されていない損益を適用（起動時、書き込み開始前に呼び出す）"""
+        if not self.enabled:
+            return
+
+        # 再起動が重なった場合などに複数のプロセスで同時に照合しない
+        lock = SchedulerLeader(lock_id="casino_balance_reconcile")
+        if not await lock.try_acquire():
+            logger.info("Casino balance reconcile skipped: another worker holds the lock")
+            return
+        try:
+            await self._reconcile(hours)
+        finally:
+            await lock.release()
+
+    async def _reconcile(self, hours: int):
+        """照合の本体（ロックを取得してから呼び出す）"""
+        # 保留状態の明細を先に確定・破棄し、破棄された明細のベットを再適用の対象にする
+        await db.reconcile_pending_ledger()
+
+        # 台帳にカジノの明細がまだない期間のベットは対象外（台帳導入前のベットを二重に適用しない）
+        first_entry = await db.db.ledger.find_one(
+            {"reason": {"$in": CASINO_REASONS}},
+            {"created_at": 1},
+            sort=[("_id", 1)]
+        )
+        if not first_entry:
+            return
+        now = datetime.utcnow()
+        cutoff = max(now - timedelta(hours=hours), first_entry["created_at"])
+        # 他の稼働中のプロセスがまだフラッシュしていない可能性がある直近のベットは対象外
+        settled_before = now - timedelta(seconds=self.flush_interval_seconds + RECONCILE_MARGIN_SECONDS)
+
+        applied = 0
+        batch = []
+        cursor = db.db.casino_bets.find(
+            {"timestamp": {"$gte": cutoff, "$lt": settled_before}},
+            {"user_id": 1, "game": 1, "amount": 1, "won": 1, "win_amount": 1, "completed_at": 1}
+        )
+        async for bet in cursor:
+            batch.append(bet)
+            if len(batch) >= RECONCILE_BATCH_SIZE:
+                applied += await self._reconcile_batch(batch, settled_before)
+                batch = []
+        if batch:
+            applied += await self._reconcile_batch(batch, settled_before)
+
+        if applied:
+            logger.warning(f"Reconciled {applied} casino balance changes from the bet log")
+
+    async def _reconcile_batch(self, bets: List[dict], settled_before: datetime) -> int:
+        """ベットごとに台帳の明細を確認し、欠けている損益を適用"""
+        bet_ids = [str(bet["_id"]) for bet in bets]
+        recorded = set()
+        async for entry in db.db.ledger.find(
+            {"ref.bet_id": {"$in": bet_ids}, "reason": {"$in": CASINO_REASONS}},
+            {"ref.bet_id": 1, "reason": 1}
+        ):
+            recorded.add((entry["ref"]["bet_id"], entry["reason"]))
+
+        applied = 0
+        for bet in bets:
+            bet_id = str(bet["_id"])
+            ref = {"bet_id": bet_id, "game": bet.get("game")}
+            changes = [("casino_bet", -bet["amount"])]
+            completed_at = bet.get("completed_at")
+            if bet.get("won") and bet.get("win_amount") and completed_at and completed_at < settled_before:
+                changes.append(("casino_win", bet["win_amount"]))
+            for reason, amount in changes:
+                if (bet_id, reason) not in recorded:
+                    await db.apply_balance_delta(bet["user_id"], amount, reason, ref)
+                    applied += 1
+        return applied
+
+    async def _run(self):
+        """定期的にフラッシュするバックグラウンドタスク"""
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Balance write-behind loop error: {e}")
+
+    def start(self):
+        """バックグラウンドのフラッシュを開始"""
+        if self.enabled and (self._task is None or self._task.done()):
+            # 残高が必要な他の減算でも未書き込みの損益を考慮させる
+            db.pending_balance_delta = self.pending_delta
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """フラッシュを停止し、残りの差分を書き込む"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self.flush()
+
+# カジノ用の残高書き込みバッファ
+casino_balance_buffer = BalanceWriteBehind(
+    enabled=Config.CASINO_WRITE_BEHIND,
+    flush_interval_seconds=Config.CASINO_FLUSH_INTERVAL_MS / 1000,
+    workers=Config.WEB_CONCURRENCY
+)
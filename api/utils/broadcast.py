@@ -0,0 +1,86 @@
+import asyncio
+from typing import Any, Optional, Set
+
+# 購読が打ち切られたことを購読者に伝える番兵
+CLOSED = object()
+
+class BroadcastHub:
+    """購読者ごとの上限付きキューでメッセージを配信するハブ"""
+
+    def __init__(self, queue_size: int = 8, replay_latest: bool = True):
+        self.queue_size = queue_size
+        self.replay_latest = replay_latest
+        self.latest: Optional[Any] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        """現在の購読者数"""
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        """購読用のキューを作成（最新のメッセージがあればすぐに受け取れる）"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.replay_latest and self.latest is not None:
+            queue.put_nowait(self.latest)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """購読を解除"""
+        self._subscribers.discard(queue)
+
+    def publish(self, message: Any) -> int:
+        """全購読者にメッセージを配信し、取りこぼした遅い購読者は切断する"""
+        self.latest = message
+        dropped = 0
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(queue)
+                dropped += 1
+        return dropped
+
+    def close(self):
+        """全購読者に終了を通知"""
+        for queue in list(self._subscribers):
+            self._drop(queue)
+
+    def _drop(self, queue: asyncio.Queue):
+        """溜まったメッセージを捨てて終了の番兵を送る"""
+        self._subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(CLOSED)
+
+async def pump_to_websocket(websocket, queue: asyncio.Queue):
+    """キューのメッセージをWebSocketに送信（クライアントの切断は受信側で即座に検知して終了）"""
+
+    async def send():
+        while True:
+            message = await queue.get()
+            if message is CLOSED:
+                # 受信が追いつかないクライアントは切断する
+                await websocket.close(code=1013)
+                return
+            await websocket.send_text(message)
+
+    async def receive():
+        # クライアントからのメッセージは使わないが、切断を知るために読み続ける
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    sender = asyncio.create_task(send())
+    receiver = asyncio.create_task(receive())
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        await asyncio.gather(sender, receiver, return_exceptions=True)
+    for task in done:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
@@ -22,6 +22,7 @@ class Config:
     DISCORD_CLIENT_ID = os.getenv("DISCORD_CLIENT_ID")
     DISCORD_CLIENT_SECRET = os.getenv("DISCORD_CLIENT_SECRET")
     DISCORD_REDIRECT_URI = os.getenv("DISCORD_REDIRECT_URI")
+    DISCORD_API_ENDPOINT = os.getenv("DISCORD_API_ENDPOINT", "https://discord.com/api/v10")
     
     # JWT設定
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", secrets.token_urlsafe(32))
@@ -40,8 +41,63 @@ class Config:
 
     # データベース設定
     MONGODB_URL = os.getenv('MONGODB_URL', 'mongodb://localhost:27017')
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '100'))  # 接続プールの上限
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
     DB_NAME = os.getenv('DB_NAME', 'paraccoli')
 
+    # 外部HTTP通信設定
+    HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+    HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "3"))
+    HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+    HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+    HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30"))
+    HTTP_DNS_CACHE_SECONDS = int(os.getenv("HTTP_DNS_CACHE_SECONDS", "300"))
+
+    # マーケットデータ設定
+    MARKET_DATA_URL = os.getenv("MARKET_DATA_URL", "http://localhost:8001/api/crypto/market")
+    MARKET_DATA_TIMEOUT_SECONDS = float(os.getenv("MARKET_DATA_TIMEOUT_SECONDS", "5"))
+    MARKET_CACHE_TTL_SECONDS = float(os.getenv("MARKET_CACHE_TTL_SECONDS", "60"))
+    MARKET_REFRESH_INTERVAL_SECONDS = float(os.getenv("MARKET_REFRESH_INTERVAL_SECONDS", "30"))
+    CHART_CACHE_MAX_AGE_SECONDS = int(os.getenv("CHART_CACHE_MAX_AGE_SECONDS", "30"))
+
+    # ストリーム配信（SSE/WebSocket）設定
+    STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "8"))  # 購読者ごとの未送信メッセージ上限
+    STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+    NOTIFICATION_TAIL_INTERVAL_SECONDS = float(os.getenv("NOTIFICATION_TAIL_INTERVAL_SECONDS", "2"))
+    NOTIFICATION_TAIL_OVERLAP_SECONDS = float(os.getenv("NOTIFICATION_TAIL_OVERLAP_SECONDS", "10"))  # ポーリングで読み直す時間幅
+    NOTIFICATION_WATCH_RETRY_SECONDS = float(os.getenv("NOTIFICATION_WATCH_RETRY_SECONDS", "5"))  # change streamの再試行間隔（初回）
+    NOTIFICATION_WATCH_RETRY_MAX_SECONDS = float(os.getenv("NOTIFICATION_WATCH_RETRY_MAX_SECONDS", "300"))
+
+    # 残高台帳設定
+    # 本番環境はレプリカセットで動かすこと（残高の更新と台帳の書き込みを同じトランザクションで行うため）。
+    # スタンドアロンのMongoDBでは台帳の明細を保留状態で先に書き、定期ジョブで残高と照合して確定する
+    LEDGER_RETENTION_DAYS = int(os.getenv("LEDGER_RETENTION_DAYS", "90"))  # 明細を保持する日数
+
+    # レート制限・DDoS対策ミドルウェア（負荷試験でのみ無効化すること）
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+
+    # ログ設定
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if DEBUG else "INFO")
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # 一般ログのローテーションサイズ
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "14"))  # 保持する世代数
+    LOG_SECURITY_INFO_SAMPLE_RATE = float(os.getenv("LOG_SECURITY_INFO_SAMPLE_RATE", "0.1"))  # INFOのセキュリティイベントを出力する割合
+
+    # セキュリティログ設定
+    SECURITY_LOG_RETENTION_DAYS = int(os.getenv("SECURITY_LOG_RETENTION_DAYS", "30"))  # 個別イベントを保持する日数
+    SECURITY_ROLLUP_RETENTION_DAYS = int(os.getenv("SECURITY_ROLLUP_RETENTION_DAYS", "365"))  # 時間別集計を保持する日数
+
+    # ワーカー数（uvicornの--workersの既定値と同じ環境変数）
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+    # カジノの残高書き込みをまとめる（単一ワーカー構成でのみ有効、WEB_CONCURRENCYが2以上なら無効化される）
+    CASINO_WRITE_BEHIND = os.getenv("CASINO_WRITE_BEHIND", "False").lower() == "true"
+    CASINO_FLUSH_INTERVAL_MS = int(os.getenv("CASINO_FLUSH_INTERVAL_MS", "250"))
+    CASINO_RECONCILE_HOURS = int(os.getenv("CASINO_RECONCILE_HOURS", "24"))  # 起動時にベット記録と台帳を照合する期間
+
+    # スケジューラ設定（複数ワーカー間のリーダー選出）
+    SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))  # リースの有効期間
+    SCHEDULER_RENEW_SECONDS = int(os.getenv("SCHEDULER_RENEW_SECONDS", "10"))  # リース更新間隔
+
     @staticmethod
     def validate():
         """必要な環境変数が設定されているか確認"""
@@ -0,0 +1,18 @@
+# デイリーボーナスの計算表（インポート時に一度だけ作成）
+
+BASE_AMOUNT = 100  # 基本ボーナス額
+MAX_MULTIPLIER_STREAK = 30  # 連続日数ボーナスの上限（最大x3.0）
+SPECIAL_BONUSES = {7: 200, 14: 500, 30: 1000}  # 7日、14日、30日連続の特別ボーナス
+
+def _calculate_bonus(streak: int) -> int:
+    """連続日数からボーナス額を計算"""
+    multiplier_amount = BASE_AMOUNT * min(streak, MAX_MULTIPLIER_STREAK) // 10
+    return BASE_AMOUNT + multiplier_amount + SPECIAL_BONUSES.get(streak, 0)
+
+# BONUS_TABLE[streak] がボーナス額。上限を超えた連続日数は最後の要素を使う
+BONUS_TABLE_MAX_STREAK = max(MAX_MULTIPLIER_STREAK, max(SPECIAL_BONUSES)) + 1
+BONUS_TABLE = tuple(_calculate_bonus(streak) for streak in range(BONUS_TABLE_MAX_STREAK + 1))
+
+def bonus_for_streak(streak: int) -> int:
+    """連続日数に対応するボーナス額を取得"""
+    return BONUS_TABLE[max(0, min(streak, BONUS_TABLE_MAX_STREAK))]
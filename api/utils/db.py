@@ -4,8 +4,31 @@ from datetime import datetime, timedelta
 from bson import ObjectId
 from typing import Optional, List
 from .config import Config
+from .daily_bonus import BONUS_TABLE, BONUS_TABLE_MAX_STREAK
+from .notification_bus import notification_bus
+from .metrics import command_listener
 from fastapi import HTTPException
+from shared.indexes import ensure_indexes
+from shared.login_tokens import LoginTokenRepository
+from shared.mongo import create_client
+from shared.users import UserRepository
+from pymongo import ReturnDocument
 from random import randint
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# クエスト情報キャッシュの有効期間（秒）
+QUEST_CACHE_TTL = 60
+# 管理者向け通知数キャッシュの有効期間（秒）
+ADMIN_COUNTS_CACHE_TTL = 5
+# 保留状態の台帳明細を照合の対象とするまでの猶予（秒、書き込み途中の明細を対象にしない）
+LEDGER_PENDING_GRACE_SECONDS = 300
+
+class InsufficientBalanceError(Exception):
+    """残高不足でトランザクションを中断するための例外"""
 
 class Database:
     """MongoDBとの非同期接続を管理するクラス"""
@@ -14,27 +37,76 @@ class Database:
         """データベース接続の初期化"""
         self.client = client or AsyncIOMotorClient(Config.MONGODB_URL)
         self.db = db or self.client[Config.DB_NAME]
+        # クエストID -> (取得時刻, クエスト) のキャッシュ
+        self._quest_cache = {}
+        # 管理者向け通知数の (取得時刻, 結果) キャッシュ
+        self._admin_counts_cache = None
+        # レプリカセット/シャードクラスタの場合のみトランザクションを使用
+        self.supports_transactions = False
+        # 保留状態の台帳明細の照合を同じプロセス内で重ねて実行しない
+        self._ledger_reconcile_lock = asyncio.Lock()
+        # ユーザーIDごとの未書き込みの残高差分（カジノの書き込みバッファが設定する）
+        self.pending_balance_delta = lambda user_id: 0
     
     async def connect(self):
         """データベースに接続"""
-        self.client = AsyncIOMotorClient(Config.MONGODB_URI)
+        # コマンド監視でクエリ数と所要時間をリクエスト・コレクション別に集計
+        self.client = create_client(
+            Config.MONGODB_URI,
+            Config.MONGODB_MAX_POOL_SIZE,
+            Config.MONGODB_MIN_POOL_SIZE,
+            appname="paraccoli-api",
+            event_listeners=[command_listener]
+        )
         self.db = self.client[Config.DB_NAME]
         
         # コレクションの初期化
         self.users = self.db.users
+        self.user_repo = UserRepository(self.users)
+        self.login_token_repo = LoginTokenRepository(self.db.login_tokens)
+        
+        # トランザクションが使えるか確認（スタンドアロンのmongodでは使えない）
+        await self._detect_transaction_support()
         
         # インデックスの作成
         await self._create_indexes()
+        
+        # 検索用の正規化ユーザー名を持たない既存ユーザーを補完
+        await self._backfill_username_lower()
+    
+    async def _detect_transaction_support(self):
+        """接続先がトランザクションに対応しているか確認"""
+        try:
+            hello = await self.client.admin.command("hello")
+            self.supports_transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        except Exception as e:
+            logger.error(f"Error detecting transaction support: {e}")
+            self.supports_transactions = False
+    
+    async def run_in_transaction(self, callback):
+        """callback(session)をトランザクション内で実行（非対応環境ではsession=Noneで実行）"""
+        if not self.supports_transactions:
+            return await callback(None)
+        
+        async with await self.client.start_session() as session:
+            # 一時的なエラーはwith_transactionが自動で再試行する
+            return await session.with_transaction(callback)
     
     async def _create_indexes(self):
-        """必要なインデックスを作成"""
-        # discord_idでユニークインデックスを作成
-        await self.users.create_index('discord_id', unique=True)
-        # login_tokenでユニークインデックスを作成
-        await self.users.create_index('login_token', unique=True, sparse=True)
-        # token_expiresの有効期限インデックスを作成
-        await self.users.create_index('token_expires', expireAfterSeconds=0)
+        """必要なインデックスを作成（定義はBotと共通のレジストリで管理）"""
+        await ensure_indexes(
+            self.db,
+            security_log_retention_days=Config.SECURITY_LOG_RETENTION_DAYS,
+            security_rollup_retention_days=Config.SECURITY_ROLLUP_RETENTION_DAYS
+        )
     
+    async def _backfill_username_lower(self):
+        """username_lowerが未設定のユーザーに値を設定"""
+        try:
+            await self.user_repo.backfill_username_lower()
+        except Exception as e:
+            logger.error(f"Database error backfilling username_lower: {e}")
+
     async def close(self):
         """データベース接続を閉じる"""
         if self.client:
@@ -43,7 +115,7 @@ class Database:
     async def get_user_by_discord_id(self, discord_id: str) -> Optional[dict]:
         """ユーザー情報を取得"""
         try:
-            user = await self.db.users.find_one({"discord_id": discord_id})
+            user = await self.user_repo.get(discord_id)
             if user:
                 user["_id"] = str(user["_id"])
                 # is_adminフラグを確実に含める
@@ -51,15 +123,24 @@ class Database:
                 # nickname関連のコードを削除
             return user
         except Exception as e:
-            print(f"Database error getting user: {e}")
+            logger.error(f"Database error getting user: {e}")
             return None
 
-    async def get_user_by_token(self, token: str):
-        """ログイントークンでユーザーを取得"""
-        return await self.users.find_one({
-            'login_token': token,
-            'token_expires': {'$gt': datetime.utcnow()}
-        })
+    async def consume_login_token(self, token: str) -> Optional[dict]:
+        """ログイントークンを消費してユーザーを取得（トークンは1回限り有効）"""
+        try:
+            login_token = await self.login_token_repo.consume(token)
+            if not login_token:
+                return None
+            # 最終ログイン日時の更新とユーザーの取得を1回で行う
+            user = await self.user_repo.touch_last_login(login_token['discord_id'])
+            if user:
+                user["_id"] = str(user["_id"])
+                user["is_admin"] = bool(user.get("is_admin", False))
+            return user
+        except Exception as e:
+            logger.error(f"Database error consuming login token: {e}")
+            return None
 
     async def update_user(self, discord_id: str, update_data: dict) -> bool:
         """ユーザー情報を更新"""
@@ -69,18 +150,25 @@ class Database:
                 del update_data["nickname"]
             
             if update_data:  # 更新するデータがまだある場合のみ
-                await self.db.users.update_one(
-                    {"discord_id": discord_id},
-                    {"$set": update_data}
-                )
+                await self.user_repo.update(discord_id, update_data)
             return True
         except Exception as e:
-            print(f"Database error updating user: {e}")
+            logger.error(f"Database error updating user: {e}")
             return False
 
     async def create_user(self, user_data: dict):
         """新規ユーザーを作成"""
-        return await self.users.insert_one(user_data)
+        return await self.user_repo.create(user_data)
+
+    async def search_users(
+        self,
+        search: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 20,
+        after: Optional[str] = None
+    ):
+        """管理画面用のユーザー検索（インデックスを使う前方一致とキーセットページング）"""
+        return await self.user_repo.search(search, page, page_size, after)
 
     # フォーラム関連のメソッド
     async def create_forum_post(self, post_data: dict) -> str:
@@ -94,7 +182,7 @@ class Database:
             return str(post_id)
             
         except Exception as e:
-            print(f"Database error creating forum post: {e}")
+            logger.error(f"Database error creating forum post: {e}")
             raise HTTPException(
                 status_code=500,
                 detail="Database error while creating post"
@@ -150,7 +238,7 @@ class Database:
             return post
             
         except Exception as e:
-            print(f"Database error getting post: {e}")
+            logger.error(f"Database error getting post: {e}")
             return None
 
     async def create_forum_comment(self, comment_data: dict) -> str:
@@ -170,7 +258,7 @@ class Database:
             return str(comment_id)
             
         except Exception as e:
-            print(f"Database error creating comment: {e}")
+            logger.error(f"Database error creating comment: {e}")
             raise HTTPException(
                 status_code=500,
                 detail="Database error while creating comment"
@@ -182,7 +270,7 @@ class Database:
             cursor = self.db.forum_comments.find({"post_id": post_id}).sort("created_at", 1)
             return await cursor.to_list(length=None)
         except Exception as e:
-            print(f"Database error getting comments: {e}")
+            logger.error(f"Database error getting comments: {e}")
             return []
 
     async def update_forum_post(self, post_id: str, update_data: dict) -> bool:
@@ -211,7 +299,7 @@ class Database:
                 comment["id"] = str(comment["_id"])
             return comment
         except Exception as e:
-            print(f"Database error getting comment: {e}")
+            logger.error(f"Database error getting comment: {e}")
             return None
 
     async def delete_comment(self, comment_id: str, post_id: str) -> bool:
@@ -229,7 +317,7 @@ class Database:
                 return True
             return False
         except Exception as e:
-            print(f"Error deleting comment: {e}")
+            logger.error(f"Error deleting comment: {e}")
             return False
 
     async def add_post_reaction(self, post_id: str, user_id: str) -> bool:
@@ -251,40 +339,298 @@ class Database:
                 # 投稿者のPARCを増やす
                 post = await self.get_forum_post(post_id)
                 if post and post.get("author_id"):
-                    await self.increase_user_balance(post["author_id"], 1)
-                    print(f"Added 1 PARC to author {post['author_id']}")
+                    await self.increase_user_balance(
+                        post["author_id"], 1, "forum_reaction", {"post_id": post_id}
+                    )
+                    logger.info(f"Added 1 PARC to author {post['author_id']}")
                     return True
             return False
 
         except Exception as e:
-            print(f"Error adding reaction: {e}")
+            logger.error(f"Error adding reaction: {e}")
             return False
 
-    async def increase_user_balance(self, user_id: str, amount: float) -> bool:
+    async def increase_user_balance(self, user_id: str, amount: float, reason: str = "credit", ref: dict = None) -> bool:
         """ユーザーの残高を増やす"""
         try:
-            result = await self.db.users.update_one(
-                {"discord_id": user_id},
-                {"$inc": {"balance": amount}}
-            )
-            return result.modified_count > 0
+            balance = await self.apply_balance_delta(user_id, amount, reason, ref)
+            return balance is not None
         except Exception as e:
-            print(f"Error increasing user balance: {e}")
+            logger.error(f"Error increasing user balance: {e}")
             return False
 
+    @staticmethod
+    def ledger_entry(user_id: str, amount: float, reason: str, ref: dict = None, balance_after: float = None) -> dict:
+        """台帳の明細を作成"""
+        return {
+            "user_id": user_id,
+            "amount": amount,
+            "reason": reason,
+            "ref": ref or {},
+            "balance_after": balance_after,
+            "created_at": datetime.utcnow()
+        }
+
+    async def apply_balance_delta(
+        self,
+        user_id: str,
+        amount: float,
+        reason: str,
+        ref: dict = None,
+        require_balance: bool = False,
+        session=None
+    ) -> Optional[float]:
+        """残高を増減して台帳に追記し、更新後の残高を返す（更新できなければNone）"""
+        query = {"discord_id": user_id}
+        if require_balance and amount < 0:
+            # 残高がマイナスにならない場合のみ減算（未書き込みのカジノの損益も含める）
+            query["balance"] = {"$gte": -amount - self.pending_balance_delta(user_id)}
+
+        async def apply(session):
+            user = await self.db.users.find_one_and_update(
+                query,
+                {"$inc": {"balance": amount}},
+                projection={"balance": 1},
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if not user:
+                return None
+            balance = user.get("balance", 0)
+            await self.db.ledger.insert_one(
+                self.ledger_entry(user_id, amount, reason, ref, balance),
+                session=session
+            )
+            return balance
+
+        # 呼び出し元のトランザクションがあればそれを使う
+        if session is not None:
+            return await apply(session)
+        if self.supports_transactions:
+            return await self.run_in_transaction(apply)
+        return await self._apply_balance_delta_pending(user_id, amount, reason, ref, query)
+
+    async def _apply_balance_delta_pending(
+        self,
+        user_id: str,
+        amount: float,
+        reason: str,
+        ref: dict,
+        query: dict
+    ) -> Optional[float]:
+        """トランザクションが使えない環境で、台帳を保留状態で先に書いてから残高を更新"""
+        entry = self.ledger_entry(user_id, amount, reason, ref)
+        entry["status"] = "pending"
+        entry_id = (await self.db.ledger.insert_one(entry)).inserted_id
+
+        # 残高と一緒に明細のIDを記録し、途中で停止しても反映済みかどうかを判別できるようにする
+        user = await self.db.users.find_one_and_update(
+            query,
+            {"$inc": {"balance": amount}, "$addToSet": {"pending_ledger_ids": entry_id}},
+            projection={"balance": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not user:
+            await self.db.ledger.delete_one({"_id": entry_id})
+            return None
+
+        balance = user.get("balance", 0)
+        await self.db.ledger.update_one(
+            {"_id": entry_id},
+            {"$set": {"balance_after": balance}, "$unset": {"status": ""}}
+        )
+        await self.db.users.update_one(
+            {"discord_id": user_id},
+            {"$pull": {"pending_ledger_ids": entry_id}}
+        )
+        return balance
+
+    async def reconcile_pending_ledger(self) -> dict:
+        """保留状態のまま残った台帳明細を、残高への反映有無に応じて確定または破棄"""
+        async with self._ledger_reconcile_lock:
+            now = datetime.utcnow()
+            cutoff_id = ObjectId.from_datetime(now - timedelta(seconds=LEDGER_PENDING_GRACE_SECONDS))
+            result = {"committed": 0, "discarded": 0, "daily_bonus": 0}
+
+            async for entry in self.db.ledger.find(
+                {"status": "pending", "_id": {"$lt": cutoff_id}},
+                {"user_id": 1}
+            ):
+                # 他のワーカーと同じ明細を同時に処理しないよう短いリースを取る
+                claimed = await self.db.ledger.find_one_and_update(
+                    {
+                        "_id": entry["_id"],
+                        "status": "pending",
+                        "$or": [
+                            {"reconcile_until": {"$exists": False}},
+                            {"reconcile_until": {"$lt": now}}
+                        ]
+                    },
+                    {"$set": {"reconcile_until": now + timedelta(seconds=LEDGER_PENDING_GRACE_SECONDS)}},
+                    projection={"_id": 1}
+                )
+                if not claimed:
+                    continue
+
+                applied = await self.db.users.find_one_and_update(
+                    {"discord_id": entry["user_id"], "pending_ledger_ids": entry["_id"]},
+                    {"$pull": {"pending_ledger_ids": entry["_id"]}},
+                    projection={"_id": 1}
+                )
+                if applied:
+                    # 残高には反映済みなので明細を確定（更新後の残高は不明）
+                    await self.db.ledger.update_one(
+                        {"_id": entry["_id"]},
+                        {"$unset": {"status": "", "reconcile_until": ""}}
+                    )
+                    result["committed"] += 1
+                else:
+                    # 残高に反映される前に停止したため明細を破棄
+                    await self.db.ledger.delete_one({"_id": entry["_id"]})
+                    result["discarded"] += 1
+
+            # デイリーボーナスの受け取り後、台帳に書く前に停止したユーザーの明細を補完
+            grace = now - timedelta(seconds=LEDGER_PENDING_GRACE_SECONDS)
+            async for user in self.db.users.find(
+                {"daily_bonus_ledger_pending": {"$lt": grace}},
+                {"discord_id": 1, "daily_bonus_ledger_pending": 1}
+            ):
+                taken = await self.db.users.find_one_and_update(
+                    {"_id": user["_id"], "daily_bonus_ledger_pending": user["daily_bonus_ledger_pending"]},
+                    {"$unset": {"daily_bonus_ledger_pending": ""}},
+                    projection={
+                        "daily_bonus_last_claim": 1,
+                        "daily_bonus_last_amount": 1,
+                        "daily_bonus_streak": 1
+                    }
+                )
+                if not taken:
+                    continue
+                claimed_at = taken.get("daily_bonus_last_claim")
+                recorded = await self.db.ledger.find_one(
+                    {"user_id": user["discord_id"], "reason": "daily_bonus", "ref.claimed_at": claimed_at},
+                    {"_id": 1}
+                )
+                if not recorded:
+                    await self.db.ledger.insert_one(self.ledger_entry(
+                        user["discord_id"], taken.get("daily_bonus_last_amount", 0), "daily_bonus",
+                        {"streak": taken.get("daily_bonus_streak"), "claimed_at": claimed_at}
+                    ))
+                    result["daily_bonus"] += 1
+
+            if any(result.values()):
+                logger.warning(f"Reconciled pending ledger entries: {result}")
+            return result
+
+    async def get_ledger_entries(self, user_id: str, limit: int = 50, before: str = None) -> List[dict]:
+        """ユーザーの台帳明細を新しい順に取得（beforeより前のIDから続きを取得）"""
+        # 保留中（残高への反映が未確定）の明細は含めない
+        query = {"user_id": user_id, "status": {"$exists": False}}
+        if before and ObjectId.is_valid(before):
+            query["_id"] = {"$lt": ObjectId(before)}
+
+        entries = await self.db.ledger.find(query).sort("_id", -1).limit(limit).to_list(length=limit)
+        for entry in entries:
+            entry["id"] = str(entry.pop("_id"))
+        return entries
+
+    async def claim_daily_bonus(self, user_id: str, now: datetime) -> Optional[dict]:
+        """デイリーボーナスを1回の条件付き更新で受け取る（本日受け取り済みならNone）"""
+        today = datetime(now.year, now.month, now.day)
+        yesterday = today - timedelta(days=1)
+        streak = "$daily_bonus_streak"
+
+        async def claim(session):
+            claimed = await self.db.users.find_one_and_update(
+                {
+                    "discord_id": user_id,
+                    # 本日まだ受け取っていない場合のみ更新（同時リクエストでの二重受け取りを防ぐ）
+                    "$or": [
+                        {"daily_bonus_last_claim": {"$lt": today}},
+                        {"daily_bonus_last_claim": None}
+                    ]
+                },
+                [
+                    # 昨日受け取っていたら連続日数を増やす、そうでなければリセット
+                    {"$set": {
+                        "daily_bonus_streak": {"$cond": [
+                            {"$gte": ["$daily_bonus_last_claim", yesterday]},
+                            {"$add": [{"$ifNull": [streak, 0]}, 1]},
+                            1
+                        ]}
+                    }},
+                    # ボーナス額は計算表から取得（上限を超えた連続日数は最後の要素）
+                    {"$set": {
+                        "daily_bonus_last_amount": {"$arrayElemAt": [
+                            list(BONUS_TABLE),
+                            {"$min": [streak, BONUS_TABLE_MAX_STREAK]}
+                        ]}
+                    }},
+                    {"$set": {
+                        "balance": {"$add": [{"$ifNull": ["$balance", 0]}, "$daily_bonus_last_amount"]},
+                        "daily_bonus_last_claim": now,
+                        "daily_bonus_total_claims": {"$add": [{"$ifNull": ["$daily_bonus_total_claims", 0]}, 1]}
+                    }},
+                    # トランザクションが使えない場合は台帳への書き込みが済むまで印を付けておく
+                    *([] if session is not None else [{"$set": {"daily_bonus_ledger_pending": now}}])
+                ],
+                projection={
+                    "daily_bonus_streak": 1,
+                    "daily_bonus_last_amount": 1,
+                    "daily_bonus_total_claims": 1,
+                    "balance": 1
+                },
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if claimed:
+                await self.db.ledger.insert_one(
+                    self.ledger_entry(
+                        user_id, claimed["daily_bonus_last_amount"], "daily_bonus",
+                        {"streak": claimed["daily_bonus_streak"], "claimed_at": now}, claimed.get("balance")
+                    ),
+                    session=session
+                )
+                if session is None:
+                    await self.db.users.update_one(
+                        {"discord_id": user_id},
+                        {"$unset": {"daily_bonus_ledger_pending": ""}}
+                    )
+            return claimed
+
+        return await self.run_in_transaction(claim)
+
     async def create_report(self, report_data: dict):
         """通報を作成"""
         try:
             result = await self.db.reports.insert_one(report_data)
+            self.invalidate_admin_counts()
             return result.inserted_id
         except Exception as e:
-            print(f"Database error creating report: {e}")
+            logger.error(f"Database error creating report: {e}")
             raise
 
-    async def get_reports(self):
-        """通報一覧を取得"""
+    async def get_reports(self, page: int = 1, page_size: int = 20, status: Optional[str] = None):
+        """通報一覧をページ単位で取得（通報者名は$lookupで一括付与）"""
         try:
-            reports = await self.db.reports.find().sort("created_at", -1).to_list(None)
+            query = {"status": status} if status else {}
+            total = await self.db.reports.count_documents(query)
+
+            pipeline = [
+                {"$match": query},
+                {"$sort": {"created_at": -1}},
+                {"$skip": (page - 1) * page_size},
+                {"$limit": page_size},
+                # 通報者の名前だけを1回の集計で結合
+                {"$lookup": {
+                    "from": "users",
+                    "localField": "reporter_id",
+                    "foreignField": "discord_id",
+                    "pipeline": [{"$project": {"_id": 0, "username": 1}}],
+                    "as": "reporter"
+                }}
+            ]
+            reports = await self.db.reports.aggregate(pipeline).to_list(page_size)
             formatted_reports = []
             
             for report in reports:
@@ -303,17 +649,15 @@ class Database:
                     "resolved_by": report.get("resolved_by")
                 }
                 
-                # 関連ユーザー情報の取得
-                reporter = await self.get_user_by_discord_id(report["reporter_id"])
-                if reporter:
-                    formatted_report["reporter_name"] = reporter.get("username")
+                if report["reporter"]:
+                    formatted_report["reporter_name"] = report["reporter"][0].get("username")
                 
                 formatted_reports.append(formatted_report)
                 
-            return formatted_reports
+            return formatted_reports, total
         except Exception as e:
-            print(f"Database error getting reports: {e}")
-            return []
+            logger.error(f"Database error getting reports: {e}")
+            return [], 0
 
     async def update_report_status(self, report_id: str, status: str, admin_id: str):
         """通報ステータスを更新"""
@@ -328,18 +672,20 @@ class Database:
                     }
                 }
             )
+            self.invalidate_admin_counts()
             return result.modified_count > 0
         except Exception as e:
-            print(f"Database error updating report: {e}")
+            logger.error(f"Database error updating report: {e}")
             return False
 
     async def delete_report(self, report_id: str) -> bool:
         """通報を削除"""
         try:
             result = await self.db.reports.delete_one({"_id": ObjectId(report_id)})
+            self.invalidate_admin_counts()
             return result.deleted_count > 0
         except Exception as e:
-            print(f"Database error deleting report: {e}")
+            logger.error(f"Database error deleting report: {e}")
             return False
 
     async def drop_database(self):
@@ -347,11 +693,11 @@ class Database:
         try:
             if self.client and self.db:
                 await self.client.drop_database(self.db.name)
-                print(f"データベース '{self.db.name}' を削除しました")
+                logger.info(f"データベース '{self.db.name}' を削除しました")
                 return True
             return False
         except Exception as e:
-            print(f"データベース削除エラー: {e}")
+            logger.error(f"データベース削除エラー: {e}")
             return False
 
     async def create_feedback(self, feedback_data: dict) -> str:
@@ -364,10 +710,11 @@ class Database:
             
             # データベースに保存
             await self.db.feedback.insert_one(feedback_data)
+            self.invalidate_admin_counts()
             
             return str(feedback_id)
         except Exception as e:
-            print(f"Database error creating feedback: {e}")
+            logger.error(f"Database error creating feedback: {e}")
             raise
 
     async def get_all_feedback(self) -> List[dict]:
@@ -385,7 +732,7 @@ class Database:
                     
             return feedback
         except Exception as e:
-            print(f"Database error getting all feedback: {e}")
+            logger.error(f"Database error getting all feedback: {e}")
             return []
 
     async def get_user_feedback(self, user_id: str) -> List[dict]:
@@ -400,7 +747,7 @@ class Database:
                 
             return feedback
         except Exception as e:
-            print(f"Database error getting user feedback: {e}")
+            logger.error(f"Database error getting user feedback: {e}")
             return []
 
     async def update_feedback_response(
@@ -432,14 +779,17 @@ class Database:
                     }
                 }
             )
+            self.invalidate_admin_counts()
 
             # 報酬がある場合、ユーザーの残高を更新
             if reward > 0:
-                await self.increase_user_balance(feedback["author_id"], reward)
+                await self.increase_user_balance(
+                    feedback["author_id"], reward, "feedback_reward", {"feedback_id": feedback_id}
+                )
 
             return result.modified_count > 0
         except Exception as e:
-            print(f"Database error updating feedback: {e}")
+            logger.error(f"Database error updating feedback: {e}")
             return False
 
     async def get_active_quests(self, quest_type: str) -> List[dict]:
@@ -452,7 +802,7 @@ class Database:
             })
             return await cursor.to_list(length=None)
         except Exception as e:
-            print(f"Error getting active quests: {e}")
+            logger.error(f"Error getting active quests: {e}")
             return []
 
     async def get_user_quests(self, user_id: str) -> List[dict]:
@@ -461,7 +811,7 @@ class Database:
             cursor = self.db.user_quests.find({"user_id": user_id})
             return await cursor.to_list(length=None)
         except Exception as e:
-            print(f"Error getting user quests: {e}")
+            logger.error(f"Error getting user quests: {e}")
             return []
 
     async def update_quest_progress(self, user_id: str, action_type: str, count: int = 1) -> None:
@@ -507,7 +857,7 @@ class Database:
                         }
                     )
         except Exception as e:
-            print(f"Error updating quest progress: {e}")
+            logger.error(f"Error updating quest progress: {e}")
 
     async def create_quest_notification(self, user_id: str, quest_title: str, reward: float) -> bool:
         """クエスト報酬の通知を作成"""
@@ -520,73 +870,114 @@ class Database:
                 "created_at": datetime.utcnow(),
                 "read": False
             }
-            await self.db.notifications.insert_one(notification)
-            return True
+            return await self.create_notification(notification)
         except Exception as e:
-            print(f"Error creating quest notification: {e}")
+            logger.error(f"Error creating quest notification: {e}")
             return False
 
+    async def get_quest_cached(self, quest_id: str) -> Optional[dict]:
+        """クエスト情報をキャッシュ経由で取得（期限を過ぎたクエストはキャッシュしない）"""
+        now = time.monotonic()
+        cached = self._quest_cache.get(quest_id)
+        if cached and now - cached[0] < QUEST_CACHE_TTL and not self._quest_expired(cached[1]):
+            return cached[1]
+
+        if not ObjectId.is_valid(quest_id):
+            return None
+
+        quest = await self.db.quests.find_one(
+            {"_id": ObjectId(quest_id)},
+            {"title": 1, "reward": 1, "type": 1, "required_count": 1, "expires_at": 1}
+        )
+        # 他のワーカーで定期更新が走ると同じIDのクエストが次の期間の内容に置き換わるため、
+        # 期間が終わったものはキャッシュせず、更新後の内容を読み直す
+        if quest and not self._quest_expired(quest):
+            self._quest_cache[quest_id] = (now, quest)
+        return quest
+
+    @staticmethod
+    def _quest_expired(quest: dict) -> bool:
+        """クエストの期間が終了しているか"""
+        expires_at = quest.get("expires_at")
+        return expires_at is not None and expires_at <= datetime.utcnow()
+
+    def invalidate_quest_cache(self, quest_id: str = None):
+        """クエスト情報キャッシュを破棄"""
+        if quest_id:
+            self._quest_cache.pop(quest_id, None)
+        else:
+            self._quest_cache.clear()
+
     async def claim_quest_reward(self, user_id: str, quest_id: str) -> bool:
         """クエスト報酬を受け取る"""
         try:
-            # クエストの存在確認
-            quest = await self.db.quests.find_one({"_id": ObjectId(quest_id)})
+            # クエストの存在確認（キャッシュ済みカタログから取得）
+            quest = await self.get_quest_cached(quest_id)
             if not quest:
-                print(f"Quest not found: {quest_id}")
+                logger.warning(f"Quest not found: {quest_id}")
                 return False
 
-            # ユーザークエストの確認
-            user_quest = await self.db.user_quests.find_one({
-                "user_id": user_id,
-                "quest_id": quest_id,
-                "completed": True,
-                "reward_claimed": False
-            })
-            
-            if not user_quest:
-                print(f"User quest not found or already claimed: {user_id}, {quest_id}")
-                return False
-
-            # 報酬を付与
             reward_amount = float(quest["reward"])
-            
-            # ユーザーの残高を更新
-            result = await self.db.users.update_one(
-                {"discord_id": user_id},
-                {"$inc": {"balance": reward_amount}}
-            )
-            
-            if result.modified_count == 0:
-                print(f"Failed to update user balance: {user_id}")
-                return False
+            claimed_id = None
 
-            # 報酬受け取り済みに更新
-            await self.db.user_quests.update_one(
-                {"_id": user_quest["_id"]},
-                {
-                    "$set": {
-                        "reward_claimed": True,
-                        "claimed_at": datetime.utcnow()
-                    }
-                }
-            )
+            async def claim(session):
+                nonlocal claimed_id
+                # 報酬受け取り済みフラグを先に原子的に立て、同時リクエストによる二重受け取りを防ぐ
+                user_quest = await self.db.user_quests.find_one_and_update(
+                    {
+                        "user_id": user_id,
+                        "quest_id": quest_id,
+                        "completed": True,
+                        "reward_claimed": False
+                    },
+                    {
+                        "$set": {
+                            "reward_claimed": True,
+                            "claimed_at": datetime.utcnow()
+                        }
+                    },
+                    projection={"_id": 1},
+                    return_document=ReturnDocument.AFTER,
+                    session=session
+                )
+                if not user_quest:
+                    return False
+                claimed_id = user_quest["_id"]
+
+                # フラグと同じトランザクションで残高を更新
+                balance = await self.apply_balance_delta(
+                    user_id, reward_amount, "quest_reward", {"quest_id": quest_id}, session=session
+                )
+                if balance is None:
+                    raise RuntimeError(f"Failed to update user balance: {user_id}")
+                return True
+
+            try:
+                claimed = await self.run_in_transaction(claim)
+            except Exception:
+                # トランザクション非対応の環境ではフラグを戻して再受け取りを可能にする
+                if not self.supports_transactions and claimed_id is not None:
+                    await self.db.user_quests.update_one(
+                        {"_id": claimed_id},
+                        {
+                            "$set": {"reward_claimed": False},
+                            "$unset": {"claimed_at": ""}
+                        }
+                    )
+                raise
+
+            if not claimed:
+                logger.warning(f"User quest not found or already claimed: {user_id}, {quest_id}")
+                return False
 
             # 通知を作成
-            notification = {
-                "user_id": user_id,
-                "type": "quest_reward",
-                "title": "クエスト報酬を獲得",
-                "content": f"{quest['title']}のクエストを完了し、{reward_amount} PARCを獲得しました。",
-                "created_at": datetime.utcnow(),
-                "read": False
-            }
-            await self.db.notifications.insert_one(notification)
+            await self.create_quest_notification(user_id, quest["title"], reward_amount)
 
-            print(f"Quest reward claimed successfully: {user_id}, {quest_id}, {reward_amount} PARC")
+            logger.info(f"Quest reward claimed successfully: {user_id}, {quest_id}, {reward_amount} PARC")
             return True
             
         except Exception as e:
-            print(f"Error claiming quest reward: {e}")
+            logger.error(f"Error claiming quest reward: {e}")
             return False
 
     async def create_quest(self, quest_data: dict) -> str:
@@ -597,7 +988,7 @@ class Database:
             await self.db.quests.insert_one(quest_data)
             return str(quest_id)
         except Exception as e:
-            print(f"Error creating quest: {e}")
+            logger.error(f"Error creating quest: {e}")
             raise
 
     async def get_active_quests_by_action(self, action_type: str) -> List[dict]:
@@ -613,7 +1004,7 @@ class Database:
                 quest["id"] = str(quest["_id"])  # _idをidに変換
             return quests
         except Exception as e:
-            print(f"Error getting active quests by action: {e}")
+            logger.error(f"Error getting active quests by action: {e}")
             return []
 
     async def auto_update_quests(self):
@@ -627,6 +1018,7 @@ class Database:
                 },
                 {"$set": {"is_active": False}}
             )
+            self.invalidate_quest_cache()
 
             # 新しいデイリークエストを生成
             daily_template = daily_quest_templates[
@@ -652,7 +1044,7 @@ class Database:
                 })
 
         except Exception as e:
-            print(f"Error in auto update quests: {e}")
+            logger.error(f"Error in auto update quests: {e}")
 
     async def create_exchange_request(self, request_data: dict) -> str:
         """交換リクエストを作成"""
@@ -662,22 +1054,63 @@ class Database:
             await self.db.exchange_requests.insert_one(request_data)
             return str(request_id)
         except Exception as e:
-            print(f"Error creating exchange request: {e}")
+            logger.error(f"Error creating exchange request: {e}")
             raise
 
-    async def decrease_user_balance(self, user_id: str, amount: float) -> bool:
+    async def create_exchange_with_debit(
+        self,
+        user_id: str,
+        request_data: dict,
+        idempotency_key: str = None
+    ) -> Optional[str]:
+        """残高の減算と交換リクエストの作成を1つのトランザクションで行う（残高不足ならNone）"""
+        request_id = ObjectId()
+        exchange = {**request_data, "_id": request_id, "user_id": user_id}
+        if idempotency_key:
+            exchange["idempotency_key"] = idempotency_key
+
+        async def create(session):
+            # 先にリクエストを挿入し、冪等キーが重複していれば減算前に失敗させる
+            await self.db.exchange_requests.insert_one(exchange, session=session)
+            balance = await self.apply_balance_delta(
+                user_id,
+                -exchange["amount"],
+                "exchange_request",
+                {"exchange_id": str(request_id)},
+                require_balance=True,
+                session=session
+            )
+            if balance is None:
+                if session is None:
+                    # トランザクションが使えない環境では挿入を取り消す
+                    await self.db.exchange_requests.delete_one({"_id": request_id})
+                raise InsufficientBalanceError()
+            return str(request_id)
+
+        try:
+            exchange_id = await self.run_in_transaction(create)
+        except InsufficientBalanceError:
+            return None
+        self.invalidate_admin_counts()
+        return exchange_id
+
+    async def get_exchange_request_by_key(self, user_id: str, idempotency_key: str) -> Optional[dict]:
+        """冪等キーで作成済みの交換リクエストを取得"""
+        exchange = await self.db.exchange_requests.find_one({
+            "user_id": user_id,
+            "idempotency_key": idempotency_key
+        })
+        if exchange:
+            exchange["id"] = str(exchange.pop("_id"))
+        return exchange
+
+    async def decrease_user_balance(self, user_id: str, amount: float, reason: str = "debit", ref: dict = None) -> bool:
         """ユーザーの残高を減少"""
         try:
-            result = await self.db.users.update_one(
-                {
-                    "discord_id": user_id,
-                    "balance": {"$gte": amount}
-                },
-                {"$inc": {"balance": -amount}}
-            )
-            return result.modified_count > 0
+            balance = await self.apply_balance_delta(user_id, -amount, reason, ref, require_balance=True)
+            return balance is not None
         except Exception as e:
-            print(f"Error decreasing user balance: {e}")
+            logger.error(f"Error decreasing user balance: {e}")
             return False
 
     async def complete_exchange_request(self, exchange_id: str, admin_id: str) -> bool:
@@ -686,12 +1119,12 @@ class Database:
             # 交換リクエストを取得
             exchange = await self.db.exchange_requests.find_one({"_id": ObjectId(exchange_id)})
             if not exchange:
-                print(f"Exchange request not found: {exchange_id}")
+                logger.warning(f"Exchange request not found: {exchange_id}")
                 return False
 
             # すでに完了済みの場合は処理しない
             if exchange.get("completed"):
-                print(f"Exchange request already completed: {exchange_id}")
+                logger.warning(f"Exchange request already completed: {exchange_id}")
                 return False
 
             # 交換リクエストを完了に更新
@@ -705,6 +1138,7 @@ class Database:
                     }
                 }
             )
+            self.invalidate_admin_counts()
 
             if result.modified_count > 0:
                 # 通知を作成
@@ -720,7 +1154,7 @@ class Database:
             return False
 
         except Exception as e:
-            print(f"Error completing exchange request: {e}")
+            logger.error(f"Error completing exchange request: {e}")
             return False
 
     async def create_notification(self, notification_data: dict) -> bool:
@@ -729,9 +1163,11 @@ class Database:
             notification_id = ObjectId()
             notification_data["_id"] = notification_id
             await self.db.notifications.insert_one(notification_data)
+            # 接続中のユーザーへ即時配信
+            notification_bus.publish(notification_data)
             return True
         except Exception as e:
-            print(f"Error creating notification: {e}")
+            logger.error(f"Error creating notification: {e}")
             return False
 
     async def get_exchange_requests(self) -> list:
@@ -746,7 +1182,7 @@ class Database:
                 exchanges.append(exchange)
             return exchanges
         except Exception as e:
-            print(f"Error getting exchange requests: {e}")
+            logger.error(f"Error getting exchange requests: {e}")
             return []
 
     async def get_user_notifications(self, user_id: str) -> list:
@@ -763,7 +1199,7 @@ class Database:
                 notifications.append(notification)
             return notifications
         except Exception as e:
-            print(f"Error getting user notifications: {e}")
+            logger.error(f"Error getting user notifications: {e}")
             return []
 
     async def count_unread_reports(self):
@@ -772,7 +1208,7 @@ class Database:
             count = await self.db.reports.count_documents({"status": "pending"})
             return count
         except Exception as e:
-            print(f"Error counting unread reports: {e}")
+            logger.error(f"Error counting unread reports: {e}")
             return 0
 
     async def count_unread_feedback(self):
@@ -781,7 +1217,7 @@ class Database:
             count = await self.db.feedback.count_documents({"status": "pending"})
             return count
         except Exception as e:
-            print(f"Error counting unread feedback: {e}")
+            logger.error(f"Error counting unread feedback: {e}")
             return 0
 
     async def count_quest_notifications(self):
@@ -791,7 +1227,7 @@ class Database:
             count = await self.db.quests.count_documents({"expires_at": {"$lt": datetime.now()}})
             return count
         except Exception as e:
-            print(f"Error counting quest notifications: {e}")
+            logger.error(f"Error counting quest notifications: {e}")
             return 0
 
     async def count_pending_exchanges(self):
@@ -800,18 +1236,95 @@ class Database:
             count = await self.db.exchanges.count_documents({"status": "pending"})
             return count
         except Exception as e:
-            print(f"Error counting pending exchanges: {e}")
+            logger.error(f"Error counting pending exchanges: {e}")
             return 0
 
+    async def get_admin_notification_counts(self) -> dict:
+        """管理者向けの各種通知数をまとめて取得（数秒間キャッシュ）"""
+        cached = self._admin_counts_cache
+        if cached and time.monotonic() - cached[0] < ADMIN_COUNTS_CACHE_TTL:
+            return cached[1]
+
+        # 各カウントを並行して実行
+        reports, feedback, quests, exchange, security = await asyncio.gather(
+            self.count_unread_reports(),
+            self.count_unread_feedback(),
+            self.count_quest_notifications(),
+            self.count_pending_exchanges(),
+            self.count_security_notifications()
+        )
+        counts = {
+            "reports": reports,
+            "feedback": feedback,
+            "quests": quests,
+            "exchange": exchange,
+            "security": security
+        }
+        self._admin_counts_cache = (time.monotonic(), counts)
+        return counts
+
+    def invalidate_admin_counts(self):
+        """管理者向け通知数のキャッシュを破棄"""
+        self._admin_counts_cache = None
+
     async def create_security_log(self, log_data: dict) -> str:
         """セキュリティイベントログを保存"""
         try:
             result = await self.db.security_logs.insert_one(log_data)
+            await self._increment_security_rollup(log_data)
+            # 管理者向け通知数に含まれる重要なイベントのみキャッシュを破棄
+            if log_data.get("severity") in ["WARNING", "ERROR", "CRITICAL"]:
+                self.invalidate_admin_counts()
             return str(result.inserted_id)
         except Exception as e:
-            print(f"Error creating security log: {e}")
+            logger.error(f"Error creating security log: {e}")
             return None
 
+    async def _increment_security_rollup(self, log_data: dict):
+        """イベント種別・重要度・IPごとの時間別集計を加算"""
+        hour = log_data["timestamp"].replace(minute=0, second=0, microsecond=0)
+        await self.db.security_log_rollups.update_one(
+            {
+                "hour": hour,
+                "event_type": log_data.get("event_type"),
+                "severity": log_data.get("severity"),
+                "ip_address": log_data.get("ip_address")
+            },
+            {"$inc": {"count": 1}},
+            upsert=True
+        )
+
+    @staticmethod
+    def _security_log_query(
+        user_id: str = None,
+        ip_address: str = None,
+        event_type: str = None,
+        severity: str = None,
+        start_date: datetime = None,
+        end_date: datetime = None
+    ) -> dict:
+        """セキュリティログの検索条件を構築"""
+        query = {}
+        
+        # フィルタの構築
+        if user_id:
+            query["user_id"] = user_id
+        if ip_address:
+            query["ip_address"] = ip_address
+        if event_type:
+            query["event_type"] = event_type
+        if severity:
+            query["severity"] = severity
+        
+        # 日付範囲フィルタ
+        if start_date or end_date:
+            query["timestamp"] = {}
+            if start_date:
+                query["timestamp"]["$gte"] = start_date
+            if end_date:
+                query["timestamp"]["$lte"] = end_date
+        return query
+
     async def get_security_logs(
         self, 
         user_id: str = None,
@@ -824,25 +1337,7 @@ class Database:
     ) -> List[dict]:
         """セキュリティログの取得"""
         try:
-            query = {}
-            
-            # フィルタの構築
-            if user_id:
-                query["user_id"] = user_id
-            if ip_address:
-                query["ip_address"] = ip_address
-            if event_type:
-                query["event_type"] = event_type
-            if severity:
-                query["severity"] = severity
-            
-            # 日付範囲フィルタ
-            if start_date or end_date:
-                query["timestamp"] = {}
-                if start_date:
-                    query["timestamp"]["$gte"] = start_date
-                if end_date:
-                    query["timestamp"]["$lte"] = end_date
+            query = self._security_log_query(user_id, ip_address, event_type, severity, start_date, end_date)
             
             # クエリ実行
             logs = await self.db.security_logs.find(query).sort("timestamp", -1).limit(limit).to_list(length=None)
@@ -853,9 +1348,33 @@ class Database:
                 
             return logs
         except Exception as e:
-            print(f"Error getting security logs: {e}")
+            logger.error(f"Error getting security logs: {e}")
             return []
 
+    async def iter_security_logs(self, after: Optional[str] = None, batch_size: int = 1000, **filters):
+        """セキュリティログを新しい順に1件ずつ返す（afterで指定したIDの続きから）"""
+        query = self._security_log_query(**filters)
+        after_id = ObjectId(after) if after else None
+        anchor_time = None
+        if after_id:
+            # (timestamp, _id)の順で続きを取得（絞り込み用の(<field>, timestamp, _id)インデックスでソートを省く）
+            anchor = await self.db.security_logs.find_one({"_id": after_id}, {"timestamp": 1})
+            # 保持期間を過ぎて削除されていればIDの生成時刻で代用
+            anchor_time = anchor["timestamp"] if anchor else after_id.generation_time.replace(tzinfo=None)
+            timestamp_query = query.setdefault("timestamp", {})
+            end_date = timestamp_query.get("$lte")
+            timestamp_query["$lte"] = min(end_date, anchor_time) if end_date else anchor_time
+        
+        cursor = self.db.security_logs.find(query).sort([("timestamp", -1), ("_id", -1)]).batch_size(batch_size)
+        try:
+            async for log in cursor:
+                # 同じ時刻のログのうち、前回までに返したもの（IDがafter以上）は除く
+                if after_id and log.get("timestamp") == anchor_time and log["_id"] >= after_id:
+                    continue
+                yield log
+        finally:
+            await cursor.close()
+
     async def get_all_admins(self):
         """全ての管理者ユーザーを取得"""
         admins = await self.db.users.find({"is_admin": True}).to_list(length=100)
@@ -875,7 +1394,7 @@ class Database:
             })
             return count
         except Exception as e:
-            print(f"Error counting security notifications: {e}")
+            logger.error(f"Error counting security notifications: {e}")
             return 0
 
     async def mark_quest_notifications_as_read(self):
@@ -902,9 +1421,10 @@ class Database:
                 {"$set": {"read": True}}
             )
             
+            self.invalidate_admin_counts()
             return result.modified_count
         except Exception as e:
-            print(f"Error marking quest notifications as read: {e}")
+            logger.error(f"Error marking quest notifications as read: {e}")
             return 0
 
     async def mark_exchanges_as_read(self):
@@ -924,9 +1444,10 @@ class Database:
                 {"$set": {"read": True}}
             )
             
+            self.invalidate_admin_counts()
             return result.modified_count
         except Exception as e:
-            print(f"Error marking exchange notifications as read: {e}")
+            logger.error(f"Error marking exchange notifications as read: {e}")
             return 0
 
     # api/utils/db.py に追加する関数（存在しない場合）
@@ -948,9 +1469,10 @@ class Database:
                 {"$set": {"read": True}}
             )
             
+            self.invalidate_admin_counts()
             return result.modified_count
         except Exception as e:
-            print(f"Error marking reports as read: {e}")
+            logger.error(f"Error marking reports as read: {e}")
             return 0
 
     async def mark_feedback_as_read(self):
@@ -970,9 +1492,10 @@ class Database:
                 {"$set": {"read": True}}
             )
             
+            self.invalidate_admin_counts()
             return result.modified_count
         except Exception as e:
-            print(f"Error marking feedback as read: {e}")
+            logger.error(f"Error marking feedback as read: {e}")
             return 0
 
 # グローバルなデータベースインスタンス
@@ -0,0 +1,42 @@
+import aiohttp
+from typing import Optional
+from api.utils.config import Config
+
+class HttpClient:
+    """アプリケーション全体で共有するHTTPクライアント（コネクションプール付き）"""
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        """セッションとコネクションプールを作成"""
+        if self._session and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=Config.HTTP_POOL_LIMIT,  # 全体の同時接続数
+            limit_per_host=Config.HTTP_POOL_LIMIT_PER_HOST,  # ホストごとの同時接続数
+            keepalive_timeout=Config.HTTP_KEEPALIVE_SECONDS,
+            ttl_dns_cache=Config.HTTP_DNS_CACHE_SECONDS
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=Config.HTTP_TIMEOUT_SECONDS,
+            connect=Config.HTTP_CONNECT_TIMEOUT_SECONDS
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self):
+        """セッションを閉じてプール内の接続を解放"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """共有セッションを取得"""
+        if self._session is None or self._session.closed:
+            raise RuntimeError("HTTP client is not started")
+        return self._session
+
+# グローバルなHTTPクライアントインスタンス
+http_client = HttpClient()
@@ -1,52 +1,139 @@
 import logging
+import logging.handlers
 from datetime import datetime
 import json
 import os
+import queue
+import random
+from api.utils.config import Config
 
 # ログディレクトリの設定
 log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
 os.makedirs(log_dir, exist_ok=True)
 
-# 一般的なロガーの設定
+# 一般的なロガー（各モジュールはlogging.getLogger(__name__)でこの配下のロガーを使う）
 logger = logging.getLogger('api')
-logger.setLevel(logging.INFO)
 
-# 一般ログのファイルハンドラー
-general_log_file = os.path.join(log_dir, f'api-{datetime.now().strftime("%Y-%m-%d")}.log')
-general_file_handler = logging.FileHandler(general_log_file)
-general_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-logger.addHandler(general_file_handler)
-
-# セキュリティログの設定
+# セキュリティログ用のロガー
 security_logger = logging.getLogger('security')
-security_logger.setLevel(logging.INFO)
 
-# セキュリティログのファイルハンドラー
-security_log_file = os.path.join(log_dir, f'security-{datetime.now().strftime("%Y-%m-%d")}.log')
-file_handler = logging.FileHandler(security_log_file)
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-security_logger.addHandler(file_handler)
+# LogRecordが標準で持つ属性（extraで渡された項目と区別するため）
+_RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """ログを1行のJSONとして整形"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        # extraで渡された項目もそのまま出力
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """extra={'sample_rate': 0.1}のように指定されたレコードを間引く（WARNING以上は常に出力）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, 'sample_rate', None)
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < rate
+
+class _NameFilter(logging.Filter):
+    """指定したロガー配下のレコードのみ通す（excludeで反転）"""
+
+    def __init__(self, name: str, exclude: bool = False):
+        super().__init__(name)
+        self.exclude = exclude
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return super().filter(record) != self.exclude
+
+_listener = None
+
+def setup_logging():
+    """キュー経由でログを書き出す設定を行う（イベントループ上ではディスクI/Oを行わない）"""
+    global _listener
+    if _listener is not None:
+        return
+
+    json_formatter = JsonFormatter()
+
+    # 一般ログ（サイズでローテーション）
+    general_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, 'api.log'),
+        maxBytes=Config.LOG_MAX_BYTES,
+        backupCount=Config.LOG_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    general_handler.setFormatter(json_formatter)
+    general_handler.addFilter(_NameFilter('security', exclude=True))
+
+    # セキュリティログ（日付でローテーション）
+    security_handler = logging.handlers.TimedRotatingFileHandler(
+        os.path.join(log_dir, 'security.log'),
+        when='midnight',
+        backupCount=Config.LOG_BACKUP_COUNT,
+        encoding='utf-8',
+        utc=True
+    )
+    security_handler.setFormatter(json_formatter)
+    security_handler.addFilter(_NameFilter('security'))
+
+    # コンソール出力
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    # ロガーはキューに積むだけで、書き込みは別スレッドのリスナーが行う
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(Config.LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, general_handler, security_handler, console_handler,
+        respect_handler_level=True
+    )
+    _listener.start()
+
+def stop_logging():
+    """キューに残ったログを書き出してリスナーを停止"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 def log_security_event(event_type: str, details: dict, severity: str = 'INFO'):
     """
     セキュリティイベントをログに記録
     """
-    log_data = {
-        'event_type': event_type,
-        'timestamp': datetime.utcnow().isoformat(),
-        'severity': severity,
-        'details': details
-    }
-    
-    if severity == 'INFO':
-        security_logger.info(json.dumps(log_data))
-    elif severity == 'WARNING':
-        security_logger.warning(json.dumps(log_data))
-    elif severity == 'ERROR':
-        security_logger.error(json.dumps(log_data))
-    elif severity == 'CRITICAL':
-        security_logger.critical(json.dumps(log_data))
+    level = logging.getLevelName(severity)
+    if not isinstance(level, int):
+        level = logging.INFO
+
+    # INFOのイベントは件数が多いため一部のみ出力
+    security_logger.log(
+        level,
+        event_type,
+        extra={
+            'event_type': event_type,
+            'severity': severity,
+            'details': details,
+            'sample_rate': Config.LOG_SECURITY_INFO_SAMPLE_RATE
+        }
+    )
 
 # モジュールレベルで他のモジュールから直接importできる形でオブジェクトを公開
 # ここが重要：明示的にモジュールからエクスポートするロガーとメソッドを定義
-__all__ = ['logger', 'security_logger', 'log_security_event']
\ No newline at end of file
+__all__ = ['logger', 'security_logger', 'log_security_event', 'setup_logging', 'stop_logging']
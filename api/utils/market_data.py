@@ -0,0 +1,234 @@
+import aiohttp
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Optional
+from api.utils.broadcast import BroadcastHub
+from api.utils.config import Config
+from api.utils.http_client import http_client
+
+logger = logging.getLogger("api.crypto")
+
+# フォールバック時に使用するチャート画像（優先順）
+CHART_IMAGE_PATHS = [
+    os.path.join(os.path.dirname(__file__), "../../bot/data/website_chart.png"),
+    os.path.join(os.path.dirname(__file__), "../static/default_chart.png"),
+]
+
+class ChartImage:
+    """キャッシュされたチャート画像"""
+
+    def __init__(self, data: bytes, mtime_ns: int):
+        self.data = data
+        self.mtime_ns = mtime_ns
+        self.base64 = base64.b64encode(data).decode()
+        self.etag = f'"{hashlib.sha1(data).hexdigest()}"'
+
+class ChartImageCache:
+    """チャート画像をファイルの更新時刻をキーにキャッシュ"""
+
+    def __init__(self, paths: list, check_interval_seconds: float = 1.0):
+        self.paths = paths
+        self.check_interval_seconds = check_interval_seconds
+        self._key = None  # (パス, 更新時刻, サイズ)
+        self._image: Optional[ChartImage] = None
+        self._checked_at = 0.0
+
+    def load(self) -> Optional[ChartImage]:
+        """チャート画像を取得（ファイルが変更された場合のみ再読み込み・ブロッキング処理）"""
+        now = time.monotonic()
+        if self._image is not None and now - self._checked_at < self.check_interval_seconds:
+            return self._image
+        self._checked_at = now
+
+        for image_path in self.paths:
+            try:
+                stat = os.stat(image_path)
+            except FileNotFoundError:
+                continue
+
+            key = (image_path, stat.st_mtime_ns, stat.st_size)
+            if key != self._key:
+                with open(image_path, "rb") as image_file:
+                    self._image = ChartImage(image_file.read(), stat.st_mtime_ns)
+                self._key = key
+            return self._image
+
+        self._key = None
+        self._image = None
+        return None
+
+# グローバルなチャート画像キャッシュ
+chart_cache = ChartImageCache(CHART_IMAGE_PATHS)
+
+def build_fallback_snapshot(chart: Optional[ChartImage]) -> dict:
+    """WebSocketサーバーに接続できない場合のマーケットデータ"""
+    if chart is None:
+        logger.warning("チャート画像が見つかりません")
+        # チャートなしでデータを返す
+        return {
+            "success": True,
+            "data": {
+                "price": {
+                    "current": 1250,
+                    "change_rate": 0.0
+                },
+                "volume": {
+                    "24h": 0
+                },
+                "market_cap": 12500000,
+                "timestamp": int(datetime.utcnow().timestamp()),
+                "chart": ""
+            }
+        }
+
+    return {
+        "success": True,
+        "data": {
+            "price": {
+                "current": 1250,
+                "change_rate": 2.5
+            },
+            "volume": {
+                "24h": 50000
+            },
+            "market_cap": 12500000,
+            "timestamp": int(datetime.utcnow().timestamp()),
+            "chart": chart.base64,
+            # 画像のみを個別に取得するためのURL（ETagで再検証可能）
+            "chart_url": "/api/crypto/chart",
+            "chart_etag": chart.etag
+        }
+    }
+
+class MarketDataFetcher:
+    """マーケットデータの非同期取得（単一実行・stale-while-revalidate）"""
+
+    def __init__(self, ttl_seconds: float, refresh_interval_seconds: float, hub: Optional[BroadcastHub] = None):
+        self.ttl_seconds = ttl_seconds
+        self.refresh_interval_seconds = refresh_interval_seconds
+        # 更新のたびにスナップショットを配信するハブ
+        self.hub = hub
+        self._snapshot: Optional[dict] = None
+        self._is_fallback = False
+        self._updated_at = 0.0
+        # 実行中の更新タスク（同時リクエストはこのタスクの完了を共有する）
+        self._inflight: Optional[asyncio.Task] = None
+        self._refresh_loop: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        """キャッシュが有効期限内か"""
+        return self._snapshot is not None and time.monotonic() - self._updated_at < self.ttl_seconds
+
+    async def get(self) -> dict:
+        """マーケットデータを取得（期限切れなら古いデータを返しつつ裏で更新）"""
+        if self.is_fresh():
+            return self._snapshot
+
+        if self._snapshot is not None:
+            self._schedule_refresh()
+            return self._snapshot
+
+        # 初回のみ更新の完了を待つ
+        return await self.refresh()
+
+    async def refresh(self) -> dict:
+        """スナップショットを更新（実行中の更新があればそれを待つ）"""
+        # shieldで呼び出し元のキャンセルが共有タスクに伝播しないようにする
+        return await asyncio.shield(self._schedule_refresh())
+
+    def _schedule_refresh(self) -> asyncio.Task:
+        """更新タスクを一つだけ起動"""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._do_refresh())
+        return self._inflight
+
+    async def _do_refresh(self) -> dict:
+        """上流から取得し、失敗時は最後の正常なデータかフォールバックを使う"""
+        try:
+            data = await self._fetch_upstream()
+            if data is not None:
+                self._snapshot = data
+                self._is_fallback = False
+            elif self._snapshot is None or self._is_fallback:
+                # 画像はファイルが更新された時だけ読み直される
+                chart = await asyncio.to_thread(chart_cache.load)
+                self._snapshot = build_fallback_snapshot(chart)
+                self._is_fallback = True
+        except Exception as e:
+            logger.error(f"マーケットデータ取得エラー: {e}")
+            if self._snapshot is None:
+                raise
+
+        # 失敗時もTTLの間は再試行しない
+        self._updated_at = time.monotonic()
+        self._publish()
+        return self._snapshot
+
+    def _publish(self):
+        """購読者へ配信（シリアライズは1回だけ行い全購読者で共有する）"""
+        if self.hub is None or self._snapshot is None:
+            return
+        snapshot = self._snapshot
+        data = snapshot.get("data")
+        # 画像を /chart から取得できる場合はストリームにBase64画像を含めない
+        if isinstance(data, dict) and data.get("chart_url"):
+            snapshot = {**snapshot, "data": {k: v for k, v in data.items() if k != "chart"}}
+        self.hub.publish(json.dumps(snapshot, default=str))
+
+    async def _fetch_upstream(self) -> Optional[dict]:
+        """WebSocketサーバーからデータを取得"""
+        try:
+            timeout = aiohttp.ClientTimeout(total=Config.MARKET_DATA_TIMEOUT_SECONDS)
+            async with http_client.session.get(Config.MARKET_DATA_URL, timeout=timeout) as response:
+                if response.status == 200:
+                    return await response.json()
+                logger.error(f"WebSocketサーバー応答エラー: {response.status}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"WebSocketサーバー接続エラー: {e}")
+        return None
+
+    async def _run_refresh_loop(self):
+        """定期的にスナップショットを更新するバックグラウンドタスク"""
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"マーケットデータ定期更新エラー: {e}")
+            await asyncio.sleep(self.refresh_interval_seconds)
+
+    def start(self):
+        """バックグラウンド更新を開始"""
+        if self._refresh_loop is None or self._refresh_loop.done():
+            self._refresh_loop = asyncio.create_task(self._run_refresh_loop())
+
+    async def stop(self):
+        """バックグラウンド更新を停止"""
+        for task in (self._refresh_loop, self._inflight):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._refresh_loop = None
+        self._inflight = None
+        if self.hub is not None:
+            self.hub.close()
+
+# マーケットデータのストリーム配信用ハブ
+market_hub = BroadcastHub(queue_size=Config.STREAM_QUEUE_SIZE)
+
+# グローバルなマーケットデータ取得インスタンス
+market_data = MarketDataFetcher(
+    ttl_seconds=Config.MARKET_CACHE_TTL_SECONDS,
+    refresh_interval_seconds=Config.MARKET_REFRESH_INTERVAL_SECONDS,
+    hub=market_hub
+)
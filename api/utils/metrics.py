@@ -0,0 +1,167 @@
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from pymongo import monitoring
+
+# レイテンシのヒストグラム境界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 1リクエストあたりのクエリ数のヒストグラム境界
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class Histogram:
+    """Prometheus形式の累積ヒストグラム"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """値を記録"""
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+class RequestDbStats:
+    """1リクエスト中に発行されたDBコマンドの集計"""
+
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+# 処理中のリクエストのDB集計（コマンド監視から参照する）
+current_request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("current_request_db_stats", default=None)
+
+def _labels(**labels) -> str:
+    """ラベルをPrometheus形式の文字列に変換"""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+class MetricsRegistry:
+    """HTTPリクエストとDBコマンドのメトリクスを保持"""
+
+    def __init__(self):
+        # DBコマンドの完了通知はMotorのワーカースレッドから届く
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.http_requests: Dict[Tuple[str, str, int], int] = {}
+        self.http_latency: Dict[Tuple[str, str], Histogram] = {}
+        self.http_db_queries: Dict[Tuple[str, str], Histogram] = {}
+        self.http_db_seconds: Dict[Tuple[str, str], float] = {}
+        self.db_commands: Dict[Tuple[str, str, str], int] = {}
+        self.db_latency: Dict[Tuple[str, str], Histogram] = {}
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, db_stats: RequestDbStats):
+        """HTTPリクエストの結果を記録"""
+        key = (method, route)
+        with self._lock:
+            self.http_requests[(method, route, status)] = self.http_requests.get((method, route, status), 0) + 1
+            self.http_latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.http_db_queries.setdefault(key, Histogram(QUERY_COUNT_BUCKETS)).observe(db_stats.count)
+            self.http_db_seconds[key] = self.http_db_seconds.get(key, 0.0) + db_stats.seconds
+
+    def observe_command(self, command: str, collection: str, seconds: float, succeeded: bool):
+        """DBコマンドの結果を記録"""
+        outcome = "success" if succeeded else "failure"
+        with self._lock:
+            key = (command, collection, outcome)
+            self.db_commands[key] = self.db_commands.get(key, 0) + 1
+            self.db_latency.setdefault((command, collection), Histogram(LATENCY_BUCKETS)).observe(seconds)
+
+    def _render_histogram(self, lines: list, name: str, series: Dict[Tuple[str, str], Histogram], label_names: Tuple[str, str]):
+        """ヒストグラムをテキスト形式で出力"""
+        for key, histogram in sorted(series.items()):
+            labels = dict(zip(label_names, key))
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+            lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+            lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+
+    def render(self) -> str:
+        """Prometheusのテキスト形式で出力"""
+        lines = []
+        with self._lock:
+            lines.append("# HELP paraccoli_uptime_seconds Seconds since the process started.")
+            lines.append("# TYPE paraccoli_uptime_seconds gauge")
+            lines.append(f"paraccoli_uptime_seconds {time.time() - self.started_at}")
+
+            lines.append("# HELP http_requests_total HTTP requests by route and status.")
+            lines.append("# TYPE http_requests_total counter")
+            for (method, route, status), count in sorted(self.http_requests.items()):
+                lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+            lines.append("# HELP http_request_duration_seconds HTTP request latency by route.")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            self._render_histogram(lines, "http_request_duration_seconds", self.http_latency, ("method", "route"))
+
+            lines.append("# HELP http_request_db_queries Database commands issued per HTTP request.")
+            lines.append("# TYPE http_request_db_queries histogram")
+            self._render_histogram(lines, "http_request_db_queries", self.http_db_queries, ("method", "route"))
+
+            lines.append("# HELP http_request_db_seconds_total Time spent in database commands by route.")
+            lines.append("# TYPE http_request_db_seconds_total counter")
+            for (method, route), seconds in sorted(self.http_db_seconds.items()):
+                lines.append(f"http_request_db_seconds_total{_labels(method=method, route=route)} {seconds}")
+
+            lines.append("# HELP mongodb_commands_total MongoDB commands by collection and outcome.")
+            lines.append("# TYPE mongodb_commands_total counter")
+            for (command, collection, outcome), count in sorted(self.db_commands.items()):
+                lines.append(f"mongodb_commands_total{_labels(command=command, collection=collection, outcome=outcome)} {count}")
+
+            lines.append("# HELP mongodb_command_duration_seconds MongoDB command latency by collection.")
+            lines.append("# TYPE mongodb_command_duration_seconds histogram")
+            self._render_histogram(lines, "mongodb_command_duration_seconds", self.db_latency, ("command", "collection"))
+        return "\n".join(lines) + "\n"
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """MongoDBコマンドを監視してコレクション別・リクエスト別に集計"""
+
+    # コレクション名を持たない接続管理系のコマンドは記録しない
+    IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions"}
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        # (接続ID, リクエストID) -> (コレクション名, リクエストの集計)
+        self._pending = {}
+
+    def started(self, event):
+        if event.command_name in self.IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        if not isinstance(collection, str):
+            collection = ""
+        # Motorは呼び出し元のコンテキストをワーカースレッドに引き継ぐ
+        self._pending[(event.connection_id, event.request_id)] = (collection, current_request_db_stats.get())
+
+    def _finish(self, event, succeeded: bool):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        collection, stats = pending
+        seconds = event.duration_micros / 1_000_000
+        self.registry.observe_command(event.command_name, collection, seconds, succeeded)
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += seconds
+
+    def succeeded(self, event):
+        self._finish(event, True)
+
+    def failed(self, event):
+        self._finish(event, False)
+
+# グローバルなメトリクスインスタンス
+metrics = MetricsRegistry()
+command_listener = CommandMetricsListener(metrics)
@@ -0,0 +1,153 @@
+import asyncio
+import json
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from api.utils.broadcast import BroadcastHub
+from api.utils.config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+class NotificationBus:
+    """ユーザーごとの通知配信（プロセス内pub/sub + 他ワーカーの通知取り込み）"""
+
+    def __init__(self, queue_size: int = 16, dedupe_size: int = 2048):
+        self.queue_size = queue_size
+        self._hubs: Dict[str, BroadcastHub] = {}
+        # 同じ通知を二重に配信しないよう最近配信したIDを保持
+        self._recent_ids = deque(maxlen=dedupe_size)
+        self._recent_set = set()
+        self._watch_task = None
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        """ユーザーの通知を購読"""
+        hub = self._hubs.get(user_id)
+        if hub is None:
+            hub = BroadcastHub(queue_size=self.queue_size, replay_latest=False)
+            self._hubs[user_id] = hub
+        return hub.subscribe()
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        """購読を解除"""
+        hub = self._hubs.get(user_id)
+        if hub is None:
+            return
+        hub.unsubscribe(queue)
+        if hub.subscriber_count == 0:
+            del self._hubs[user_id]
+
+    def publish(self, notification: dict) -> bool:
+        """通知を購読中のユーザーに配信"""
+        notification_id = str(notification.get("_id") or notification.get("id") or "")
+        if notification_id:
+            if notification_id in self._recent_set:
+                return False
+            if len(self._recent_ids) == self._recent_ids.maxlen:
+                self._recent_set.discard(self._recent_ids[0])
+            self._recent_ids.append(notification_id)
+            self._recent_set.add(notification_id)
+
+        hub = self._hubs.get(str(notification.get("user_id")))
+        if hub is None:
+            return False
+        hub.publish(json.dumps(self._serialize(notification), default=str))
+        return True
+
+    @staticmethod
+    def _serialize(notification: dict) -> dict:
+        """JSON送信用に整形"""
+        data = {}
+        for key, value in notification.items():
+            if key == "_id":
+                data["id"] = str(value)
+            elif isinstance(value, datetime):
+                data[key] = value.isoformat()
+            elif isinstance(value, ObjectId):
+                data[key] = str(value)
+            else:
+                data[key] = value
+        return data
+
+    def start(self, collection):
+        """他ワーカーで作成された通知の取り込みを開始"""
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch(collection))
+
+    async def stop(self):
+        """取り込みを停止して購読者に終了を通知"""
+        if self._watch_task and not self._watch_task.done():
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._watch_task = None
+        for hub in list(self._hubs.values()):
+            hub.close()
+        self._hubs.clear()
+
+    async def _watch(self, collection):
+        """change streamで通知の挿入を監視（使えない間はポーリングし、間隔を空けて再試行）"""
+        retry_seconds = Config.NOTIFICATION_WATCH_RETRY_SECONDS
+        since = datetime.utcnow()
+        while True:
+            try:
+                async with collection.watch([{"$match": {"operationType": "insert"}}]) as stream:
+                    logger.info("Notification bus: using change stream")
+                    retry_seconds = Config.NOTIFICATION_WATCH_RETRY_SECONDS
+                    # 切り替えの間に挿入された通知を取りこぼさないよう一度だけ読み直す
+                    await self._poll(collection, since)
+                    async for change in stream:
+                        self.publish(change["fullDocument"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                level = logging.WARNING if isinstance(e, OperationFailure) else logging.ERROR
+                logger.log(level, f"Notification bus: change stream unavailable ({e}), polling for {retry_seconds:.0f}s")
+            since = datetime.utcnow()
+
+            # ポーリングしながら待ち、change streamを再試行する（待ち時間は倍々に延ばす）
+            try:
+                await asyncio.wait_for(self._tail(collection, since), timeout=retry_seconds)
+            except asyncio.TimeoutError:
+                pass
+            since = datetime.utcnow()
+            retry_seconds = min(retry_seconds * 2, Config.NOTIFICATION_WATCH_RETRY_MAX_SECONDS)
+
+    async def _tail(self, collection, since: datetime):
+        """新しい通知を定期的に取得"""
+        while True:
+            await asyncio.sleep(Config.NOTIFICATION_TAIL_INTERVAL_SECONDS)
+            polled_at = datetime.utcnow()
+            await self._poll(collection, since)
+            since = polled_at
+
+    async def _poll(self, collection, since: datetime):
+        """since以降の通知を取得して配信"""
+        # 購読者がいない間は読み取らない
+        if not self._hubs:
+            return
+
+        # 他プロセスが払い出した_idは挿入順と一致しないため、時間を重ねて読み直す（重複は配信時に除く）
+        since_id = ObjectId.from_datetime(since - timedelta(seconds=Config.NOTIFICATION_TAIL_OVERLAP_SECONDS))
+        user_ids = []
+        for user_id in self._hubs:
+            user_ids.append(user_id)
+            # user_idをObjectIdで保存している通知も対象にする
+            if ObjectId.is_valid(user_id):
+                user_ids.append(ObjectId(user_id))
+        try:
+            cursor = collection.find({
+                "_id": {"$gte": since_id},
+                "user_id": {"$in": user_ids}
+            }).sort("_id", 1)
+            async for notification in cursor:
+                self.publish(notification)
+        except Exception as e:
+            logger.error(f"Notification bus polling error: {e}")
+
+# グローバルな通知配信インスタンス
+notification_bus = NotificationBus(queue_size=Config.STREAM_QUEUE_SIZE)
@@ -1,6 +1,9 @@
 from datetime import datetime, timedelta
 from api.utils.db import db
 from api.models.quest import QuestActionType
+import logging
+
+logger = logging.getLogger(__name__)
 
 class QuestManager:
     @staticmethod
@@ -9,7 +12,7 @@ class QuestManager:
         try:
             # アクティブなクエストを取得
             quests = await db.get_active_quests_by_action(action_type)
-            print(f"Found {len(quests)} active quests for action {action_type}")
+            logger.debug(f"Found {len(quests)} active quests for action {action_type}")
 
             for quest in quests:
                 quest_id = str(quest["_id"])
@@ -30,7 +33,7 @@ class QuestManager:
                     },
                     upsert=True
                 )
-                print(f"Updated quest progress for quest {quest_id}")
+                logger.debug(f"Updated quest progress for quest {quest_id}")
                 
                 # 進捗確認と完了フラグ設定
                 user_quest = await db.db.user_quests.find_one({
@@ -48,10 +51,10 @@ class QuestManager:
                             }
                         }
                     )
-                    print(f"Quest {quest_id} completed for user {user_id}")
+                    logger.info(f"Quest {quest_id} completed for user {user_id}")
 
         except Exception as e:
-            print(f"Error updating quest progress: {e}")
+            logger.error(f"Error updating quest progress: {e}")
 
     @staticmethod
     async def check_expired_quests():
@@ -69,9 +72,9 @@ class QuestManager:
         try:
             # デイリーログインの進捗を更新
             await QuestManager.update_quest_progress(user_id, QuestActionType.LOGIN)
-            print(f"Login quest progress updated for user {user_id}")
+            logger.info(f"Login quest progress updated for user {user_id}")
         except Exception as e:
-            print(f"Error handling login: {e}")
+            logger.error(f"Error handling login: {e}")
 
     @staticmethod
     async def handle_post(user_id: str):
@@ -93,9 +96,9 @@ class QuestManager:
         """宣伝報告アクション処理"""
         try:
             await QuestManager.update_quest_progress(user_id, QuestActionType.PROMOTION)
-            print(f"Promotion quest progress updated for user {user_id}")
+            logger.info(f"Promotion quest progress updated for user {user_id}")
         except Exception as e:
-            print(f"Error handling promotion: {e}")
+            logger.error(f"Error handling promotion: {e}")
 
     @staticmethod
     async def get_user_active_quests(user_id: str):
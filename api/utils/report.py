@@ -2,6 +2,9 @@ import discord
 from bot.utils.config import Config
 from api.utils.db import db
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 async def send_report_to_admin(post: dict, report: dict):
     """管理者に通報を通知"""
@@ -38,7 +41,7 @@ async def send_report_to_admin(post: dict, report: dict):
         await admin_user.send(embed=embed)
         
     except Exception as e:
-        print(f"Error sending report to admin: {e}")
+        logger.error(f"Error sending report to admin: {e}")
 
 async def create_site_report(target: dict, report: dict):
     """サイト内の通報を作成"""
@@ -63,5 +66,5 @@ async def create_site_report(target: dict, report: dict):
         return str(report_id)
         
     except Exception as e:
-        print(f"Error creating report: {e}")
+        logger.error(f"Error creating report: {e}")
         raise
\ No newline at end of file
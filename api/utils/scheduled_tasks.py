@@ -1,7 +1,13 @@
 # api/utils/scheduled_tasks.py
 from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import UpdateOne
+from api.utils.config import Config
 from api.utils.db import db
 from api.utils.security import log_security_event
+import logging
+
+logger = logging.getLogger(__name__)
 
 async def cleanup_expired_blacklists():
     """期限切れのブラックリストエントリをクリーンアップ"""
@@ -11,20 +17,21 @@ async def cleanup_expired_blacklists():
         "expires_at": {"$lt": current_time}
     })
     
-    print(f"Cleaned up {result.deleted_count} expired blacklist entries")
+    logger.info(f"Cleaned up {result.deleted_count} expired blacklist entries")
 
 async def analyze_security_trends():
     """セキュリティイベントの傾向を分析"""
-    one_day_ago = datetime.utcnow() - timedelta(days=1)
+    # 時間別集計の単位に合わせて開始時刻を切り捨てる
+    one_day_ago = (datetime.utcnow() - timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
     
-    # 過去24時間の攻撃パターンを集計
+    # 過去24時間の攻撃パターンを時間別集計から算出（イベント数ではなく集計バケット数に比例）
     pipeline = [
-        {"$match": {"timestamp": {"$gt": one_day_ago}, "severity": {"$in": ["WARNING", "ERROR", "CRITICAL"]}}},
-        {"$group": {"_id": "$event_type", "count": {"$sum": 1}}},
+        {"$match": {"hour": {"$gte": one_day_ago}, "severity": {"$in": ["WARNING", "ERROR", "CRITICAL"]}}},
+        {"$group": {"_id": "$event_type", "count": {"$sum": "$count"}}},
         {"$sort": {"count": -1}}
     ]
     
-    attack_patterns = await db.db.security_logs.aggregate(pipeline).to_list(length=20)
+    attack_patterns = await db.db.security_log_rollups.aggregate(pipeline).to_list(length=20)
     
     # 結果を管理者に通知
     if attack_patterns:
@@ -37,4 +44,69 @@ async def analyze_security_trends():
                 "content": f"過去24時間で {most_common['_id']} イベントが {most_common['count']} 回発生しています。",
                 "created_at": datetime.utcnow(),
                 "read": False
-            })
\ No newline at end of file
+            })
+
+async def reconcile_pending_ledger():
+    """トランザクションなしで書き込まれ、保留状態のまま残った台帳明細を照合"""
+    await db.reconcile_pending_ledger()
+
+async def snapshot_ledger(batch_size: int = 500):
+    """保持期間を過ぎた台帳明細をユーザーごとのスナップショットに集約して削除"""
+    cutoff = datetime.utcnow() - timedelta(days=Config.LEDGER_RETENTION_DAYS)
+    # 台帳の_idは作成時刻順なので、_idの範囲で期間を指定できる
+    cutoff_id = ObjectId.from_datetime(cutoff)
+    
+    # 保留状態の明細を先に確定・破棄しておく
+    await db.reconcile_pending_ledger()
+    
+    pipeline = [
+        # 保留中の明細は残高への反映が確定するまで集約しない
+        {"$match": {"_id": {"$lt": cutoff_id}, "status": {"$exists": False}}},
+        {"$group": {
+            "_id": "$user_id",
+            "amount": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+            "last_entry_id": {"$max": "$_id"}
+        }}
+    ]
+    
+    async def compact(groups):
+        async def apply(session):
+            now = datetime.utcnow()
+            await db.db.ledger_snapshots.bulk_write([
+                UpdateOne(
+                    {"_id": group["_id"]},
+                    {
+                        "$inc": {"amount_total": group["amount"], "entry_count": group["count"]},
+                        "$max": {"last_entry_id": group["last_entry_id"]},
+                        "$set": {"compacted_until": cutoff, "updated_at": now}
+                    },
+                    upsert=True
+                )
+                for group in groups
+            ], session=session)
+            # スナップショットに集約した明細を削除
+            await db.db.ledger.delete_many({
+                "user_id": {"$in": [group["_id"] for group in groups]},
+                "_id": {"$lt": cutoff_id},
+                "status": {"$exists": False}
+            }, session=session)
+        
+        await db.run_in_transaction(apply)
+    
+    users = 0
+    entries = 0
+    batch = []
+    async for group in db.db.ledger.aggregate(pipeline, allowDiskUse=True):
+        batch.append(group)
+        if len(batch) >= batch_size:
+            await compact(batch)
+            users += len(batch)
+            entries += sum(group["count"] for group in batch)
+            batch = []
+    if batch:
+        await compact(batch)
+        users += len(batch)
+        entries += sum(group["count"] for group in batch)
+    
+    logger.info(f"Compacted {entries} ledger entries into snapshots for {users} users")
\ No newline at end of file
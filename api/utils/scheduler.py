@@ -1,16 +1,150 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import functools
+import os
+import socket
+import time
+import uuid
 from api.models.quest import QuestType, daily_quest_templates, weekly_quest_templates
+from api.utils.config import Config
 from api.utils.db import db
+import logging
+
+logger = logging.getLogger(__name__)
 
 # スケジューラを作成
 scheduler = AsyncIOScheduler()
 
+# このプロセスを識別するID（ホスト名:PID:乱数）
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class SchedulerLeader:
+    """MongoDBのリースを使ったスケジューラのリーダー選出"""
+
+    def __init__(self, lock_id: str = "scheduler_leader", worker_id: str = WORKER_ID):
+        self.lock_id = lock_id
+        self.worker_id = worker_id
+        self.lease_seconds = Config.SCHEDULER_LEASE_SECONDS
+        self.is_leader = False
+        # リースの有効期限（ローカルの単調時計で管理）
+        self._local_expires = 0.0
+
+    async def try_acquire(self) -> bool:
+        """リースの取得・更新を試みる（期限切れなら他ワーカーから引き継ぐ）"""
+        now = datetime.utcnow()
+        started = time.monotonic()
+        try:
+            lock = await db.db.scheduler_locks.find_one_and_update(
+                {
+                    "_id": self.lock_id,
+                    "$or": [
+                        {"owner": self.worker_id},
+                        {"expires_at": {"$lt": now}}
+                    ]
+                },
+                {
+                    "$set": {
+                        "owner": self.worker_id,
+                        "expires_at": now + timedelta(seconds=self.lease_seconds),
+                        "renewed_at": now
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # 他のワーカーが有効なリースを保持している
+            lock = None
+        except Exception as e:
+            logger.error(f"Error renewing scheduler lease: {e}")
+            lock = None
+
+        was_leader = self.is_leader
+        self.is_leader = bool(lock and lock.get("owner") == self.worker_id)
+        if self.is_leader:
+            self._local_expires = started + self.lease_seconds
+
+        if self.is_leader and not was_leader:
+            logger.info(f"Scheduler leadership acquired by {self.worker_id}")
+        elif was_leader and not self.is_leader:
+            logger.warning(f"Scheduler leadership lost by {self.worker_id}")
+        return self.is_leader
+
+    def holds_lease(self) -> bool:
+        """リースが有効期限内に保持されているか"""
+        return self.is_leader and time.monotonic() < self._local_expires
+
+    async def release(self):
+        """シャットダウン時にリースを解放して即座に引き継げるようにする"""
+        if not self.is_leader:
+            return
+        try:
+            await db.db.scheduler_locks.delete_one({"_id": self.lock_id, "owner": self.worker_id})
+        except Exception as e:
+            logger.error(f"Error releasing scheduler lease: {e}")
+        self.is_leader = False
+        self._local_expires = 0.0
+
+# プロセス全体で共有するリーダー選出インスタンス
+leader = SchedulerLeader()
+
+async def record_job_run(job_id: str, started_at: datetime, duration: float, error: str = None):
+    """ジョブの最終実行時刻と所要時間を記録"""
+    try:
+        await db.db.scheduler_jobs.update_one(
+            {"_id": job_id},
+            {
+                "$set": {
+                    "last_run_at": started_at,
+                    "last_duration_seconds": round(duration, 3),
+                    "last_status": "error" if error else "success",
+                    "last_error": error,
+                    "last_worker": leader.worker_id
+                },
+                "$inc": {"run_count": 1}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Error recording scheduler job run ({job_id}): {e}")
+
+def leader_only(job_id: str, func):
+    """リーダーのワーカーでのみジョブを実行するラッパー"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not leader.holds_lease():
+            return None
+
+        started_at = datetime.utcnow()
+        start = time.perf_counter()
+        error = None
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            await record_job_run(job_id, started_at, time.perf_counter() - start, error)
+
+    return wrapper
+
+def add_leader_job(func, trigger, id: str, **kwargs):
+    """リーダーのみが実行するジョブをスケジューラに登録"""
+    return scheduler.add_job(
+        leader_only(id, func),
+        trigger,
+        id=id,
+        replace_existing=True,
+        **kwargs
+    )
+
 async def generate_daily_quests():
     """デイリークエストを生成する"""
     try:
-        print(f"[{datetime.now()}] Generating daily quests...")
+        logger.info("Generating daily quests...")
         
         # 既存のデイリークエストを無効化
         await db.db.quests.update_many(
@@ -57,6 +191,7 @@ async def generate_daily_quests():
                     "is_active": True,
                     "created_at": datetime.utcnow()
                 })
+        db.invalidate_quest_cache()
                 
         # 管理者通知を作成
         await db.db.notifications.insert_one({
@@ -66,14 +201,14 @@ async def generate_daily_quests():
             "read": False
         })
         
-        print(f"[{datetime.now()}] Daily quests generated successfully")
+        logger.info("Daily quests generated successfully")
     except Exception as e:
-        print(f"[{datetime.now()}] Error generating daily quests: {e}")
+        logger.error(f"Error generating daily quests: {e}")
 
 async def generate_weekly_quests():
     """ウィークリークエストを生成する"""
     try:
-        print(f"[{datetime.now()}] Generating weekly quests...")
+        logger.info("Generating weekly quests...")
         
         # 既存のウィークリークエストを無効化
         await db.db.quests.update_many(
@@ -117,6 +252,7 @@ async def generate_weekly_quests():
                     "is_active": True,
                     "created_at": datetime.utcnow()
                 })
+        db.invalidate_quest_cache()
                 
         # 管理者通知を作成
         await db.db.notifications.insert_one({
@@ -126,26 +262,33 @@ async def generate_weekly_quests():
             "read": False
         })
         
-        print(f"[{datetime.now()}] Weekly quests generated successfully")
+        logger.info("Weekly quests generated successfully")
     except Exception as e:
-        print(f"[{datetime.now()}] Error generating weekly quests: {e}")
+        logger.error(f"Error generating weekly quests: {e}")
 
 def setup_scheduler():
     """スケジューラのセットアップ"""
-    # 毎日深夜0時にデイリークエストを生成
+    # リースの更新は全ワーカーで実行し、期限切れのリースを引き継げるようにする
     scheduler.add_job(
+        leader.try_acquire,
+        "interval",
+        seconds=Config.SCHEDULER_RENEW_SECONDS,
+        id="scheduler_leader_renew",
+        replace_existing=True
+    )
+
+    # 毎日深夜0時にデイリークエストを生成
+    add_leader_job(
         generate_daily_quests,
         CronTrigger(hour=0, minute=0),
-        id="daily_quest_job",
-        replace_existing=True
+        id="daily_quest_job"
     )
     
     # 毎週月曜日の深夜0時にウィークリークエストを生成
-    scheduler.add_job(
+    add_leader_job(
         generate_weekly_quests,
         CronTrigger(day_of_week="mon", hour=0, minute=0),
-        id="weekly_quest_job",
-        replace_existing=True
+        id="weekly_quest_job"
     )
     
     return scheduler
\ No newline at end of file
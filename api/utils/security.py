@@ -4,7 +4,11 @@ from datetime import datetime, timedelta
 import functools
 import time
 from api.utils.db import db
+from api.utils.logger import log_security_event as write_security_log
 from collections import defaultdict
+import logging
+
+logger = logging.getLogger(__name__)
 
 # auth.py からの依存関係を削除
 
@@ -286,18 +290,18 @@ async def log_security_event(
         if user_id:
             event_data["user_id"] = user_id
         
-        # データベースに記録
-        await db.db.security_logs.insert_one(event_data)
+        # データベースに記録（時間別集計も更新される）
+        await db.create_security_log(event_data)
         
         # 重大なイベントの場合は管理者通知も作成
         if severity in ["WARNING", "ERROR", "CRITICAL"]:
             await create_admin_security_notification(event_data)
             
-        # コンソールにも出力
-        print(f"[{severity}] {event_type}: {details} (IP: {ip_address}, User: {user_id})")
+        # ログにも出力（INFOは一部のみ）
+        write_security_log(event_type, {**(details or {}), "ip_address": ip_address, "user_id": user_id}, severity)
             
     except Exception as e:
-        print(f"Error logging security event: {e}")
+        logger.error(f"Error logging security event: {e}")
 
 async def create_admin_security_notification(event_data: dict):
     """重要なセキュリティイベントを管理者に通知"""
@@ -323,7 +327,7 @@ async def create_admin_security_notification(event_data: dict):
             
             await db.create_notification(notification)
     except Exception as e:
-        print(f"Error creating admin security notification: {e}")
+        logger.error(f"Error creating admin security notification: {e}")
 
 # レート制限デコレータ（クラスメソッドやファンクションに適用可能）
 def rate_limit(max_requests: int = 60, window_seconds: int = 60):
@@ -654,4 +658,4 @@ async def load_blacklist_from_db():
         ip_blacklist.add(entry["ip_address"])
         ip_blacklist_reasons[entry["ip_address"]] = entry["reason"]
     
-    print(f"Loaded {len(blacklist_entries)} IP addresses to blacklist")
\ No newline at end of file
+    logger.info(f"Loaded {len(blacklist_entries)} IP addresses to blacklist")
\ No newline at end of file
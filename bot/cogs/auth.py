@@ -1,21 +1,17 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import secrets
 from datetime import datetime, timedelta
 from typing import Optional
 from bot.models.user import User
 from bot.utils.db import db
 from bot.utils.config import Config
+from bot.utils.commands import budgeted_command, embed_cache, respond
 
 class Auth(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-    def generate_login_token(self):
-        """ログイン用のトークンを生成"""
-        return secrets.token_urlsafe(32)
-
     def create_login_embed(self):
         """ログイン案内のEmbedを作成"""
         embed = discord.Embed(
@@ -41,20 +37,50 @@ class Auth(commands.Cog):
         return embed
 
     @app_commands.command(name="login", description="PARCウェブサイトにアクセス")
+    @budgeted_command(ephemeral=True)  # プライベートメッセージとして送信
     async def login(self, interaction: discord.Interaction):
         """ウェブサイトへの誘導コマンド"""
         try:
-            embed = self.create_login_embed()
-            await interaction.response.send_message(
-                embed=embed,
-                ephemeral=True  # プライベートメッセージとして送信
-            )
+            # 内容が固定なので一度作成したEmbedを使い回す
+            embed = embed_cache.get("login", self.create_login_embed)
+            await respond(interaction, embed=embed)
             
         except Exception as e:
             print(f"Error in login command: {e}")
-            await interaction.response.send_message(
-                "エラーが発生しました。しばらく待ってから再度お試しください。",
-                ephemeral=True
+            await respond(
+                interaction,
+                "エラーが発生しました。しばらく待ってから再度お試しください。"
+            )
+
+    @app_commands.command(name="login-link", description="ワンタイムのログインURLを発行")
+    @budgeted_command(ephemeral=True)
+    async def login_link(self, interaction: discord.Interaction):
+        """ワンクリックでログインできるURLを発行するコマンド"""
+        try:
+            discord_id = str(interaction.user.id)
+            if not await db.get_user(discord_id):
+                await respond(
+                    interaction,
+                    "ユーザー登録がまだです。先にウェブサイトからDiscordでログインしてください。",
+                    embed=embed_cache.get("login", self.create_login_embed)
+                )
+                return
+
+            token = await db.issue_login_token(discord_id)
+            minutes = Config.LOGIN_TOKEN_TTL_SECONDS // 60
+            embed = discord.Embed(
+                title="ログインURL",
+                description=f"[こちらをクリック]({Config.WEBSITE_URL}/auth/callback?token={token})\n"
+                            f"このURLは{minutes}分間、1回だけ使用できます。他の人には共有しないでください。",
+                color=discord.Color.blue()
+            )
+            await respond(interaction, embed=embed)
+
+        except Exception as e:
+            print(f"Error in login-link command: {e}")
+            await respond(
+                interaction,
+                "エラーが発生しました。しばらく待ってから再度お試しください。"
             )
 
 async def setup(bot):
@@ -67,14 +93,10 @@ class User:
         username: str,
         balance: int = 0,
         created_at: Optional[datetime] = None,
-        last_login: Optional[datetime] = None,
-        login_token: Optional[str] = None,  # login_tokenを追加
-        token_expires: Optional[datetime] = None  # token_expiresを追加
+        last_login: Optional[datetime] = None
     ):
         self.discord_id = discord_id
         self.username = username
         self.balance = balance
         self.created_at = created_at or datetime.utcnow()
-        self.last_login = last_login or datetime.utcnow()
-        self.login_token = login_token  # login_tokenを追加
-        self.token_expires = token_expires  # token_expiresを追加
\ No newline at end of file
+        self.last_login = last_login or datetime.utcnow()
\ No newline at end of file
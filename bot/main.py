@@ -19,6 +19,9 @@ class ParaccoliBot(commands.Bot):
     
     async def setup_hook(self):
         """Bot起動時の初期設定"""
+        # データベースに接続（イベントループ上で非同期に行う）
+        await db.connect()
+        
         # Cogの読み込み
         await self.load_extension('bot.cogs.auth')  # 修正
         
@@ -0,0 +1,131 @@
+import asyncio
+import functools
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+import discord
+from .config import Config
+
+class EmbedCache:
+    """内容が変わらないEmbedを一度だけ作成して使い回す"""
+
+    def __init__(self):
+        self._embeds: Dict[str, discord.Embed] = {}
+
+    def get(self, key: str, factory: Callable[[], discord.Embed]) -> discord.Embed:
+        """キャッシュ済みのEmbedを取得（共有されるため呼び出し側で変更しないこと）"""
+        embed = self._embeds.get(key)
+        if embed is None:
+            embed = self._embeds[key] = factory()
+        return embed
+
+    def invalidate(self, key: Optional[str] = None):
+        """キャッシュを破棄（keyを省略した場合はすべて）"""
+        if key is None:
+            self._embeds.clear()
+        else:
+            self._embeds.pop(key, None)
+
+class CommandMetrics:
+    """コマンドごとの処理時間を記録"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.durations: Dict[str, deque] = {}
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.deferred: Dict[str, int] = {}
+
+    def record(self, name: str, seconds: float, failed: bool, deferred: bool):
+        """1回分の実行結果を記録"""
+        self.durations.setdefault(name, deque(maxlen=self.window)).append(seconds)
+        self.counts[name] = self.counts.get(name, 0) + 1
+        if failed:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        if deferred:
+            self.deferred[name] = self.deferred.get(name, 0) + 1
+
+    def summary(self) -> Dict[str, dict]:
+        """直近の実行時間のパーセンタイルなどを集計"""
+        result = {}
+        for name, durations in self.durations.items():
+            ordered = sorted(durations)
+            result[name] = {
+                "count": self.counts.get(name, 0),
+                "errors": self.errors.get(name, 0),
+                "deferred": self.deferred.get(name, 0),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1)
+            }
+        return result
+
+class Responder:
+    """応答済みかどうかに応じて初回応答とフォローアップを使い分ける"""
+
+    def __init__(self, interaction: discord.Interaction, ephemeral: bool):
+        self.interaction = interaction
+        self.ephemeral = ephemeral
+        self.deferred = False
+        # 自動deferと応答の送信が競合しないようにする
+        self._lock = asyncio.Lock()
+
+    async def defer(self):
+        """まだ応答していなければ「考え中」として応答を保留"""
+        async with self._lock:
+            if not self.interaction.response.is_done():
+                await self.interaction.response.defer(ephemeral=self.ephemeral, thinking=True)
+                self.deferred = True
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        """メッセージを送信"""
+        kwargs.setdefault("ephemeral", self.ephemeral)
+        async with self._lock:
+            if self.interaction.response.is_done():
+                await self.interaction.followup.send(content, **kwargs)
+            else:
+                await self.interaction.response.send_message(content, **kwargs)
+
+def budgeted_command(budget: Optional[float] = None, ephemeral: bool = True):
+    """処理が予算時間を超えたら自動でdeferし、コマンドの処理時間を記録するデコレーター"""
+    budget = Config.COMMAND_DEFER_BUDGET_SECONDS if budget is None else budget
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, interaction: discord.Interaction, *args, **kwargs):
+            responder = Responder(interaction, ephemeral)
+            interaction.extras["responder"] = responder
+
+            async def defer_after_budget():
+                await asyncio.sleep(budget)
+                await responder.defer()
+
+            # Discordの3秒の応答期限に間に合わない場合に備える
+            deferrer = asyncio.create_task(defer_after_budget())
+            start = time.perf_counter()
+            failed = False
+            try:
+                return await func(self, interaction, *args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                deferrer.cancel()
+                elapsed = time.perf_counter() - start
+                name = interaction.command.qualified_name if interaction.command else func.__name__
+                command_metrics.record(name, elapsed, failed, responder.deferred)
+                if elapsed > budget:
+                    print(f"Slow command /{name}: {elapsed * 1000:.0f}ms (deferred: {responder.deferred})")
+        return wrapper
+    return decorator
+
+async def respond(interaction: discord.Interaction, content: Optional[str] = None, **kwargs):
+    """budgeted_command内から応答を送信（deferされていればフォローアップで送る）"""
+    responder = interaction.extras.get("responder")
+    if responder is None:
+        responder = Responder(interaction, kwargs.pop("ephemeral", False))
+    await responder.send(content, **kwargs)
+
+# グローバルなインスタンス
+embed_cache = EmbedCache()
+command_metrics = CommandMetrics()
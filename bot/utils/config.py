@@ -14,10 +14,18 @@ class Config:
     # MongoDBの設定
     MONGODB_URI = os.getenv('MONGODB_URI')
     DB_NAME = 'paraccoli'
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '50'))  # 接続プールの上限
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
     
     # トークン関連の設定
     INITIAL_BALANCE = 1000  # 新規ユーザーの初期残高
     
+    # ログイントークンの有効期限（秒）
+    LOGIN_TOKEN_TTL_SECONDS = int(os.getenv('LOGIN_TOKEN_TTL_SECONDS', '600'))
+    
+    # コマンド設定
+    COMMAND_DEFER_BUDGET_SECONDS = float(os.getenv('COMMAND_DEFER_BUDGET_SECONDS', '2.0'))  # これを超えたら自動でdefer（応答期限は3秒）
+
     # ロール設定
     VERIFIED_ROLE_ID = os.getenv('VERIFIED_ROLE_ID')
 
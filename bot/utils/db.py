@@ -1,43 +1,67 @@
-from pymongo import MongoClient
+from shared.indexes import ensure_indexes
+from shared.login_tokens import LoginTokenRepository
+from shared.mongo import create_client
+from shared.users import UserRepository
 from .config import Config
 
 class Database:
     """MongoDBとの接続を管理するクラス"""
     
     def __init__(self):
-        """データベース接続の初期化"""
-        self.client = MongoClient(Config.MONGODB_URI)
+        """データベース接続の初期化（実際の接続はconnectで行う）"""
+        self.client = None
+        self.db = None
+        self.users = None
+        self.user_repo = None
+        self.login_token_repo = None
+    
+    async def connect(self):
+        """データベースに接続（Botのsetup_hookから呼び出す）"""
+        if self.client is not None:
+            return
+        
+        # イベントループ上で作成し、コマンド間で接続プールを共有する
+        self.client = create_client(
+            Config.MONGODB_URI,
+            Config.MONGODB_MAX_POOL_SIZE,
+            Config.MONGODB_MIN_POOL_SIZE,
+            appname="paraccoli-bot"
+        )
         self.db = self.client[Config.DB_NAME]
         
         # コレクションの初期化
         self.users = self.db.users
+        self.user_repo = UserRepository(self.users)
+        self.login_token_repo = LoginTokenRepository(self.db.login_tokens)
         
         # インデックスの作成
-        self._create_indexes()
+        await self._create_indexes()
     
-    def _create_indexes(self):
-        """必要なインデックスを作成"""
-        # discord_idでユニークインデックスを作成
-        self.users.create_index('discord_id', unique=True)
+    async def _create_indexes(self):
+        """必要なインデックスを作成（定義はAPIと共通のレジストリで管理）"""
+        await ensure_indexes(self.db, ['users', 'login_tokens'])
     
     def close(self):
         """データベース接続を閉じる"""
-        self.client.close()
+        if self.client is not None:
+            self.client.close()
+            self.client = None
 
     async def get_user(self, discord_id: str):
         """ユーザー情報を取得"""
-        return await self.users.find_one({'discord_id': discord_id})
+        return await self.user_repo.get(discord_id)
 
     async def create_user(self, user_data: dict):
         """新規ユーザーを作成"""
-        return await self.users.insert_one(user_data)
+        return await self.user_repo.create(user_data)
 
     async def update_user(self, discord_id: str, update_data: dict):
         """ユーザー情報を更新"""
-        return await self.users.update_one(
-            {'discord_id': discord_id},
-            {'$set': update_data}
-        )
+        return await self.user_repo.update(discord_id, update_data)
+
+    async def issue_login_token(self, discord_id: str) -> str:
+        """ワンタイムのログイントークンを発行"""
+        return await self.login_token_repo.issue(discord_id, Config.LOGIN_TOKEN_TTL_SECONDS)
 
-# グローバルなデータベース接続インスタンス
-db = Database()
\ No newline at end of file
+# グローバルなデータベース接続インスタンス（接続はBot起動時）
+db = Database()
@@ -0,0 +1,356 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+# プロジェクトルートをPYTHONPATHに追加
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+import aiohttp
+from jose import jwt
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# ベンチマーク用サーバーに渡す署名鍵（ローカル専用）
+JWT_SECRET = "benchmark-secret"
+CATEGORIES = ["general", "crypto", "guild", "help"]
+GAMES = ["slots", "dice", "roulette"]
+# MetricsMiddlewareが付与するServer-Timingヘッダー
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+def discord_id_for(index: int) -> str:
+    """ベンチマーク用ユーザーのDiscord ID"""
+    return str(900000000000000000 + index)
+
+async def seed(db, users: int, posts: int, bets: int, notifications: int):
+    """ベンチマーク用のデータを投入"""
+    now = datetime.utcnow()
+    rng = random.Random(42)
+
+    await db.users.insert_many([
+        {
+            "discord_id": discord_id_for(i),
+            "username": f"bench_user_{i}",
+            "username_lower": f"bench_user_{i}",
+            "balance": 1_000_000,
+            "created_at": now - timedelta(days=rng.randint(0, 365)),
+            "last_login": now,
+            "is_admin": i == 0,
+            "is_new_user": False
+        }
+        for i in range(users)
+    ])
+
+    await db.forum_posts.insert_many([
+        {
+            "title": f"ベンチマーク投稿 {i}",
+            "content": "本文" * rng.randint(10, 200),
+            "category": rng.choice(CATEGORIES),
+            "tags": [],
+            "author_id": discord_id_for(rng.randrange(users)),
+            "author_name": "bench",
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now - timedelta(minutes=i)
+        }
+        for i in range(posts)
+    ])
+
+    quests = []
+    for quest_type, hours in (("daily", 24), ("weekly", 24 * 7)):
+        for i in range(3):
+            quests.append({
+                "title": f"{quest_type} quest {i}",
+                "description": "ベンチマーク用クエスト",
+                "type": quest_type,
+                "action_type": "login",
+                "required_count": 1,
+                "reward": 10,
+                "is_active": True,
+                "created_at": now,
+                "expires_at": now + timedelta(hours=hours)
+            })
+    await db.quests.insert_many(quests)
+
+    if bets:
+        await db.casino_bets.insert_many([
+            {
+                "user_id": discord_id_for(rng.randrange(users)),
+                "username": "bench",
+                "avatar": None,
+                "amount": rng.randint(1, 1000),
+                "game": rng.choice(GAMES),
+                "timestamp": now - timedelta(minutes=rng.randint(0, 600)),
+                "completed": True,
+                "completed_at": now - timedelta(minutes=rng.randint(0, 600)),
+                "won": rng.random() < 0.45,
+                "win_amount": rng.randint(0, 2000)
+            }
+            for _ in range(bets)
+        ])
+
+    if notifications:
+        await db.notifications.insert_many([
+            {
+                "user_id": discord_id_for(rng.randrange(users)),
+                "type": "system",
+                "title": "お知らせ",
+                "content": "ベンチマーク用の通知です",
+                "created_at": now - timedelta(minutes=rng.randint(0, 10000)),
+                "read": rng.random() < 0.5
+            }
+            for _ in range(notifications)
+        ])
+
+def make_token(discord_id: str) -> str:
+    """APIのverify_tokenが受け付けるアクセストークンを生成"""
+    now = datetime.utcnow()
+    return jwt.encode(
+        {"sub": discord_id, "iat": now, "exp": now + timedelta(hours=1)},
+        JWT_SECRET,
+        algorithm="HS256"
+    )
+
+class Recorder:
+    """シナリオごとのレイテンシとDBクエリ数を記録"""
+
+    def __init__(self):
+        self.recording = False
+        self.latencies: Dict[str, List[float]] = {}
+        self.db_queries: Dict[str, List[int]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, name: str, seconds: float, response: aiohttp.ClientResponse):
+        if not self.recording:
+            return
+        self.latencies.setdefault(name, []).append(seconds)
+        if response.status >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        match = SERVER_TIMING_DB.search(response.headers.get("Server-Timing", ""))
+        if match:
+            self.db_queries.setdefault(name, []).append(int(match.group(2)))
+
+async def timed_request(session: aiohttp.ClientSession, recorder: Recorder, name: str, method: str, url: str, **kwargs):
+    """リクエストを送信して結果を記録"""
+    start = time.perf_counter()
+    async with session.request(method, url, **kwargs) as response:
+        await response.read()
+        recorder.record(name, time.perf_counter() - start, response)
+        return response.status
+
+async def virtual_user(base_url: str, token: str, recorder: Recorder, deadline: float, rng: random.Random):
+    """ホットなエンドポイントを重み付きでランダムに叩き続ける"""
+    headers = {"Authorization": f"Bearer {token}"}
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(base_url=base_url, headers=headers, timeout=timeout) as session:
+        while time.monotonic() < deadline:
+            scenario = rng.choices(
+                ["users_me", "forum_list", "quests_daily", "leaderboard", "notifications", "casino"],
+                weights=[30, 20, 15, 10, 15, 10]
+            )[0]
+            try:
+                if scenario == "users_me":
+                    await timed_request(session, recorder, scenario, "GET", "/api/users/me")
+                elif scenario == "forum_list":
+                    await timed_request(session, recorder, scenario, "GET", "/api/forums/posts", params={"page": rng.randint(1, 5)})
+                elif scenario == "quests_daily":
+                    await timed_request(session, recorder, scenario, "GET", "/api/quests/daily")
+                elif scenario == "leaderboard":
+                    await timed_request(session, recorder, scenario, "GET", "/api/casino/leaderboard", params={"period": "daily"})
+                elif scenario == "notifications":
+                    await timed_request(session, recorder, scenario, "GET", "/api/notifications/my")
+                else:
+                    # ベットと結果はセットで送信
+                    game = rng.choice(GAMES)
+                    amount = rng.randint(1, 100)
+                    status = await timed_request(session, recorder, "casino_bet", "POST", "/api/casino/bet", json={"amount": amount, "game": game})
+                    if status < 400:
+                        await timed_request(session, recorder, "casino_result", "POST", "/api/casino/result", json={
+                            "game": game,
+                            "won": rng.random() < 0.45,
+                            "amount": amount,
+                            "multiplier": 2.0
+                        })
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if recorder.recording:
+                    recorder.errors[scenario] = recorder.errors.get(scenario, 0) + 1
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近傍順位法によるパーセンタイル"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+def summarize(recorder: Recorder, duration: float) -> List[dict]:
+    """シナリオごとの集計結果を作成"""
+    rows = []
+    for name in sorted(recorder.latencies):
+        latencies = recorder.latencies[name]
+        queries = recorder.db_queries.get(name, [])
+        rows.append({
+            "endpoint": name,
+            "requests": len(latencies),
+            "errors": recorder.errors.get(name, 0),
+            "rps": round(len(latencies) / duration, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "db_queries_per_request": round(sum(queries) / len(queries), 2) if queries else None
+        })
+    return rows
+
+def print_table(rows: List[dict]):
+    """集計結果を表形式で表示"""
+    columns = ["endpoint", "requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "db_queries_per_request"]
+    widths = {c: max(len(c), *(len(str(row[c])) for row in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+def start_server(args) -> subprocess.Popen:
+    """ベンチマーク用の設定でAPIサーバーを起動"""
+    env = {
+        **os.environ,
+        "MONGODB_URI": args.mongodb_uri,
+        "MONGODB_URL": args.mongodb_uri,
+        "DB_NAME": args.db_name,
+        "JWT_SECRET_KEY": JWT_SECRET,
+        "DISCORD_CLIENT_ID": os.getenv("DISCORD_CLIENT_ID", "benchmark"),
+        "DISCORD_CLIENT_SECRET": os.getenv("DISCORD_CLIENT_SECRET", "benchmark"),
+        "DISCORD_REDIRECT_URI": os.getenv("DISCORD_REDIRECT_URI", "http://localhost/callback"),
+        # 単一IPから大量に送るため負荷試験時のみ無効化
+        "RATE_LIMIT_ENABLED": "false",
+        "LOG_LEVEL": "WARNING"
+    }
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "api.main:app",
+            "--host", "127.0.0.1",
+            "--port", str(args.port),
+            "--workers", str(args.workers),
+            "--log-level", "warning",
+            "--no-access-log"
+        ],
+        cwd=project_root,
+        env=env
+    )
+
+async def wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 30):
+    """ヘルスチェックが通るまで待機"""
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError("APIサーバーが起動直後に終了しました")
+            try:
+                async with session.get(f"{base_url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError("APIサーバーの起動がタイムアウトしました")
+
+async def fetch_metrics(base_url: str) -> Optional[str]:
+    """管理者用メトリクスを取得"""
+    headers = {"Authorization": f"Bearer {make_token(discord_id_for(0))}"}
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{base_url}/api/admin/metrics", headers=headers) as response:
+            if response.status == 200:
+                return await response.text()
+    return None
+
+async def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="ローカルのMongoDBに対してAPIの負荷試験を行う")
+    parser.add_argument("--mongodb-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="paraccoli_bench")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicornのワーカー数")
+    parser.add_argument("--users", type=int, default=200, help="投入するユーザー数（同時接続の上限にもなる）")
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--bets", type=int, default=20000)
+    parser.add_argument("--notifications", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=20, help="同時に動かす仮想ユーザー数")
+    parser.add_argument("--duration", type=float, default=30, help="計測時間（秒）")
+    parser.add_argument("--warmup", type=float, default=5, help="計測前のウォームアップ時間（秒）")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="結果をJSONで保存するパス")
+    parser.add_argument("--metrics-output", help="終了時の/api/admin/metricsを保存するパス")
+    parser.add_argument("--keep-db", action="store_true", help="終了後もベンチマーク用DBを残す")
+    args = parser.parse_args()
+
+    if "bench" not in args.db_name:
+        print("誤って本番データを消さないよう、DB名には 'bench' を含めてください")
+        sys.exit(1)
+
+    client = AsyncIOMotorClient(args.mongodb_uri)
+    db = client[args.db_name]
+    process = None
+    try:
+        print(f"データベース '{args.db_name}' を初期化しています...")
+        await client.drop_database(args.db_name)
+        await seed(db, args.users, args.posts, args.bets, args.notifications)
+
+        base_url = f"http://127.0.0.1:{args.port}"
+        process = start_server(args)
+        await wait_for_server(base_url, process)
+
+        concurrency = min(args.concurrency, args.users)
+        print(f"{concurrency}並列で{args.warmup + args.duration:.0f}秒間リクエストを送信します（うちウォームアップ{args.warmup:.0f}秒）")
+        recorder = Recorder()
+        rng = random.Random(args.seed)
+        deadline = time.monotonic() + args.warmup + args.duration
+        workers = [
+            asyncio.create_task(virtual_user(
+                base_url,
+                make_token(discord_id_for(i)),
+                recorder,
+                deadline,
+                random.Random(rng.random())
+            ))
+            for i in range(concurrency)
+        ]
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        await asyncio.gather(*workers)
+
+        rows = summarize(recorder, args.duration)
+        print_table(rows)
+
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({
+                    "started_at": datetime.utcnow().isoformat(),
+                    "args": vars(args),
+                    "results": rows
+                }, f, ensure_ascii=False, indent=2)
+            print(f"結果を {args.output} に保存しました")
+
+        if args.metrics_output:
+            metrics = await fetch_metrics(base_url)
+            if metrics:
+                with open(args.metrics_output, "w", encoding="utf-8") as f:
+                    f.write(metrics)
+                print(f"メトリクスを {args.metrics_output} に保存しました")
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if not args.keep_db:
+            await client.drop_database(args.db_name)
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
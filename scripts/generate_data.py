@@ -0,0 +1,354 @@
+import argparse
+import asyncio
+import calendar
+import random
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+# プロジェクトルートをPYTHONPATHに追加
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from api.utils.config import Config
+
+# scale=1 のときの各コレクションの件数
+BASE_COUNTS = {
+    "users": 10_000,
+    "quests": 0,  # 日数から決まる
+    "forum_posts": 100_000,
+    "forum_comments": 500_000,
+    "casino_bets": 1_000_000,
+    "user_quests": 200_000,
+    "notifications": 500_000,
+    "security_logs": 1_000_000
+}
+
+CATEGORIES = ["general", "crypto", "guild", "help"]
+TAGS = ["質問", "雑談", "攻略", "バグ報告", "取引", "イベント"]
+GAMES = ["slots", "dice", "roulette", "blackjack"]
+SYLLABLES = ["pa", "ra", "ko", "li", "to", "ka", "mi", "su", "ne", "ro", "yu", "shi"]
+NOTIFICATION_TYPES = ["quest_complete", "reaction", "feedback_response", "exchange", "system"]
+# (イベント種別, 重要度, 重み)
+SECURITY_EVENTS = [
+    ("login_success", "INFO", 60),
+    ("login_failed", "WARNING", 15),
+    ("rate_limit_exceeded", "WARNING", 15),
+    ("suspicious_activity", "ERROR", 5),
+    ("ip_blacklisted", "CRITICAL", 1),
+    ("report_limit_exceeded", "WARNING", 4)
+]
+QUESTS_PER_DAY = 3
+
+class Generator:
+    """シード値から再現可能な形で各コレクションのドキュメントを生成"""
+
+    def __init__(self, counts: Dict[str, int], days: int, seed: int):
+        self.counts = counts
+        self.seed = seed
+        self.end = datetime.utcnow()
+        self.start = self.end - timedelta(days=days)
+        self.span = (self.end - self.start).total_seconds()
+        # IPアドレスの候補（一部のIPにアクセスが集中するよう偏りを持たせて選ぶ）
+        rng = random.Random(seed)
+        self.ip_pool = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}" for _ in range(5000)]
+
+    def rng_for(self, collection: str, batch_index: int) -> random.Random:
+        """バッチごとに独立した乱数（並列実行の順序に結果が左右されない）"""
+        return random.Random(f"{self.seed}:{collection}:{batch_index}")
+
+    def time_at(self, index: int, count: int) -> datetime:
+        """期間内に均等に並べた作成日時"""
+        return self.start + timedelta(seconds=self.span * index / max(count, 1))
+
+    @staticmethod
+    def object_id_at(created_at: datetime, index: int) -> ObjectId:
+        """作成日時を埋め込んだ一意なObjectId（_idの範囲検索やキーセットページングと整合させる）"""
+        # ObjectId.from_datetimeと同様にnaiveな日時はUTCとして扱う（timestamp()はローカル時刻とみなすため使わない）
+        seconds = calendar.timegm(created_at.utctimetuple())
+        return ObjectId(seconds.to_bytes(4, "big") + index.to_bytes(8, "big"))
+
+    def discord_id(self, index: int) -> str:
+        return str(800000000000000000 + index)
+
+    def random_user(self, rng: random.Random) -> str:
+        # 一部のユーザーに活動が集中する分布
+        index = min(int(rng.paretovariate(1.2)) - 1, self.counts["users"] - 1)
+        if rng.random() < 0.5:
+            index = rng.randrange(self.counts["users"])
+        return self.discord_id(index)
+
+    def post_id(self, index: int) -> ObjectId:
+        return self.object_id_at(self.time_at(index, self.counts["forum_posts"]), index)
+
+    def quest_id(self, index: int) -> ObjectId:
+        return self.object_id_at(self.time_at(index, self.counts["quests"]), index)
+
+    def users(self, index: int, rng: random.Random) -> dict:
+        username = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) + str(index)
+        created_at = self.time_at(index, self.counts["users"])
+        return {
+            "_id": self.object_id_at(created_at, index),
+            "discord_id": self.discord_id(index),
+            "username": username,
+            "username_lower": username.lower(),
+            "avatar": None,
+            "balance": rng.randint(0, 100_000),
+            "created_at": created_at,
+            "last_login": created_at + timedelta(seconds=rng.uniform(0, (self.end - created_at).total_seconds())),
+            "is_admin": False,
+            "is_new_user": False,
+            "casino_win_streak": rng.randint(0, 5)
+        }
+
+    def quests(self, index: int, rng: random.Random) -> dict:
+        created_at = self.time_at(index, self.counts["quests"])
+        return {
+            "_id": self.quest_id(index),
+            "title": f"デイリークエスト {index}",
+            "description": "生成されたクエスト",
+            "type": "daily",
+            "action_type": rng.choice(["login", "post", "comment", "reaction"]),
+            "required_count": rng.randint(1, 5),
+            "reward": rng.choice([10, 20, 50]),
+            "is_active": False,
+            "created_at": created_at,
+            "expires_at": created_at + timedelta(days=1)
+        }
+
+    def forum_posts(self, index: int, rng: random.Random) -> dict:
+        created_at = self.time_at(index, self.counts["forum_posts"])
+        reactions = sorted({self.random_user(rng) for _ in range(min(int(rng.paretovariate(1.5)) - 1, 50))})
+        return {
+            "_id": self.post_id(index),
+            "title": f"投稿 {index}",
+            "content": "本文" * rng.randint(10, 400),
+            "category": rng.choice(CATEGORIES),
+            "tags": rng.sample(TAGS, rng.randint(0, 3)),
+            "author_id": self.random_user(rng),
+            "author_name": "generated",
+            "author_avatar": None,
+            "is_locked": rng.random() < 0.01,
+            # APIと同じ形式（リアクションしたユーザーIDの配列と件数、コメント数は投入後に集計）
+            "reactions": reactions,
+            "reaction_count": len(reactions),
+            "comment_count": 0,
+            "created_at": created_at,
+            "updated_at": created_at
+        }
+
+    def forum_comments(self, index: int, rng: random.Random) -> dict:
+        created_at = self.time_at(index, self.counts["forum_comments"])
+        # コメントは作成日時より前の投稿に付く
+        latest_post = int(self.counts["forum_posts"] * index / max(self.counts["forum_comments"], 1))
+        return {
+            "_id": self.object_id_at(created_at, index),
+            "post_id": str(self.post_id(rng.randint(0, max(latest_post, 0)))),
+            "content": "コメント" * rng.randint(1, 50),
+            "author_id": self.random_user(rng),
+            "author_name": "generated",
+            "author_avatar": None,
+            "created_at": created_at
+        }
+
+    def casino_bets(self, index: int, rng: random.Random) -> dict:
+        created_at = self.time_at(index, self.counts["casino_bets"])
+        won = rng.random() < 0.45
+        amount = rng.randint(1, 1000)
+        return {
+            "_id": self.object_id_at(created_at, index),
+            "user_id": self.random_user(rng),
+            "username": "generated",
+            "avatar": None,
+            "game": rng.choice(GAMES),
+            "amount": amount,
+            "timestamp": created_at,
+            "completed": True,
+            "completed_at": created_at + timedelta(seconds=rng.randint(1, 30)),
+            "won": won,
+            "win_amount": int(amount * rng.choice([1.5, 2, 3])) if won else 0
+        }
+
+    def user_quests(self, index: int, rng: random.Random) -> dict:
+        created_at = self.time_at(index, self.counts["user_quests"])
+        completed = rng.random() < 0.6
+        return {
+            "_id": self.object_id_at(created_at, index),
+            "user_id": self.random_user(rng),
+            "quest_id": str(self.quest_id(rng.randrange(max(self.counts["quests"], 1)))),
+            "progress": rng.randint(0, 5),
+            "completed": completed,
+            "reward_claimed": completed and rng.random() < 0.8,
+            "created_at": created_at
+        }
+
+    def notifications(self, index: int, rng: random.Random) -> dict:
+        created_at = self.time_at(index, self.counts["notifications"])
+        return {
+            "_id": self.object_id_at(created_at, index),
+            "user_id": self.random_user(rng),
+            "type": rng.choice(NOTIFICATION_TYPES),
+            "title": "お知らせ",
+            "content": "生成された通知です",
+            "created_at": created_at,
+            "read": rng.random() < 0.7
+        }
+
+    def security_logs(self, index: int, rng: random.Random) -> dict:
+        created_at = self.time_at(index, self.counts["security_logs"])
+        event_type, severity, _ = rng.choices(SECURITY_EVENTS, weights=[w for _, _, w in SECURITY_EVENTS])[0]
+        ip_index = min(int(rng.paretovariate(1.1)) - 1, len(self.ip_pool) - 1)
+        log = {
+            "_id": self.object_id_at(created_at, index),
+            "timestamp": created_at,
+            "event_type": event_type,
+            "severity": severity,
+            "ip_address": self.ip_pool[ip_index],
+            "details": {"path": rng.choice(["/api/auth/discord", "/api/casino/bet", "/api/forums/posts"])}
+        }
+        if rng.random() < 0.6:
+            log["user_id"] = self.random_user(rng)
+        return log
+
+async def insert_collection(db, generator: Generator, name: str, batch_size: int, parallel: int):
+    """バッチ単位で生成しながら並列にinsert_many"""
+    count = generator.counts[name]
+    if count <= 0:
+        return
+    build: Callable[[int, random.Random], dict] = getattr(generator, name)
+    semaphore = asyncio.Semaphore(parallel)
+    started = time.monotonic()
+    inserted = 0
+
+    async def insert_batch(batch_index: int):
+        nonlocal inserted
+        try:
+            rng = generator.rng_for(name, batch_index)
+            first = batch_index * batch_size
+            docs = [build(i, rng) for i in range(first, min(first + batch_size, count))]
+            await db[name].insert_many(docs, ordered=False)
+            inserted += len(docs)
+        finally:
+            semaphore.release()
+
+    tasks: List[asyncio.Task] = []
+    for batch_index in range((count + batch_size - 1) // batch_size):
+        # 同時に実行するバッチ数を制限（生成済みのドキュメントを溜め込まない）
+        await semaphore.acquire()
+        tasks.append(asyncio.create_task(insert_batch(batch_index)))
+    await asyncio.gather(*tasks)
+
+    elapsed = time.monotonic() - started
+    print(f"{name}: {inserted:,}件を{elapsed:.1f}秒で投入しました（{inserted / max(elapsed, 1e-9):,.0f}件/秒）")
+
+async def update_comment_counts(db):
+    """投入したコメントから投稿ごとのコメント数を設定"""
+    pipeline = [
+        {"$group": {"_id": "$post_id", "comment_count": {"$sum": 1}}},
+        {"$project": {"_id": {"$toObjectId": "$_id"}, "comment_count": 1}},
+        {"$merge": {
+            "into": "forum_posts",
+            "on": "_id",
+            "whenMatched": "merge",
+            "whenNotMatched": "discard"
+        }}
+    ]
+    await db.forum_comments.aggregate(pipeline, allowDiskUse=True).to_list(None)
+    print("forum_posts: コメント数を集計しました")
+
+async def build_security_rollups(db):
+    """投入したセキュリティログから時間別集計を作成"""
+    await db.security_log_rollups.create_index(
+        [("hour", 1), ("event_type", 1), ("severity", 1), ("ip_address", 1)],
+        unique=True
+    )
+    pipeline = [
+        {"$group": {
+            "_id": {
+                "hour": {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}},
+                "event_type": "$event_type",
+                "severity": "$severity",
+                "ip_address": "$ip_address"
+            },
+            "count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "hour": "$_id.hour",
+            "event_type": "$_id.event_type",
+            "severity": "$_id.severity",
+            "ip_address": "$_id.ip_address",
+            "count": 1
+        }},
+        {"$merge": {
+            "into": "security_log_rollups",
+            "on": ["hour", "event_type", "severity", "ip_address"],
+            "whenMatched": [{"$set": {"count": {"$add": ["$count", "$$new.count"]}}}],
+            "whenNotMatched": "insert"
+        }}
+    ]
+    await db.security_logs.aggregate(pipeline, allowDiskUse=True).to_list(None)
+    print("security_log_rollups: 時間別集計を作成しました")
+
+async def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="性能検証用の大量の合成データを生成する")
+    parser.add_argument("--mongodb-uri", default=Config.MONGODB_URI)
+    parser.add_argument("--db-name", required=True, help="投入先のデータベース名")
+    parser.add_argument("--scale", type=float, default=1.0, help="各コレクションの基準件数に掛ける倍率")
+    for name in BASE_COUNTS:
+        if name != "quests":
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name, help=f"{name}の件数（scaleより優先）")
+    parser.add_argument("--days", type=int, default=28, help="データを分布させる日数（セキュリティログの保持期間より短くすること）")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--parallel", type=int, default=8, help="同時に投入するバッチ数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="投入前に対象コレクションを削除する")
+    parser.add_argument("--skip-rollups", action="store_true", help="セキュリティログの時間別集計を作成しない")
+    args = parser.parse_args()
+
+    if args.db_name == Config.DB_NAME:
+        confirmation = input(f"警告: 本番と同じデータベース '{args.db_name}' にデータを投入しようとしています。続行しますか？ (yes/no): ")
+        if confirmation.lower() != "yes":
+            print("操作がキャンセルされました")
+            return
+
+    counts = {
+        name: getattr(args, name, None) if getattr(args, name, None) is not None else int(base * args.scale)
+        for name, base in BASE_COUNTS.items()
+    }
+    counts["quests"] = args.days * QUESTS_PER_DAY
+    generator = Generator(counts, args.days, args.seed)
+
+    client = AsyncIOMotorClient(args.mongodb_uri)
+    db = client[args.db_name]
+    try:
+        if args.drop:
+            for name in list(counts) + ["security_log_rollups"]:
+                await db[name].drop()
+
+        started = time.monotonic()
+        for name in counts:
+            await insert_collection(db, generator, name, args.batch_size, args.parallel)
+
+        if counts["forum_posts"] and counts["forum_comments"]:
+            await update_comment_counts(db)
+
+        if counts["security_logs"] and not args.skip_rollups:
+            await build_security_rollups(db)
+
+        total = sum(counts.values())
+        print(f"合計 {total:,}件のドキュメントを{time.monotonic() - started:.1f}秒で生成しました")
+    except Exception as e:
+        print(f"エラーが発生しました: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,8 @@
+"""APIサーバーとDiscord Botで共有する永続化レイヤー"""
+from shared.indexes import IndexSpec, index_registry, ensure_indexes, drop_obsolete_indexes
+from shared.login_tokens import LoginTokenRepository
+from shared.models import User
+from shared.mongo import create_client
+from shared.users import UserRepository
+
+__all__ = ['IndexSpec', 'index_registry', 'ensure_indexes', 'drop_obsolete_indexes', 'LoginTokenRepository', 'User', 'create_client', 'UserRepository']
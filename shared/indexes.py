@@ -0,0 +1,123 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Union
+
+class IndexSpec(NamedTuple):
+    """create_indexに渡すキーとオプション"""
+    keys: Union[str, List[tuple]]
+    options: dict = {}
+
+def index_registry(
+    security_log_retention_days: int = 30,
+    security_rollup_retention_days: int = 365
+) -> Dict[str, List[IndexSpec]]:
+    """コレクションごとのインデックス定義（API・Botのどちらから作成しても同じ定義になる）"""
+    return {
+        "users": [
+            # discord_idでユニークインデックスを作成
+            IndexSpec('discord_id', {'unique': True}),
+            # 管理画面のユーザー検索（小文字化したユーザー名の前方一致）
+            IndexSpec('username_lower'),
+            # デイリーボーナスの台帳書き込みが未完了のユーザーの照合用
+            IndexSpec('daily_bonus_ledger_pending', {'sparse': True}),
+        ],
+        "login_tokens": [
+            # ワンタイムのログイントークン（_idがトークンのハッシュ、有効期限を過ぎたら自動削除）
+            IndexSpec('expires_at', {'expireAfterSeconds': 0}),
+        ],
+        "ledger": [
+            # 残高台帳（ユーザーごとの履歴取得・照合用）
+            IndexSpec([('user_id', 1), ('_id', -1)]),
+            # カジノのベット記録との照合用
+            IndexSpec('ref.bet_id', {'sparse': True}),
+            # トランザクションなしで書き込まれた保留中の明細の照合用
+            IndexSpec('status', {'sparse': True}),
+        ],
+        "casino_bets": [
+            # 起動時の台帳との照合（期間での範囲検索）
+            IndexSpec('timestamp'),
+        ],
+        "reports": [
+            # 通報一覧（ステータス絞り込み + 新しい順のページング用）
+            IndexSpec([('status', 1), ('created_at', -1)]),
+            IndexSpec([('created_at', -1)]),
+        ],
+        "security_logs": [
+            # セキュリティログ（保持期間を過ぎたら自動削除）
+            IndexSpec('timestamp', {'expireAfterSeconds': security_log_retention_days * 86400}),
+            # 一覧・エクスポート（新しい順、_idは同時刻のログのキーセットページング用）
+            IndexSpec([('timestamp', -1), ('_id', -1)]),
+            IndexSpec([('severity', 1), ('timestamp', -1), ('_id', -1)]),
+            IndexSpec([('event_type', 1), ('timestamp', -1), ('_id', -1)]),
+            IndexSpec([('ip_address', 1), ('timestamp', -1), ('_id', -1)]),
+            IndexSpec([('user_id', 1), ('timestamp', -1), ('_id', -1)]),
+        ],
+        "security_log_rollups": [
+            # セキュリティログの時間別集計
+            IndexSpec([('hour', 1), ('event_type', 1), ('severity', 1), ('ip_address', 1)], {'unique': True}),
+            IndexSpec('hour', {'expireAfterSeconds': security_rollup_retention_days * 86400}),
+        ],
+        "exchange_requests": [
+            # 交換リクエストの冪等キー（再送されたリクエストを重複させない）
+            IndexSpec(
+                [('user_id', 1), ('idempotency_key', 1)],
+                {'unique': True, 'partialFilterExpression': {'idempotency_key': {'$type': 'string'}}}
+            ),
+        ],
+    }
+
+# 不要になったインデックス
+OBSOLETE_INDEXES: Dict[str, List[str]] = {
+    # ログイントークンはlogin_tokensコレクションへ移動
+    "users": ['login_token_1', 'token_expires_1'],
+    # _idを末尾に加えたインデックスに置き換え
+    "security_logs": [
+        'severity_1_timestamp_-1',
+        'event_type_1_timestamp_-1',
+        'ip_address_1_timestamp_-1',
+        'user_id_1_timestamp_-1',
+    ],
+}
+
+async def drop_obsolete_indexes(db, collections: Optional[Iterable[str]] = None):
+    """既存の環境に残っている不要なインデックスを削除"""
+    names = OBSOLETE_INDEXES.keys() if collections is None else [n for n in collections if n in OBSOLETE_INDEXES]
+    for name in names:
+        existing = await db[name].index_information()
+        for index_name in OBSOLETE_INDEXES[name]:
+            if index_name in existing:
+                await db[name].drop_index(index_name)
+
+async def ensure_indexes(db, collections: Optional[Iterable[str]] = None, **registry_options):
+    """登録済みのインデックスを作成（collectionsを指定した場合はそのコレクションのみ）"""
+    registry = index_registry(**registry_options)
+    names = registry.keys() if collections is None else collections
+    for name in names:
+        existing = None
+        for spec in registry[name]:
+            if 'expireAfterSeconds' in spec.options:
+                if existing is None:
+                    existing = await db[name].index_information()
+                # 保持期間の変更はcreate_indexでは反映できない（IndexOptionsConflict）ためcollModで更新
+                if await _update_ttl(db, name, spec, existing):
+                    continue
+            await db[name].create_index(spec.keys, **spec.options)
+    # 置き換え先のインデックスを作成してから古いものを削除
+    await drop_obsolete_indexes(db, collections)
+
+def _key_list(keys: Union[str, List[tuple]]) -> List[tuple]:
+    """インデックスのキーを(フィールド, 向き)のリストに変換"""
+    return [(keys, 1)] if isinstance(keys, str) else list(keys)
+
+async def _update_ttl(db, name: str, spec: IndexSpec, existing: dict) -> bool:
+    """同じキーのTTLインデックスが既にあれば有効期限を更新（該当するインデックスがなければFalse）"""
+    keys = _key_list(spec.keys)
+    for info in existing.values():
+        if [tuple(key) for key in info['key']] != keys or 'expireAfterSeconds' not in info:
+            continue
+        ttl = spec.options['expireAfterSeconds']
+        if info['expireAfterSeconds'] != ttl:
+            await db.command({
+                'collMod': name,
+                'index': {'keyPattern': dict(keys), 'expireAfterSeconds': ttl}
+            })
+        return True
+    return False
@@ -0,0 +1,36 @@
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+
+class LoginTokenRepository:
+    """login_tokensコレクションへのアクセスをまとめたリポジトリ（ワンタイムのログイントークン）"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @staticmethod
+    def hash_token(token: str) -> str:
+        """トークンのSHA-256ハッシュ（DBには平文を保存しない）"""
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    async def issue(self, discord_id: str, ttl_seconds: int) -> str:
+        """トークンを発行して平文を返す"""
+        token = secrets.token_urlsafe(32)
+        now = datetime.utcnow()
+        await self.collection.insert_one({
+            '_id': self.hash_token(token),
+            'discord_id': discord_id,
+            'created_at': now,
+            'expires_at': now + timedelta(seconds=ttl_seconds)
+        })
+        return token
+
+    async def consume(self, token: str) -> Optional[dict]:
+        """有効なトークンを取り出して削除（1回のコマンドで検証と無効化を行う）"""
+        # TTLインデックスの削除は遅れることがあるため有効期限も条件に含める
+        return await self.collection.find_one_and_delete({
+            '_id': self.hash_token(token),
+            'expires_at': {'$gt': datetime.utcnow()}
+        })
+
@@ -0,0 +1,60 @@
+from datetime import datetime
+from typing import Dict, Optional
+
+class User:
+    """ユーザーモデル（大量に生成しても軽いよう__slots__で属性を固定）"""
+
+    __slots__ = ('discord_id', 'username', 'avatar', 'balance', 'is_admin', 'created_at', 'last_login')
+
+    def __init__(
+        self,
+        discord_id: str,
+        username: str,
+        avatar: Optional[str] = None,
+        balance: int = 0,
+        is_admin: bool = False,
+        created_at: Optional[datetime] = None,
+        last_login: Optional[datetime] = None
+    ):
+        self.discord_id = discord_id
+        self.username = username
+        self.avatar = avatar
+        self.balance = balance
+        self.is_admin = is_admin
+        self.created_at = created_at or datetime.utcnow()
+        self.last_login = last_login or datetime.utcnow()
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'User':
+        """辞書からユーザーオブジェクトを生成"""
+        return cls(
+            discord_id=data['discord_id'],
+            username=data['username'],
+            avatar=data.get('avatar'),
+            balance=data.get('balance', 0),
+            is_admin=bool(data.get('is_admin', False)),
+            created_at=data.get('created_at'),
+            last_login=data.get('last_login')
+        )
+
+    def to_dict(self) -> Dict:
+        """ユーザーオブジェクトを辞書に変換"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def update_login(self):
+        """最終ログイン時間を更新"""
+        self.last_login = datetime.utcnow()
+
+    def add_balance(self, amount: int):
+        """残高を増加"""
+        if amount < 0:
+            raise ValueError("Amount must be positive")
+        self.balance += amount
+
+    def subtract_balance(self, amount: int):
+        """残高を減少"""
+        if amount < 0:
+            raise ValueError("Amount must be positive")
+        if self.balance < amount:
+            raise ValueError("Insufficient balance")
+        self.balance -= amount
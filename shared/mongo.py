@@ -0,0 +1,19 @@
+from motor.motor_asyncio import AsyncIOMotorClient
+
+def create_client(
+    uri: str,
+    max_pool_size: int = 100,
+    min_pool_size: int = 0,
+    appname: str = "paraccoli",
+    **kwargs
+) -> AsyncIOMotorClient:
+    """API・Bot共通の接続設定でMotorクライアントを作成（イベントループ上で呼び出すこと）"""
+    return AsyncIOMotorClient(
+        uri,
+        maxPoolSize=max_pool_size,
+        minPoolSize=min_pool_size,
+        # mongodのログやcurrentOpでどのプロセスの接続か判別できるようにする
+        appname=appname,
+        retryWrites=True,
+        **kwargs
+    )
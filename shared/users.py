@@ -0,0 +1,105 @@
+import re
+from typing import Optional
+from bson import ObjectId
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from shared.models import User
+
+class UserRepository:
+    """usersコレクションへのアクセスをまとめたリポジトリ"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @staticmethod
+    def normalize(data: dict) -> dict:
+        """ユーザー名が含まれていれば検索用の小文字版も設定"""
+        if isinstance(data.get('username'), str):
+            data['username_lower'] = data['username'].lower()
+        return data
+
+    async def get(self, discord_id: str, projection: Optional[dict] = None) -> Optional[dict]:
+        """Discord IDでユーザーを取得"""
+        return await self.collection.find_one({'discord_id': discord_id}, projection)
+
+    async def get_model(self, discord_id: str) -> Optional[User]:
+        """Discord IDでユーザーを取得してモデルに変換"""
+        data = await self.get(discord_id, {field: 1 for field in User.__slots__})
+        return User.from_dict(data) if data else None
+
+    async def create(self, user_data: dict):
+        """新規ユーザーを作成"""
+        return await self.collection.insert_one(self.normalize(user_data))
+
+    async def update(self, discord_id: str, update_data: dict):
+        """ユーザー情報を更新"""
+        return await self.collection.update_one(
+            {'discord_id': discord_id},
+            {'$set': self.normalize(update_data)}
+        )
+
+    async def touch_last_login(self, discord_id: str) -> Optional[dict]:
+        """最終ログイン日時を更新して更新後のユーザーを返す"""
+        return await self.collection.find_one_and_update(
+            {'discord_id': discord_id},
+            {'$set': {'last_login': datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def backfill_username_lower(self, batch_size: int = 500) -> int:
+        """username_lowerが未設定のユーザーに値を設定"""
+        cursor = self.collection.find(
+            {'username_lower': {'$exists': False}, 'username': {'$type': 'string'}},
+            {'username': 1}
+        )
+        updates = []
+        updated = 0
+        async for user in cursor:
+            updates.append(UpdateOne(
+                {'_id': user['_id']},
+                {'$set': {'username_lower': user['username'].lower()}}
+            ))
+            if len(updates) >= batch_size:
+                await self.collection.bulk_write(updates, ordered=False)
+                updated += len(updates)
+                updates = []
+        if updates:
+            await self.collection.bulk_write(updates, ordered=False)
+            updated += len(updates)
+        return updated
+
+    async def search(
+        self,
+        search: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 20,
+        after: Optional[str] = None
+    ):
+        """ユーザー検索（インデックスを使う前方一致とキーセットページング）"""
+        query = {}
+        if search:
+            # ID完全一致とユーザー名の前方一致のいずれか
+            conditions = [
+                {'discord_id': search},
+                {'username_lower': {'$regex': f'^{re.escape(search.lower())}'}}
+            ]
+            if ObjectId.is_valid(search):
+                conditions.append({'_id': ObjectId(search)})
+            query = {'$or': conditions}
+
+        # 条件なしの場合はメタデータから概算件数を取得
+        if query:
+            total = await self.collection.count_documents(query)
+        else:
+            total = await self.collection.estimated_document_count()
+
+        # afterがあればその続きから、なければページ番号から取得（新しい順）
+        page_query = query
+        skip = (page - 1) * page_size
+        if after and ObjectId.is_valid(after):
+            page_query = {'$and': [query, {'_id': {'$lt': ObjectId(after)}}]} if query else {'_id': {'$lt': ObjectId(after)}}
+            skip = 0
+
+        users = await self.collection.find(page_query).sort('_id', -1).skip(skip).limit(page_size).to_list(page_size)
+        next_cursor = str(users[-1]['_id']) if len(users) == page_size else None
+        return users, total, next_cursor
@@ -9,18 +9,24 @@ import { useAdminNotification } from '../../contexts/AdminNotificationContext';
 const Reports = () => {
   const [reports, setReports] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [page, setPage] = useState(1);
+  const [totalPages, setTotalPages] = useState(1);
+  const [statusFilter, setStatusFilter] = useState('');
   const { markAsRead } = useAdminNotification();
 
   const fetchReports = async () => {
     try {
-      const response = await fetch('https://example.com/api/admin/reports', {
+      const params = new URLSearchParams({ page });
+      if (statusFilter) params.append('status', statusFilter);
+      const response = await fetch(`https://example.com/api/admin/reports?${params}`, {
         headers: {
           'Authorization': `Bearer ${localStorage.getItem('token')}`
         }
       });
       if (response.ok) {
         const data = await response.json();
-        setReports(data);
+        setReports(data.reports);
+        setTotalPages(data.total_pages || 1);
       }
     } catch (error) {
       console.error('Failed to fetch reports:', error);
@@ -31,6 +37,9 @@ const Reports = () => {
 
   useEffect(() => {
     fetchReports();
+  }, [page, statusFilter]);
+
+  useEffect(() => {
     // 既読処理
     markAsRead('reports');
   }, []);
@@ -132,7 +141,22 @@ const Reports = () => {
   return (
     <Section>
       <div className="max-w-4xl mx-auto">
-        <h2 className="text-2xl font-bold mb-6">通報管理</h2>
+        <div className="flex justify-between items-center mb-6">
+          <h2 className="text-2xl font-bold">通報管理</h2>
+          <select
+            value={statusFilter}
+            onChange={(e) => {
+              setStatusFilter(e.target.value);
+              setPage(1);
+            }}
+            className="rounded-md border-gray-300 shadow-sm focus:border-blue-500 focus:ring-blue-500"
+          >
+            <option value="">すべて</option>
+            <option value="pending">対応待ち</option>
+            <option value="resolved">対応済み</option>
+            <option value="rejected">却下</option>
+          </select>
+        </div>
         <div className="space-y-4">
           {reports.map(report => (
             <Card key={report.id} className="p-6">
@@ -212,6 +236,27 @@ const Reports = () => {
             </Card>
           ))}
         </div>
+
+        {/* ページネーション */}
+        <div className="flex justify-between items-center mt-6">
+          <button
+            className="px-4 py-2 border rounded-lg disabled:opacity-50"
+            disabled={page <= 1}
+            onClick={() => setPage(page - 1)}
+          >
+            前へ
+          </button>
+          <span className="text-sm text-gray-600">
+            {page} / {totalPages} ページ
+          </span>
+          <button
+            className="px-4 py-2 border rounded-lg disabled:opacity-50"
+            disabled={page >= totalPages}
+            onClick={() => setPage(page + 1)}
+          >
+            次へ
+          </button>
+        </div>
       </div>
     </Section>
   );
@@ -8,6 +8,8 @@ const UserManagement = () => {
   const [search, setSearch] = useState('');
   const [page, setPage] = useState(1);
   const [totalPages, setTotalPages] = useState(1);
+  // ページ番号ごとのキーセットカーソル（次ページ取得用）
+  const [cursors, setCursors] = useState({});
   const [parcAmount, setParcAmount] = useState(100); // デフォルトPARC量
   const [showParcModal, setShowParcModal] = useState(false);
   const [selectedUser, setSelectedUser] = useState(null);
@@ -16,7 +18,9 @@ const UserManagement = () => {
   const fetchUsers = async () => {
     setLoading(true);
     try {
-      const response = await fetch(`https://example.com/api/admin/users?page=${page}&search=${search}`, {
+      const params = new URLSearchParams({ page, search });
+      if (cursors[page]) params.append('after', cursors[page]);
+      const response = await fetch(`https://example.com/api/admin/users?${params}`, {
         headers: {
           'Authorization': `Bearer ${localStorage.getItem('token')}`
         }
@@ -26,6 +30,9 @@ const UserManagement = () => {
         const data = await response.json();
         setUsers(data.users);
         setTotalPages(data.total_pages || 1);
+        if (data.next_cursor) {
+          setCursors(prev => ({ ...prev, [page + 1]: data.next_cursor }));
+        }
       } else {
         toast.error('ユーザー一覧の取得に失敗しました');
       }
@@ -137,7 +144,11 @@ const UserManagement = () => {
             placeholder="ユーザー名またはIDで検索..."
             className="px-4 py-2 border rounded-lg flex-grow mr-2"
             value={search}
-            onChange={(e) => setSearch(e.target.value)}
+            onChange={(e) => {
+              setSearch(e.target.value);
+              setPage(1);
+              setCursors({});
+            }}
           />
           <button
             className="px-4 py-2 bg-amber-500 text-white rounded-lg hover:bg-amber-600"
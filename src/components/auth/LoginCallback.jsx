@@ -2,6 +2,7 @@ import React, { useEffect, useState } from 'react';
 import { useNavigate, useSearchParams } from 'react-router-dom';
 import { useAuth } from '../../hooks/useAuth';
 import { getDiscordUser } from '../../services/discord';
+import { api } from '../../services/api';
 import LoadingSpinner from '../shared/LoadingSpinner';
 
 const LoginCallback = () => {
@@ -19,6 +20,15 @@ const LoginCallback = () => {
       try {
         const code = searchParams.get('code');
         const state = searchParams.get('state');
+        const token = searchParams.get('token');
+
+        // Botの/login-linkで発行されたワンタイムトークンでのログイン
+        if (token) {
+          const user = await api.loginWithToken(token);
+          login(user);
+          navigate('/', { replace: true });
+          return;
+        }
         
         if (!code) {
           throw new Error('認証コードが見つかりません');
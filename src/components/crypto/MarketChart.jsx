@@ -26,6 +26,9 @@ const MarketChart = () => {
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
   const [lastUpdate, setLastUpdate] = useState(0);
+  const [chartError, setChartError] = useState(false);
+  // API URLを環境変数から取得するか、デフォルト値を使用
+  const apiUrl = import.meta.env.VITE_API_URL || 'https://example.com/api';
   const UPDATE_INTERVAL = 60000; // 自動更新間隔: 1分
   const MIN_UPDATE_INTERVAL = 10000; // 手動更新の最小間隔: 10秒
 
@@ -40,9 +43,8 @@ const MarketChart = () => {
     setIsLoading(true);
     setError(null);
     try {
-      // API URLを環境変数から取得するか、デフォルト値を使用
-      const apiUrl = import.meta.env.VITE_API_URL || 'https://example.com/api';
-      const response = await fetch(`${apiUrl}/crypto/market`, {
+      // チャート画像は /crypto/chart からキャッシュを効かせて取得するため含めない
+      const response = await fetch(`${apiUrl}/crypto/market?include_chart=false`, {
         headers: {
           'Cache-Control': 'no-cache',
           'Pragma': 'no-cache'
@@ -57,6 +59,7 @@ const MarketChart = () => {
       const result = await response.json();
       if (result.success && result.data) {
         setMarketData(result.data);
+        setChartError(false);
         setLastUpdate(now);
         if (showToast) {
           toast.success('マーケットデータを更新しました');
@@ -158,15 +161,16 @@ const MarketChart = () => {
             </div>
 
             {/* チャート */}
-            {marketData.chart ? (
+            {!chartError ? (
               <div className="mt-6 bg-white p-4 rounded-lg shadow-sm border border-gray-100">
+                {/* データ更新時刻をURLに含め、同じ画像はブラウザのキャッシュ（ETag）で再利用する */}
                 <img
-                  src={`data:image/png;base64,${marketData.chart}`}
+                  src={`${apiUrl}/crypto/chart?t=${marketData.timestamp}`}
                   alt="Price Chart"
                   className="w-full rounded-lg"
-                  onError={(e) => {
+                  onError={() => {
                     console.error('画像読み込みエラー');
-                    e.target.style.display = 'none';
+                    setChartError(true);
                   }}
                 />
               </div>
@@ -11,6 +11,8 @@ const ExchangeForm = () => {
   const navigate = useNavigate();
   const [amount, setAmount] = useState('');
   const [loading, setLoading] = useState(false);
+  // 二重送信・再試行で重複した交換が作られないよう、フォームごとに冪等キーを発行
+  const [idempotencyKey] = useState(() => crypto.randomUUID());
 
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -33,7 +35,8 @@ const ExchangeForm = () => {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
+          'Authorization': `Bearer ${localStorage.getItem('token')}`,
+          'Idempotency-Key': idempotencyKey
         },
         body: JSON.stringify({
           amount: exchangeAmount,
@@ -36,7 +36,8 @@ const Home = () => {
     try {
       setIsMarketLoading(true);
       const apiUrl = import.meta.env.VITE_API_URL || 'https://example.com/api';
-      const response = await fetch(`${apiUrl}/crypto/market`, {
+      // チャート画像は使わないため含めない
+      const response = await fetch(`${apiUrl}/crypto/market?include_chart=false`, {
         headers: {
           'Cache-Control': 'no-cache', // キャッシュを無効化
           'Pragma': 'no-cache'
@@ -32,7 +32,8 @@ class ApiClient {
     }
 
     const data = await response.json();
-    localStorage.setItem('token', data.token);
+    localStorage.setItem('token', data.access_token);
+    localStorage.setItem('user', JSON.stringify(data.user));
     return data.user;
   }
 